@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import as_completed
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+import pandas as pd
+from config import Config
+from date_utils import DateManager
+from graph_generator import ReportGraphManager
+from main import Logger, read_ingest_stamp, write_json, write_report
+from metrics import metrics
+from precompute import IngestPrecomputer
+from profiling import profiling_requested, run_profiler
+from shared_frame import SharedFrame, SharedFrameHandle
+from transport_processor import TransportDataProcessor
+from worker_pool import report_pool
+
+
+CHECKPOINT_NAME = 'backfill_checkpoint.json'
+
+Week = Tuple[date, date]
+
+
+def history_weeks(first_day: date, last_day: date) -> List[Week]:
+    """Every (Sunday, Saturday) report week from the first record up to the last, skipping future weeks"""
+    weeks = []
+    start = IngestPrecomputer.week_start(first_day)
+    while start <= last_day and start <= date.today():
+        weeks.append((start, start + timedelta(days=6)))
+        start += timedelta(days=7)
+    return weeks
+
+
+def _week_frame(df: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
+    dates = df['date_of_service']
+    return df[(dates >= pd.Timestamp(start)) & (dates <= pd.Timestamp(end))]
+
+
+def _build_week(
+    handle: SharedFrameHandle,
+    start: date,
+    end: date,
+    ingest_stamp: Optional[str],
+    profile: bool
+) -> str:
+    """Worker: build one week's report from the shared batch, profiled on its own when asked"""
+    df = handle.attach()
+    ranges = DateManager.get_date_ranges(start, end)
+    start_str, end_str = DateManager.format_date(start), DateManager.format_date(end)
+    logger = Logger()
+    try:
+        with run_profiler(f"backfill_week_{DateManager.format_file_date(start)}", profile, logger):
+            write_report(
+                start_str,
+                end_str,
+                _week_frame(df, *ranges['current']),
+                _week_frame(df, *ranges['previous']),
+                logger,
+                ingest_stamp=ingest_stamp
+            )
+    finally:
+        # Pool workers exit without running atexit hooks, so flush every week
+        metrics.flush(logger)
+        # The pool outlives the batch, so unmap it before the worker takes the next one
+        del df
+        handle.detach()
+    return start_str
+
+
+class Backfill:
+    """
+    Regenerates every weekly report in the history across a process pool.
+
+    Weeks are processed in batches. Each batch, plus the week before it, is
+    loaded once and placed in shared memory, so each week's data is read
+    once even though it is also the previous week of the report after it.
+    Completed weeks are recorded in a checkpoint file after each report, so
+    an interrupted run resumes with the weeks it had not finished.
+    """
+
+    def __init__(self, logger: Logger, workers: Optional[int] = Config.BACKFILL_WORKERS, profile: bool = False):
+        self.logger = logger
+        self.workers = workers or os.cpu_count()
+        # Each week is profiled in its worker; the run itself is profiled by the caller
+        self.profile = profile
+        self.checkpoint_path = Config.OUTPUT_DIR / CHECKPOINT_NAME
+        self.processor = TransportDataProcessor(logger)
+
+    def load_checkpoint(self) -> Set[str]:
+        if not self.checkpoint_path.exists():
+            return set()
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            return set(json.load(f).get('completed', []))
+
+    def save_checkpoint(self, completed: Set[str]) -> None:
+        write_json(self.checkpoint_path, {'completed': sorted(completed, key=DateManager.parse_date)})
+
+    def clear_checkpoint(self) -> None:
+        if self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+
+    def _batches(self, weeks: List[Week]) -> List[List[Week]]:
+        size = max(Config.BACKFILL_BATCH_WEEKS, 1)
+        return [weeks[i:i + size] for i in range(0, len(weeks), size)]
+
+    def run(self, weeks: List[Week]) -> List[Week]:
+        """Build every week not yet in the checkpoint; return the weeks that failed"""
+        completed = self.load_checkpoint()
+        pending = [week for week in weeks if DateManager.format_date(week[0]) not in completed]
+        self.logger.log_message(
+            f"Backfill: {len(pending)} of {len(weeks)} week(s) to build on {self.workers} worker(s)"
+        )
+
+        failed = []
+        done = 0
+        started = time.perf_counter()
+        with report_pool(self.workers) as pool:
+            for batch in self._batches(pending):
+                # The first week's report compares against the week before the batch
+                ingest_stamp = read_ingest_stamp()
+                with metrics.timer('stage_duration_seconds', stage='load'):
+                    df = self.processor.load_period(batch[0][0] - timedelta(days=7), batch[-1][1])
+                with SharedFrame(df) as shared:
+                    futures = {
+                        pool.submit(
+                            _build_week,
+                            shared.handle,
+                            start,
+                            end,
+                            ingest_stamp,
+                            self.profile
+                        ): (start, end)
+                        for start, end in batch
+                    }
+                    del df
+
+                    for future in as_completed(futures):
+                        start, end = futures[future]
+                        try:
+                            completed.add(future.result())
+                            self.save_checkpoint(completed)
+                            done += 1
+                            metrics.inc('reports_generated_total', source='backfill', outcome='success')
+                        except Exception as e:
+                            failed.append((start, end))
+                            metrics.inc('reports_generated_total', source='backfill', outcome='failure')
+                            self.logger.log_message(
+                                f"Backfill failed for {start} to {end}: {str(e)}",
+                                is_error=True
+                            )
+
+                minutes = (time.perf_counter() - started) / 60
+                self.logger.log_message(
+                    f"Backfill: {done}/{len(pending)} week(s) built, "
+                    f"{done / minutes if minutes else 0:.1f} weeks/min"
+                )
+                metrics.flush(self.logger)
+
+        return failed
+
+
+def main():
+    """Regenerate every weekly report since the start of the data"""
+    try:
+        parser = argparse.ArgumentParser(description="Rebuild all weekly reports in parallel with resume")
+        parser.add_argument('--start-date', help="First date to cover in MM/DD/YYYY format (defaults to the first record)")
+        parser.add_argument('--end-date', help="Last date to cover in MM/DD/YYYY format (defaults to the last record)")
+        parser.add_argument('--workers', type=int, help="Worker processes (defaults to every CPU)")
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help="Ignore the checkpoint and rebuild every week, e.g. after a template change"
+        )
+        parser.add_argument('--output-dir', help="Directory for reports and graphs (defaults to tmp_output)")
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help=f"Profile the run and every week in {Config.PROFILE_DIR} (or set {Config.PROFILE_ENV_VAR}=1)"
+        )
+        parser.add_argument(
+            '--graph-backend',
+            choices=ReportGraphManager.BACKENDS,
+            help=f"How graphs are produced (defaults to {Config.GRAPH_BACKEND})"
+        )
+        args = parser.parse_args()
+
+        if args.output_dir:
+            Config.OUTPUT_DIR = Path(args.output_dir)
+        if args.graph_backend:
+            Config.GRAPH_BACKEND = args.graph_backend
+        Config.setup_output_directory()
+        logger = Logger()
+
+        profile = profiling_requested(args.profile)
+        backfill = Backfill(logger, args.workers or Config.BACKFILL_WORKERS, profile)
+        first_day, last_day = backfill.processor.db_manager.fetch_date_bounds()
+        if args.start_date:
+            first_day = DateManager.to_date(args.start_date)
+        if args.end_date:
+            last_day = DateManager.to_date(args.end_date)
+
+        if args.restart:
+            backfill.clear_checkpoint()
+
+        with run_profiler('backfill', profile, logger):
+            failed = backfill.run(history_weeks(first_day, last_day))
+        if failed:
+            logger.log_message(f"Backfill finished with {len(failed)} failed week(s); rerun to retry them", is_error=True)
+            sys.exit(1)
+        logger.log_message("Backfill finished")
+
+    except Exception as e:
+        print(f"Critical error: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
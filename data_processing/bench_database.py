@@ -0,0 +1,123 @@
+import multiprocessing
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from config import Config
+from database import DatabaseManager, connection_manager
+from date_utils import DateManager
+
+# The columns the server's upload writes (src/database.rs insert_row)
+WRITER_COLUMNS = [
+    'id', 'date_of_service', 'division', 'priority', 'category',
+    'level', 'weekday', 'hour', 'origin', 'origin_id', 'response_time', 'service_day'
+]
+
+
+def _ingest_writer(db_path: str, stop_event, batch_size: int = 200, interval: float = 0.02) -> None:
+    """Simulate the Rust server inserting uploaded rows into the same database at a fixed rate"""
+    conn = sqlite3.connect(db_path, timeout=Config.SQLITE_BUSY_TIMEOUT)
+    next_id = (conn.execute("SELECT MAX(id) FROM records").fetchone()[0] or 0) + 1
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO origins (name) VALUES ('BENCHMARK ORIGIN')")
+    origin_id = conn.execute("SELECT id FROM origins WHERE name = 'BENCHMARK ORIGIN'").fetchone()[0]
+    service_day = DateManager.to_day_number('01/01/1999')
+    insert = f"INSERT INTO records ({', '.join(WRITER_COLUMNS)}) VALUES ({', '.join('?' * len(WRITER_COLUMNS))})"
+    while not stop_event.is_set():
+        rows = [
+            (next_id + i, '01/01/99', 'Memphis', 'Emergent', 'Ran', 'BLS', 'Friday', 12, 'BENCHMARK ORIGIN', origin_id, 15, service_day)
+            for i in range(batch_size)
+        ]
+        with conn:
+            conn.executemany(insert, rows)
+        next_id += batch_size
+        time.sleep(interval)
+    conn.close()
+
+
+def _time_fetches(fetchers: dict, iterations: int) -> dict:
+    """Interleave the fetchers so each sees the same table growth from the writer"""
+    timings = {label: [] for label in fetchers}
+    for _ in range(iterations):
+        for label, fetch in fetchers.items():
+            started = time.perf_counter()
+            fetch()
+            timings[label].append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _summarize(label: str, timings: list) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<32} median {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def run_benchmark(start_date: str, end_date: str, iterations: int = 50) -> None:
+    """Time fetch_data_for_period with and without connection reuse while ingest is running"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Work on copies so the benchmark writers never touch real data; the
+        # baseline copy stays in rollback-journal mode like an untuned database
+        baseline_path = str(Path(tmp_dir) / 'baseline.db')
+        pooled_path = str(Path(tmp_dir) / 'pooled.db')
+        shutil.copy(Config.DATABASE_PATH, baseline_path)
+        shutil.copy(Config.DATABASE_PATH, pooled_path)
+        with sqlite3.connect(baseline_path) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+
+        def fresh_connection_fetch():
+            conn = sqlite3.connect(baseline_path)
+            try:
+                manager = DatabaseManager(baseline_path, use_columnar_store=False)
+                manager.get_connection = lambda read_only=True: conn
+                manager.fetch_data_for_period(start_date, end_date)
+            finally:
+                conn.close()
+
+        pooled_manager = DatabaseManager(pooled_path, use_columnar_store=False)
+
+        def pooled_fetch():
+            pooled_manager.fetch_data_for_period(start_date, end_date)
+
+        # Open the pooled connection (and switch to WAL) before ingest starts
+        pooled_fetch()
+
+        stop_event = multiprocessing.Event()
+        writers = [
+            multiprocessing.Process(target=_ingest_writer, args=(path, stop_event))
+            for path in (baseline_path, pooled_path)
+        ]
+        for writer in writers:
+            writer.start()
+        try:
+            timings = _time_fetches({
+                "fresh connection, default pragmas": fresh_connection_fetch,
+                "pooled read-only, WAL + mmap": pooled_fetch
+            }, iterations)
+        finally:
+            stop_event.set()
+            for writer in writers:
+                writer.join()
+            connection_manager.close_all()
+
+        # Timings without the concurrent inserts would not measure what this benchmark is for
+        failed = [writer.exitcode for writer in writers if writer.exitcode != 0]
+        if failed:
+            raise Exception(f"Ingest writer exited with code {failed[0]}; timings discarded")
+        for label, values in timings.items():
+            _summarize(label, values)
+
+
+def main():
+    """Benchmark fetch latency under concurrent ingest"""
+    if len(sys.argv) not in (3, 4):
+        raise ValueError("Usage: python bench_database.py <start_date> <end_date> [iterations]")
+
+    iterations = int(sys.argv[3]) if len(sys.argv) == 4 else 50
+    run_benchmark(sys.argv[1], sys.argv[2], iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import json
+import sys
+from datetime import date, datetime
+from pathlib import Path
+from typing import List, Optional
+import pandas as pd
+from config import Config
+from date_utils import DateLike, DateManager
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; the store is disabled without it
+    pa = None
+
+
+RECORD_COLUMNS = [
+    'date_of_service',
+    'division',
+    'priority',
+    'category',
+    'level',
+    'weekday',
+    'hour',
+    'origin',
+    'origin_id',
+    'response_time'
+]
+
+# Columns of partitions written before the manifest recorded them
+LEGACY_COLUMNS = [column for column in RECORD_COLUMNS if column != 'origin_id']
+
+# One schema for every partition, so months whose inferred types would differ
+# (a column with or without NULLs, all NULL, more or fewer origins) still concatenate
+RECORD_SCHEMA = pa.schema([
+    ('date_of_service', pa.timestamp('s')),
+    ('division', pa.string()),
+    ('priority', pa.string()),
+    ('category', pa.string()),
+    ('level', pa.string()),
+    ('weekday', pa.string()),
+    ('hour', pa.int64()),
+    ('origin', pa.dictionary(pa.int32(), pa.string())),
+    ('origin_id', pa.int64()),
+    ('response_time', pa.int64()),
+]) if pa is not None else None
+
+
+class ColumnarStore:
+    """Month-partitioned Feather/Parquet snapshot of the records table"""
+
+    MANIFEST_NAME = 'manifest.json'
+
+    def __init__(self, root: Path = Config.COLUMNAR_STORE_DIR, file_format: str = Config.COLUMNAR_FORMAT):
+        if pa is None:
+            raise Exception("Columnar store requires pyarrow to be installed")
+        if file_format not in ('feather', 'parquet'):
+            raise Exception(f"Unsupported columnar format: {file_format}")
+        self.root = Path(root)
+        self.file_format = file_format
+        self.manifest_path = self.root / self.MANIFEST_NAME
+
+    @staticmethod
+    def _month_keys(start: date, end: date) -> List[str]:
+        """Return YYYY-MM partition keys overlapping the inclusive range"""
+        months = pd.period_range(start=start, end=end, freq='M')
+        return [str(month) for month in months]
+
+    def _partition_path(self, month: str) -> Path:
+        return self.root / f"records_{month}.{self.file_format}"
+
+    def _load_manifest(self) -> dict:
+        if not self.manifest_path.exists():
+            return {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: dict) -> None:
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        tmp_path.replace(self.manifest_path)
+
+    def covers(self, start: date, end: date, columns: Optional[List[str]] = None) -> bool:
+        """
+        Check whether every partition overlapping the range has been written
+        with the columns from data read after the last ingest.
+        """
+        manifest = self._load_manifest()
+        required = set(columns or RECORD_COLUMNS)
+        try:
+            ingested_at = Config.INGEST_STAMP.stat().st_mtime
+        except FileNotFoundError:
+            ingested_at = 0.0
+        return all(
+            month in manifest and
+            self._partition_path(month).exists() and
+            required <= set(manifest[month].get('columns', LEGACY_COLUMNS)) and
+            # Partitions from before the manifest recorded it count as stale once anything is ingested
+            manifest[month].get('built_at', 0.0) >= ingested_at
+            for month in self._month_keys(start, end)
+        )
+
+    def write_partition(self, month: str, df: pd.DataFrame, built_at: Optional[float] = None) -> Path:
+        """
+        Atomically write one month of records (date_of_service already parsed).
+
+        built_at is when the rows were read from SQLite; the partition is
+        stale once a later ingest is stamped. It defaults to now.
+        """
+        if built_at is None:
+            built_at = datetime.now().timestamp()
+        self.root.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(df[RECORD_COLUMNS], schema=RECORD_SCHEMA, preserve_index=False)
+        path = self._partition_path(month)
+        tmp_path = path.with_suffix('.tmp')
+
+        # Uncompressed Feather keeps the file memory-mappable without a decode step
+        if self.file_format == 'feather':
+            feather.write_feather(table, tmp_path, compression='uncompressed')
+        else:
+            pq.write_table(table, tmp_path)
+        tmp_path.replace(path)
+
+        manifest = self._load_manifest()
+        manifest[month] = {
+            'rows': len(df),
+            'columns': RECORD_COLUMNS,
+            'built_at': built_at,
+            'written_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        self._save_manifest(manifest)
+        return path
+
+    def read(self, start: date, end: date, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Read records for an inclusive date range.
+
+        Only partitions overlapping the range are opened, only the requested
+        columns are materialised and Feather partitions are memory-mapped.
+        """
+        columns = list(columns or RECORD_COLUMNS)
+        read_columns = columns if 'date_of_service' in columns else ['date_of_service'] + columns
+        start_ts = pa.scalar(pd.Timestamp(start))
+        end_ts = pa.scalar(pd.Timestamp(end))
+
+        tables = []
+        for month in self._month_keys(start, end):
+            path = self._partition_path(month)
+            if self.file_format == 'feather':
+                table = feather.read_table(path, columns=read_columns, memory_map=True)
+            else:
+                table = pq.read_table(path, columns=read_columns, memory_map=True)
+
+            # Partitions written before RECORD_SCHEMA may have inferred other types
+            table = table.cast(pa.schema([RECORD_SCHEMA.field(name) for name in table.column_names]))
+            dates = table.column('date_of_service').cast(start_ts.type)
+            mask = pc.and_(pc.greater_equal(dates, start_ts), pc.less_equal(dates, end_ts))
+            tables.append(table.filter(mask))
+
+        if not tables:
+            return pd.DataFrame(columns=columns)
+
+        df = pa.concat_tables(tables).to_pandas()
+        return df[columns]
+
+
+def compact(db_manager, store: ColumnarStore, start_date: DateLike, end_date: DateLike) -> List[Path]:
+    """
+    Rebuild the columnar partitions for every month touched by a date range.
+
+    Args:
+        db_manager: DatabaseManager reading from the SQLite records table
+        store: Destination columnar store
+        start_date: Start date (date or MM/DD/YYYY string)
+        end_date: End date (date or MM/DD/YYYY string)
+
+    Returns:
+        List of partition paths written
+    """
+    start = DateManager.to_date(start_date)
+    end = DateManager.to_date(end_date)
+
+    written = []
+    for month in ColumnarStore._month_keys(start, end):
+        period = pd.Period(month, freq='M')
+        # Stamped before reading, so rows ingested during the read leave the partition stale
+        built_at = datetime.now().timestamp()
+        df = db_manager.fetch_data_from_sqlite(period.start_time, period.end_time)
+        written.append(store.write_partition(month, df, built_at))
+    return written
+
+
+def main():
+    """Compact SQLite records into the columnar store"""
+    from database import DatabaseManager
+
+    if len(sys.argv) not in (2, 4) or sys.argv[1] != 'compact':
+        raise ValueError("Usage: python columnar_store.py compact [<start_date> <end_date>]")
+
+    db_manager = DatabaseManager(use_columnar_store=False)
+    if len(sys.argv) == 4:
+        start_date, end_date = sys.argv[2], sys.argv[3]
+    else:
+        start_date, end_date = db_manager.fetch_date_bounds()
+
+    store = ColumnarStore()
+    for path in compact(db_manager, store, start_date, end_date):
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
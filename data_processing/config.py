@@ -11,10 +11,85 @@ class Config:
     LEVELS = ["ALS", "BLS", "CCU"]
     DAYS_OF_WEEK = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
     OUTPUT_DIR = Path(__file__).parent.parent / 'tmp_output'
+    # Touched by the server after every CSV upload; derived data older than this is stale
+    INGEST_STAMP = Path(__file__).parent.parent / 'tmp_output' / 'last_ingest'
+    # Logs stay in the shared directory even when a job writes to its own workspace
+    LOG_DIR = Path(__file__).parent.parent / 'tmp_output'
 
+    # Response time statistics
+    RESPONSE_TIME_MAX = 1440  # 24 hours in minutes
+    RESPONSE_TIME_PERCENTILES = [0.5, 0.9, 0.99]
+    RESPONSE_TIME_SLAS = [30, 60]  # minutes
+
+    # 'pgfplots' exports graph data for vector figures drawn in LaTeX;
+    # 'matplotlib' renders PNGs into OUTPUT_DIR
+    GRAPH_BACKEND = 'pgfplots'
+    # Build the matplotlib heatmap figure once and refill it for every matrix
+    REUSE_HEATMAP_FIGURE = True
+
+    # SQLite read settings applied to every pooled connection
+    SQLITE_BUSY_TIMEOUT = 30  # seconds
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # bytes
+    SQLITE_CACHE_SIZE = -64 * 1024  # negative means KiB
+    SQLITE_TEMP_STORE = 'MEMORY'
+
+    # Optional columnar snapshot of the records table (requires pyarrow)
+    USE_COLUMNAR_STORE = False
+    COLUMNAR_STORE_DIR = Path(__file__).parent.parent / 'columnar_store'
+    COLUMNAR_FORMAT = 'feather'  # 'feather' (memory-mapped) or 'parquet'
+
+    # Per-day prefix sums answering date-range counts (see range_index.py)
+    RANGE_INDEX_PATH = Path(__file__).parent.parent / 'range_index.npz'
+    RANGE_INDEX_ORIGINS = True
+
+    # Load planning (see planner.py): windows whose estimated peak memory
+    # exceeds the budget are read from SQLite in chunks
+    PLAN_MEMORY_BUDGET = 1024 * 1024 * 1024  # bytes, for all windows of a report together
+    PLAN_BYTES_PER_ROW = 600  # peak bytes per row of a single-query read
+    PLAN_CHUNK_BYTES_PER_ROW = 120  # peak bytes per row of a chunked read
+    PLAN_CHUNK_ROWS = 100_000
+
+    # Historical backfill (see backfill.py)
+    BACKFILL_WORKERS = None  # None uses every CPU
+    BACKFILL_BATCH_WEEKS = 52  # weeks loaded into shared memory at once
+
+    # Per-origin reports (see WeeklyReportManager.generate_origin_reports)
+    ORIGIN_FANOUT_WORKERS = None  # None uses every CPU
+    ORIGIN_FANOUT_PER_TASK = 16  # origins drawn together by one worker
+
+    # Directory ingest (see ingest.py)
+    INGEST_FILES_PER_TASK = 32  # daily exports parsed together by one worker
+
+    # Sharded history (see shards.py): closed periods move out of DATABASE_PATH
+    # into one SQLite file each, listed in SHARD_DIR/catalog.json
+    USE_SHARDS = False
+    SHARD_DIR = Path(__file__).parent.parent / 'shards'
+    SHARD_PERIOD = 'year'  # 'year' or 'quarter'
+    SHARD_LIVE_DAYS = 31  # a period stays in the live database this long after it ends
+    SHARD_SEAL_DAYS = 365  # and is sealed immutable this long after it ends
+    SHARD_READ_THREADS = 4
+
+    # Retention (see retention.py): raw rows older than this fold into daily
+    # rollups; the rows themselves are kept as gzipped CSV in RETENTION_ARCHIVE_DIR
+    RETENTION_DAYS = 730
+    RETENTION_ARCHIVE_DIR = Path(__file__).parent.parent / 'archive'
+
+    # Opt-in run profiling (see profiling.py): --profile on main.py, precompute.py
+    # or backfill.py, or this variable set to 1; profiles are saved in PROFILE_DIR
+    PROFILE_ENV_VAR = 'REPORT_PROFILE'
+    PROFILE_DIR = Path(__file__).parent.parent / 'profiles'
+    PROFILE_TOP_ALLOCATIONS = 25
+
+    # Pipeline metrics (see metrics.py): counters and latency histograms merged
+    # across runs into metrics.json and metrics.prom in LOG_DIR
+    METRICS_ENABLED = True
+    METRICS_PREFIX = 'lifecare_'
+    METRICS_LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]  # seconds
+    METRICS_QUANTILES = [0.5, 0.95]
 
     @classmethod
     def setup_output_directory(cls) -> Path:
         """Create and return output directory"""
         cls.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        cls.LOG_DIR.mkdir(parents=True, exist_ok=True)
         return cls.OUTPUT_DIR
\ No newline at end of file
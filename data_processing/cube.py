@@ -0,0 +1,213 @@
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+
+
+# Axes of the dense count array, in storage order
+DENSE_DIMENSIONS = ('date', 'division', 'priority', 'category', 'level', 'hour')
+# Origin has hundreds of values but few per cell, so its counts are kept sparse
+SPARSE_DIMENSIONS = ('origin',)
+# Dimensions computed from another one instead of being stored
+DERIVED_DIMENSIONS = {'weekday': 'date'}
+WEEKDAY_LABELS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+Selection = Union[Any, Sequence[Any]]
+
+
+class CallCube:
+    """
+    Call counts over date x division x priority x category x level x hour x origin.
+
+    Every report table is a projection of this cube: slice with `where`,
+    roll up to the dimensions in `by`. Dense dimensions live in one NumPy
+    array over categorical codes; origin is stored as (cell, origin, count)
+    triples. Roll-ups of the whole cube are cached and later roll-ups are
+    computed from the smallest cached one that still has the needed axes.
+    """
+
+    def __init__(
+        self,
+        labels: Dict[str, pd.Index],
+        dense: np.ndarray,
+        origin_cells: np.ndarray,
+        origin_codes: np.ndarray,
+        origin_counts: np.ndarray
+    ):
+        self.labels = labels
+        self.dense = dense
+        self.origin_cells = origin_cells
+        self.origin_codes = origin_codes
+        self.origin_counts = origin_counts
+        self._marginals: Dict[FrozenSet[int], np.ndarray] = {frozenset(range(dense.ndim)): dense}
+        self._weekday_codes = np.asarray(labels['date'].dayofweek)
+
+    @staticmethod
+    def _codes(values: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+        """Sorted labels of a column and each row's position in them; missing values get their own label"""
+        codes, labels = pd.factorize(values, sort=True, use_na_sentinel=False)
+        return codes.astype(np.int64), pd.Index(labels)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'CallCube':
+        """Build the cube from loaded records"""
+        dates = df['date_of_service'].dt.normalize()
+        if len(df):
+            date_labels = pd.date_range(dates.min(), dates.max(), freq='D')
+        else:
+            date_labels = pd.DatetimeIndex([])
+        labels = {'date': date_labels}
+        codes = [np.asarray(date_labels.get_indexer(dates), dtype=np.int64)]
+
+        for dimension in DENSE_DIMENSIONS[1:]:
+            if dimension == 'hour':
+                # Rows without a valid pickup hour get a trailing missing label
+                hours = pd.to_numeric(df['hour'], errors='coerce').to_numpy(dtype=np.float64)
+                valid = (hours >= 0) & (hours <= 23)
+                labels['hour'] = pd.RangeIndex(24) if valid.all() else pd.Index(list(range(24)) + [np.nan])
+                codes.append(np.where(valid, hours, 24).astype(np.int64))
+                continue
+            dimension_codes, labels[dimension] = cls._codes(df[dimension])
+            codes.append(dimension_codes)
+
+        shape = tuple(len(labels[dimension]) for dimension in DENSE_DIMENSIONS)
+        cells = np.ravel_multi_index(codes, shape) if len(df) else np.zeros(0, dtype=np.int64)
+        dense = np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+
+        origin_codes, labels['origin'] = cls._codes(df['origin'])
+        pairs = cells * len(labels['origin']) + origin_codes
+        unique_pairs, origin_counts = np.unique(pairs, return_counts=True)
+
+        return cls(
+            labels,
+            dense,
+            unique_pairs // max(len(labels['origin']), 1),
+            unique_pairs % max(len(labels['origin']), 1),
+            origin_counts
+        )
+
+    @property
+    def dimensions(self) -> List[str]:
+        return list(DENSE_DIMENSIONS) + list(SPARSE_DIMENSIONS) + list(DERIVED_DIMENSIONS)
+
+    def _label_index(self, dimension: str) -> pd.Index:
+        if dimension == 'weekday':
+            return pd.Index(WEEKDAY_LABELS)
+        return self.labels[dimension]
+
+    def _selected_codes(self, dimension: str, selection: Selection) -> np.ndarray:
+        """Codes of the requested labels along a dimension; unknown labels select nothing"""
+        values = list(selection) if isinstance(selection, (list, tuple, set, pd.Index, np.ndarray)) else [selection]
+        index = self._label_index(dimension)
+        codes = index.get_indexer(values)
+        return np.unique(codes[codes >= 0])
+
+    def _marginal(self, keep: FrozenSet[int]) -> np.ndarray:
+        """Whole-cube roll-up onto the kept dense axes, with summed axes left as length 1"""
+        cached = self._marginals.get(keep)
+        if cached is not None:
+            return cached
+
+        # Start from the smallest cached roll-up that still has every kept axis
+        source_keep = min(
+            (axes for axes in self._marginals if keep <= axes),
+            key=lambda axes: self._marginals[axes].size
+        )
+        drop = tuple(sorted(source_keep - keep))
+        marginal = self._marginals[source_keep].sum(axis=drop, keepdims=True)
+        self._marginals[keep] = marginal
+        return marginal
+
+    def query(self, by: Sequence[str] = (), where: Optional[Dict[str, Selection]] = None) -> Union[int, pd.Series]:
+        """
+        Count calls matching `where`, grouped by the dimensions in `by`.
+
+        `where` maps a dimension to one label or a list of labels. The result
+        is the total for an empty `by`, otherwise a Series over every
+        combination of the grouped labels, zeros included.
+        """
+        by = list(by)
+        where = dict(where or {})
+        unknown = [dimension for dimension in by + list(where) if dimension not in self.dimensions]
+        if unknown:
+            raise Exception(f"Unknown cube dimensions: {unknown}")
+
+        if 'origin' in by or 'origin' in where:
+            counts = self._sparse_query(by, where)
+        else:
+            counts = self._dense_query(by, where)
+
+        if not by:
+            return int(counts.sum())
+        if len(by) == 1:
+            index = pd.Index(self._label_index(by[0]), name=by[0])
+        else:
+            index = pd.MultiIndex.from_product([self._label_index(dimension) for dimension in by], names=by)
+        return pd.Series(counts.ravel(), index=index, name='count')
+
+    def _dense_selections(self, where: Dict[str, Selection]) -> List[Optional[np.ndarray]]:
+        """Per dense axis, the selected codes or None for the whole axis"""
+        selections: List[Optional[np.ndarray]] = [None] * len(DENSE_DIMENSIONS)
+        for dimension, selection in where.items():
+            codes = self._selected_codes(dimension, selection)
+            if dimension == 'weekday':
+                codes = np.flatnonzero(np.isin(self._weekday_codes, codes))
+                dimension = 'date'
+            axis = DENSE_DIMENSIONS.index(dimension)
+            if selections[axis] is not None:
+                codes = np.intersect1d(selections[axis], codes)
+            selections[axis] = codes
+        return selections
+
+    def _dense_query(self, by: List[str], where: Dict[str, Selection]) -> np.ndarray:
+        stored_by = [DERIVED_DIMENSIONS.get(dimension, dimension) for dimension in by]
+        if len(set(stored_by)) < len(stored_by):
+            raise Exception(f"Cannot group by {by} at once; they share the date axis")
+        keep = frozenset(DENSE_DIMENSIONS.index(dimension) for dimension in stored_by)
+        selections = self._dense_selections(where)
+        keep_axes = keep | {axis for axis, codes in enumerate(selections) if codes is not None}
+
+        array = self._marginal(frozenset(keep_axes))
+        for axis, codes in enumerate(selections):
+            if codes is None:
+                continue
+            if axis in keep:
+                # Grouped axes keep every label, so unselected labels read as zero
+                mask = np.zeros(array.shape[axis], dtype=array.dtype)
+                mask[codes] = 1
+                array = array * mask.reshape([-1 if other == axis else 1 for other in range(array.ndim)])
+            else:
+                array = np.take(array, codes, axis=axis)
+        array = array.sum(axis=tuple(sorted(keep_axes - keep)), keepdims=True)
+
+        # Move the grouped axes into the requested order and drop the summed ones
+        order = sorted(keep, key=lambda axis: stored_by.index(DENSE_DIMENSIONS[axis]))
+        array = array.squeeze(axis=tuple(axis for axis in range(array.ndim) if axis not in keep))
+        array = np.moveaxis(array, [sorted(keep).index(axis) for axis in order], range(len(order)))
+
+        if 'weekday' in by:
+            array = self._roll_up_weekdays(array, by.index('weekday'))
+        return array
+
+    def _roll_up_weekdays(self, array: np.ndarray, axis: int) -> np.ndarray:
+        """Fold a date axis into its seven weekdays"""
+        array = np.moveaxis(array, axis, 0)
+        folded = np.zeros((len(WEEKDAY_LABELS),) + array.shape[1:], dtype=array.dtype)
+        np.add.at(folded, self._weekday_codes, array)
+        return np.moveaxis(folded, 0, axis)
+
+    def _sparse_query(self, by: List[str], where: Dict[str, Selection]) -> np.ndarray:
+        shape = self.dense.shape
+        cell_codes = np.unravel_index(self.origin_cells, shape)
+        columns = {dimension: cell_codes[axis] for axis, dimension in enumerate(DENSE_DIMENSIONS)}
+        columns['origin'] = self.origin_codes
+        columns['weekday'] = self._weekday_codes[columns['date']]
+
+        mask = np.ones(len(self.origin_counts), dtype=bool)
+        for dimension, selection in where.items():
+            mask &= np.isin(columns[dimension], self._selected_codes(dimension, selection))
+
+        sizes = [len(self._label_index(dimension)) for dimension in by]
+        if not by:
+            return self.origin_counts[mask]
+        keys = np.ravel_multi_index([columns[dimension][mask] for dimension in by], sizes)
+        return np.bincount(keys, weights=self.origin_counts[mask], minlength=int(np.prod(sizes))).astype(np.int64).reshape(sizes)
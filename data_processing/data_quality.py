@@ -0,0 +1,58 @@
+from typing import Dict
+import numpy as np
+import pandas as pd
+from config import Config
+
+
+# Bit of each anomaly in the quality_flags column
+ANOMALY_FLAGS = {
+    'missing_response_time': 1,
+    'negative_response_time': 2,
+    'response_time_over_max': 4,
+    'missing_priority': 8,
+    'missing_level': 16,
+    'missing_origin': 32,
+    'invalid_hour': 64,
+}
+
+# Anomalies whose response time is masked to NaN
+RESPONSE_TIME_ANOMALIES = ['missing_response_time', 'negative_response_time', 'response_time_over_max']
+
+
+def screen_records(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Flag every anomaly in loaded records in one vectorized pass.
+
+    Each row gets a quality_flags bitmask and response times that cannot be
+    real are set to NaN, so generators need no cleaning of their own. Rows
+    are never dropped or copied; the frame is updated in place and returned.
+    """
+    response_time = pd.to_numeric(df['response_time'], errors='coerce').to_numpy(dtype=np.float64)
+    hour = pd.to_numeric(df['hour'], errors='coerce').to_numpy(dtype=np.float64)
+
+    with np.errstate(invalid='ignore'):
+        checks = {
+            'missing_response_time': np.isnan(response_time),
+            'negative_response_time': response_time < 0,
+            'response_time_over_max': response_time > Config.RESPONSE_TIME_MAX,
+            'missing_priority': df['priority'].isna().to_numpy(),
+            'missing_level': df['level'].isna().to_numpy(),
+            'missing_origin': df['origin'].isna().to_numpy(),
+            'invalid_hour': ~((hour >= 0) & (hour <= 23)),
+        }
+
+    flags = np.zeros(len(df), dtype=np.uint8)
+    for anomaly, mask in checks.items():
+        flags[mask] |= ANOMALY_FLAGS[anomaly]
+    df['quality_flags'] = flags
+
+    bad_response_time = np.logical_or.reduce([checks[anomaly] for anomaly in RESPONSE_TIME_ANOMALIES])
+    if bad_response_time.any():
+        df['response_time'] = np.where(bad_response_time, np.nan, response_time)
+    return df
+
+
+def anomaly_counts(flags: pd.Series) -> Dict[str, int]:
+    """Count the rows carrying each anomaly in a quality_flags column"""
+    flags = flags.to_numpy()
+    return {anomaly: int(np.count_nonzero(flags & bit)) for anomaly, bit in ANOMALY_FLAGS.items()}
@@ -1,72 +1,473 @@
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from datetime import datetime, timedelta
+from pandas.api.types import union_categoricals
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
 from config import Config
+from columnar_store import ColumnarStore, RECORD_COLUMNS
+from date_utils import DateLike, DateManager
+from metrics import metrics
+from shards import Segment, ShardCatalog
+
+
+class ConnectionManager:
+    """Per-thread cache of SQLite connections shared by every DatabaseManager in the process"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._wal_checked = set()
+        self._lock = threading.Lock()
+
+    def _connections(self) -> Dict[Tuple[str, bool, bool], sqlite3.Connection]:
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        return self._local.connections
+
+    def _ensure_wal(self, db_path: str) -> None:
+        """Switch the database to WAL once so readers never block behind the ingest writer"""
+        with self._lock:
+            if db_path in self._wal_checked:
+                return
+            self._wal_checked.add(db_path)
+        try:
+            conn = sqlite3.connect(db_path, timeout=Config.SQLITE_BUSY_TIMEOUT)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # Read-only deployments keep whatever journal mode the writer chose
+            pass
+
+    def _open(self, db_path: str, read_only: bool, immutable: bool) -> sqlite3.Connection:
+        if immutable:
+            # Sealed shards never change, so SQLite can skip locking and keep its cache
+            uri = f"{Path(db_path).resolve().as_uri()}?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, timeout=Config.SQLITE_BUSY_TIMEOUT)
+        elif read_only:
+            self._ensure_wal(db_path)
+            uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=Config.SQLITE_BUSY_TIMEOUT)
+        else:
+            self._ensure_wal(db_path)
+            conn = sqlite3.connect(db_path, timeout=Config.SQLITE_BUSY_TIMEOUT)
+
+        conn.execute(f"PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size={int(Config.SQLITE_CACHE_SIZE)}")
+        conn.execute(f"PRAGMA temp_store={Config.SQLITE_TEMP_STORE}")
+        return conn
+
+    def get(self, db_path: str, read_only: bool = True, immutable: bool = False) -> sqlite3.Connection:
+        """Return this thread's connection for db_path, opening it on first use"""
+        connections = self._connections()
+        key = (db_path, read_only, immutable)
+        if key not in connections:
+            connections[key] = self._open(db_path, read_only, immutable)
+        return connections[key]
+
+    def close_all(self) -> None:
+        """Close the calling thread's cached connections"""
+        for conn in self._connections().values():
+            conn.close()
+        self._local.connections = {}
+
+
+connection_manager = ConnectionManager()
+
+_read_pool: Optional[ThreadPoolExecutor] = None
+_read_pool_lock = threading.Lock()
+
+
+def read_pool() -> ThreadPoolExecutor:
+    """Threads shared by every fan-out read, so each keeps its cached connections between reads"""
+    global _read_pool
+    with _read_pool_lock:
+        if _read_pool is None:
+            _read_pool = ThreadPoolExecutor(max_workers=Config.SHARD_READ_THREADS, thread_name_prefix='shard-read')
+        return _read_pool
+
+
+# Low-cardinality text columns dictionary-encoded when records are read in chunks
+TEXT_COLUMNS = ['division', 'priority', 'category', 'level', 'weekday']
+
+# Ids looked up in a shard per query when checking the live rows pending for it
+PENDING_ID_BATCH = 500
+
+T = TypeVar('T')
+
 
 class DatabaseManager:
-    def __init__(self, db_path=Config.DATABASE_PATH):
+    def __init__(
+        self,
+        db_path=Config.DATABASE_PATH,
+        use_columnar_store: bool = Config.USE_COLUMNAR_STORE,
+        use_shards: bool = Config.USE_SHARDS
+    ):
         self.db_path = db_path
+        self.columnar_store = ColumnarStore() if use_columnar_store else None
+        self.shards = ShardCatalog() if use_shards else None
+        self._origins: Optional[pd.Series] = None
+        # Query results from sealed shards, which can never change
+        self._sealed_results: Dict[tuple, pd.DataFrame] = {}
 
-    def get_connection(self):
-        """Create and return a database connection."""
+    def get_connection(self, read_only: bool = True):
+        """Return a reused, read-optimized database connection."""
         try:
-            return sqlite3.connect(self.db_path)
+            return connection_manager.get(self.db_path, read_only)
         except sqlite3.Error as e:
             raise Exception(f"Database connection error: {str(e)}")
 
-    def _convert_date_format(self, date_str: str) -> str:
-        """Convert from MM/DD/YYYY to MM/DD/YY format for database queries."""
+    def segments(self, start_day: int, end_day: int) -> List[Segment]:
+        """Return the stores holding an inclusive range of day numbers, in date order"""
+        if self.shards is None:
+            return [Segment(self.db_path, start_day, end_day)]
+        return self.shards.segments(self.db_path, start_day, end_day)
+
+    def segment_connection(self, segment: Segment):
+        if segment.path == self.db_path:
+            return self.get_connection()
+        try:
+            return connection_manager.get(segment.path, immutable=segment.immutable)
+        except sqlite3.Error as e:
+            raise Exception(f"Database connection error: {str(e)}")
+
+    @staticmethod
+    def fan_out(read: Callable[[Segment], T], segments: List[Segment]) -> List[T]:
+        """Run read for every segment, on the read pool when the range spans several stores"""
+        if len(segments) == 1:
+            return [read(segments[0])]
+        return list(read_pool().map(read, segments))
+
+    def pending_rows(self, segment: Segment, sql: str, params: tuple) -> pd.DataFrame:
+        """
+        Run a query selecting id first over the live rows of a shard's days, minus the ids the shard has.
+
+        Writers insert into the live database whatever the date, so rows for
+        a sharded period wait there until the next sync moves them, and an
+        upload can repeat rows the shard already holds.
+        """
+        with self.get_connection() as conn:
+            rows = pd.read_sql_query(sql, conn, params=params)
+        if rows.empty:
+            return rows.drop(columns='id')
+
+        ids = rows['id'].tolist()
+        stored = []
+        with self.segment_connection(segment) as conn:
+            for i in range(0, len(ids), PENDING_ID_BATCH):
+                batch = ids[i:i + PENDING_ID_BATCH]
+                stored.extend(
+                    row_id for (row_id,) in conn.execute(
+                        f"SELECT id FROM records WHERE id IN ({', '.join('?' * len(batch))})", batch
+                    )
+                )
+        return rows[~rows['id'].isin(stored)].drop(columns='id').reset_index(drop=True)
+
+    @staticmethod
+    def rollup_horizon(conn) -> Optional[int]:
+        """Return the last day a store folded into rollups, or None if it was never compacted"""
+        compacted = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'retention'"
+        ).fetchone()
+        if compacted is None:
+            return None
+        return conn.execute("SELECT MAX(horizon_day) FROM retention").fetchone()[0]
+
+    def count_records(
+        self,
+        start_day: int,
+        end_day: int,
+        group_columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, object]] = None
+    ) -> pd.DataFrame:
+        """
+        Count records per group in an inclusive day range across every store.
+
+        Raw rows are counted and compacted days add their rollup counts, so
+        the totals do not change when rows are folded into rollups; raw rows
+        on compacted days are new, since ingest skips archived ids. Counts
+        from sealed shards are kept for the life of the manager; live rows
+        pending for a shard are counted on every call.
+        """
+        group_columns = list(group_columns or [])
+        filters = {column: value for column, value in (filters or {}).items() if value is not None}
+        select = ''.join(f'{column}, ' for column in group_columns)
+        group_by = f" GROUP BY {', '.join(group_columns)}" if group_columns else ''
+        where = ' AND '.join(['service_day BETWEEN ? AND ?'] + [f'{column} = ?' for column in filters])
+
+        def read(segment: Segment) -> pd.DataFrame:
+            key = (segment.path, segment.start_day, segment.end_day, tuple(group_columns), tuple(filters.items()))
+            if key in self._sealed_results:
+                metrics.inc('cache_requests_total', cache='sealed_shard', result='hit')
+                return self._sealed_results[key]
+            if segment.immutable:
+                metrics.inc('cache_requests_total', cache='sealed_shard', result='miss')
+
+            params = (segment.start_day, segment.end_day) + tuple(filters.values())
+            with self.segment_connection(segment) as conn:
+                horizon = self.rollup_horizon(conn)
+                if horizon is None or horizon < segment.start_day:
+                    result = pd.read_sql_query(
+                        f"SELECT {select}COUNT(*) AS records FROM records WHERE {where}{group_by}", conn, params=params
+                    )
+                else:
+                    result = self.concat_frames([
+                        pd.read_sql_query(
+                            f"SELECT {select}SUM(records) AS records FROM rollup_rows WHERE {where}{group_by}",
+                            conn,
+                            params=params
+                        ),
+                        pd.read_sql_query(
+                            f"SELECT {select}COUNT(*) AS records FROM records WHERE {where}{group_by}",
+                            conn,
+                            params=params
+                        )
+                    ])
+            if segment.immutable:
+                self._sealed_results[key] = result
+            if segment.path == self.db_path:
+                return result
+
+            pending = self.pending_rows(
+                segment,
+                f"SELECT {', '.join(['id'] + group_columns)} FROM records WHERE {where}",
+                params
+            )
+            # Without group columns the rows have no columns left, so empty would always be true
+            if not len(pending):
+                return result
+            if group_columns:
+                pending = pending.groupby(group_columns, dropna=False, observed=True).size().reset_index(name='records')
+            else:
+                pending = pd.DataFrame({'records': [len(pending)]})
+            return self.concat_frames([result, pending])
+
         try:
-            dt = datetime.strptime(date_str, Config.DATE_FORMAT)
-            return dt.strftime(Config.DB_DATE_FORMAT)
-        except ValueError as e:
-            raise Exception(f"Date conversion error: {str(e)}")
+            counts = self.concat_frames(self.fan_out(read, self.segments(start_day, end_day)))
+        except Exception as e:
+            raise Exception(f"Data fetch error: {str(e)}")
+
+        counts['records'] = counts['records'].fillna(0).astype('int64')
+        if not group_columns:
+            return pd.DataFrame({'records': [counts['records'].sum()]})
+        # The same group can come from raw rows and rollups of one store
+        return counts.groupby(group_columns, dropna=False, sort=False, observed=True)['records'].sum().reset_index()
 
-    def fetch_data_for_period(self, start_date: str, end_date: str) -> pd.DataFrame:
+    def fetch_data_for_period(
+        self,
+        start_date: DateLike,
+        end_date: DateLike,
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
         """
         Fetch data for a specific date range.
         
         Args:
-            start_date: Start date in MM/DD/YYYY format
-            end_date: End date in MM/DD/YYYY format
+            start_date: Start date (date or MM/DD/YYYY string)
+            end_date: End date (date or MM/DD/YYYY string)
+            columns: Optional subset of record columns to load
             
         Returns:
-            DataFrame containing the requested data
+            DataFrame containing the requested data, with date_of_service as datetime64
+        """
+        start_dt = DateManager.to_date(start_date)
+        end_dt = DateManager.to_date(end_date)
+
+        if self.columnar_store is not None and self.columnar_store.covers(start_dt, end_dt, columns):
+            return self.columnar_store.read(start_dt, end_dt, columns)
+
+        return self.fetch_data_from_sqlite(start_dt, end_dt, columns)
+
+    def fetch_data_from_sqlite(
+        self,
+        start_date: DateLike,
+        end_date: DateLike,
+        columns: Optional[List[str]] = None,
+        chunk_rows: Optional[int] = None
+    ) -> pd.DataFrame:
         """
-        # Convert input dates to database format (MM/DD/YY)
-        db_start_date = self._convert_date_format(start_date)
-        db_end_date = self._convert_date_format(end_date)
+        Fetch data for a date range directly from the records table.
         
-        query = """
+        With chunk_rows the rows are read that many at a time and each chunk's
+        text columns are made categorical before the next one is read, so a
+        long range never holds every row as Python strings at once. With
+        shards the overlapping stores are read in parallel and joined in
+        date order, each shard with the live rows still pending for it.
+        Days folded into rollups come back as one row per record from the
+        rollup counts, with response times from their histograms only when
+        that column is asked for.
+        """
+        columns = list(columns or RECORD_COLUMNS)
+
+        # Rows carry only the origin id; names are joined from the origins table afterwards
+        sql_columns = [column for column in columns if column != 'origin']
+        if 'origin' in columns and 'origin_id' not in sql_columns:
+            sql_columns.append('origin_id')
+
+        # service_day is the day number parsed once at ingest, so no text dates are read here
+        select_list = [
+            'service_day AS date_of_service' if column == 'date_of_service' else column
+            for column in sql_columns
+        ]
+        query = f"""
         SELECT 
-            date_of_service,
-            division,
-            priority,
-            category,
-            level,
-            weekday,
-            Hour,
-            origin,
-            response_time
+            {', '.join(select_list)}
         FROM records
-        WHERE date_of_service BETWEEN ? AND ?
+        WHERE service_day BETWEEN ? AND ?
         """
+        rollup_source, rollup_records = (
+            ('rollup_rows JOIN response_rollups USING (rollup_id)', 'response_rollups.records')
+            if 'response_time' in sql_columns else ('rollup_rows', 'records')
+        )
+        rollup_query = f"""
+        SELECT 
+            {', '.join(select_list)}, SUM({rollup_records}) AS records
+        FROM {rollup_source}
+        WHERE service_day BETWEEN ? AND ?
+        GROUP BY {', '.join(str(position) for position in range(1, len(select_list) + 1))}
+        """
+        
+        def read_query(conn, sql: str, params: tuple, expand: bool = False) -> List[pd.DataFrame]:
+            frames = pd.read_sql_query(sql, conn, params=params, chunksize=chunk_rows) if chunk_rows else [
+                pd.read_sql_query(sql, conn, params=params)
+            ]
+            frames = [self._expand_rollups(frame) if expand else frame for frame in frames]
+            if not chunk_rows:
+                return frames
+            # An empty chunk's text columns have no type to merge categories with
+            return [self._compact_chunk(frame) for frame in frames if not frame.empty]
+        
+        def read(segment: Segment) -> List[pd.DataFrame]:
+            params = (segment.start_day, segment.end_day)
+            with self.segment_connection(segment) as conn:
+                horizon = self.rollup_horizon(conn)
+                if horizon is None or horizon < segment.start_day:
+                    frames = read_query(conn, query, params)
+                else:
+                    frames = (
+                        read_query(conn, rollup_query, (segment.start_day, min(segment.end_day, horizon)), expand=True) +
+                        read_query(conn, query, params)
+                    )
+            if segment.path == self.db_path:
+                return frames
+
+            pending = self.pending_rows(
+                segment,
+                f"SELECT id, {', '.join(select_list)} FROM records WHERE service_day BETWEEN ? AND ?",
+                params
+            )
+            if pending.empty:
+                return frames
+            return frames + [self._compact_chunk(pending) if chunk_rows else pending]
         
         try:
-            with self.get_connection() as conn:
-                df = pd.read_sql_query(
-                    query,
-                    conn,
-                    params=(db_start_date, db_end_date)
-                )
-                
-                # Convert two-digit years to four-digit years
-                df['date_of_service'] = pd.to_datetime(
-                    df['date_of_service'],
-                    format=Config.DB_DATE_FORMAT
-                )
-                
-                return df
+            segments = self.segments(DateManager.to_day_number(start_date), DateManager.to_day_number(end_date))
+            parts = [frame for frames in self.fan_out(read, segments) for frame in frames]
+            if chunk_rows:
+                df = self._concat_chunks(parts, sql_columns)
+            else:
+                df = self.concat_frames(parts)
+            
+            if 'date_of_service' in df.columns:
+                df['date_of_service'] = pd.to_datetime(df['date_of_service'], unit='D')
+            
+            if 'origin' in columns:
+                df['origin'] = self.origin_names(df['origin_id'])
+            
+            return df[columns]
                 
         except Exception as e:
             raise Exception(f"Data fetch error: {str(e)}")
+
+    @staticmethod
+    def _expand_rollups(rollups: pd.DataFrame) -> pd.DataFrame:
+        """Repeat every rollup row once per record it counts"""
+        counts = rollups.pop('records').to_numpy()
+        return rollups.loc[rollups.index.repeat(counts)].reset_index(drop=True)
+
+    @staticmethod
+    def _compact_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+        for column in TEXT_COLUMNS:
+            if column in chunk.columns:
+                chunk[column] = chunk[column].astype('category')
+        return chunk
+
+    @staticmethod
+    def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+        """Stack per-store results; a store with no rows does not change the column types"""
+        if len(frames) == 1:
+            return frames[0]
+        
+        df = pd.concat([frame for frame in frames if not frame.empty] or frames[:1], ignore_index=True)
+        for column in df.columns:
+            # A store whose values are all NULL comes back as object
+            if column not in TEXT_COLUMNS and df[column].dtype == object:
+                df[column] = pd.to_numeric(df[column])
+        return df
+
+    @staticmethod
+    def _concat_chunks(chunks: List[pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+        """Join compacted chunks, merging each text column's categories"""
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        
+        data = {}
+        for column in chunks[0].columns:
+            if column in TEXT_COLUMNS:
+                data[column] = union_categoricals([chunk[column] for chunk in chunks])
+            else:
+                # A chunk whose values are all NULL comes back as object
+                data[column] = pd.to_numeric(pd.concat([chunk[column] for chunk in chunks], ignore_index=True))
+        return pd.DataFrame(data)
+
+    def fetch_origins(self, refresh: bool = False) -> pd.Series:
+        """Return normalized origin names indexed by origin id."""
+        if self._origins is None or refresh:
+            try:
+                with self.get_connection() as conn:
+                    origins = pd.read_sql_query("SELECT id, name FROM origins ORDER BY id", conn)
+            except Exception as e:
+                raise Exception(f"Origin fetch error: {str(e)}")
+            self._origins = origins.set_index('id')['name']
+        return self._origins
+
+    def origin_names(self, origin_ids: pd.Series) -> pd.Categorical:
+        """
+        Map origin ids to a categorical of names.
+        
+        Only the small origins dictionary holds strings; the rows become
+        integer codes, so grouping on origin never hashes the long names.
+        """
+        origins = self.fetch_origins()
+        codes = origins.index.get_indexer(origin_ids)
+        if ((codes == -1) & origin_ids.notna().to_numpy()).any():
+            # Origins registered by an ingest that ran after the dictionary was loaded
+            origins = self.fetch_origins(refresh=True)
+            codes = origins.index.get_indexer(origin_ids)
+        return pd.Categorical.from_codes(codes, categories=pd.Index(origins.to_numpy()))
+
+    def fetch_date_bounds(self) -> Tuple[date, date]:
+        """Return the first and last date of service."""
+        days = self.count_records(*DateManager.ALL_DAYS, group_columns=['service_day'])['service_day']
+        if days.empty:
+            raise Exception("No records in database")
+
+        return DateManager.from_day_number(days.min()), DateManager.from_day_number(days.max())
+
+    def fetch_record_ids(self) -> pd.Series:
+        """Return the id of every raw record stored, including rows pending for a shard"""
+        def read(segment: Segment) -> pd.DataFrame:
+            with self.segment_connection(segment) as conn:
+                return pd.read_sql_query("SELECT id FROM records", conn)
+
+        # Every shard, plus the whole live database whatever days its rows have
+        stores = [Segment(self.db_path, *DateManager.ALL_DAYS)] + [
+            segment for segment in self.segments(*DateManager.ALL_DAYS) if segment.path != self.db_path
+        ]
+        try:
+            return self.concat_frames(self.fan_out(read, stores))['id']
+        except Exception as e:
+            raise Exception(f"Data fetch error: {str(e)}")
@@ -1,35 +1,64 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Union
 from config import Config
 
+DateLike = Union[str, date, datetime]
+
 class DateManager:
+    # Day numbers count days since this epoch; records.service_day uses the same scale
+    EPOCH = date(1970, 1, 1)
+    # Day-number bounds wide enough for any date of service
+    ALL_DAYS = (-2 ** 31, 2 ** 31 - 1)
+
     @staticmethod
     def parse_date(date_str: str) -> datetime:
         """Convert date string to datetime object."""
         return datetime.strptime(date_str, Config.DATE_FORMAT)
-    
+
     @staticmethod
     def format_date(dt: datetime) -> str:
         """Convert datetime object to string."""
         return dt.strftime(Config.DATE_FORMAT)
-    
+
+    @staticmethod
+    def format_file_date(dt: datetime) -> str:
+        """Convert datetime object to a filename-safe string."""
+        return dt.strftime('%m-%d-%Y')
+
+    @staticmethod
+    def to_date(value: DateLike) -> date:
+        """Normalize an MM/DD/YYYY string, datetime or date to a date."""
+        if isinstance(value, str):
+            return DateManager.parse_date(value).date()
+        if isinstance(value, datetime):
+            return value.date()
+        return value
+
     @staticmethod
-    def get_date_ranges(start_date: str, end_date: str) -> dict:
+    def to_day_number(value: DateLike) -> int:
+        """Convert a date to its day number (days since 1970-01-01)."""
+        return (DateManager.to_date(value) - DateManager.EPOCH).days
+
+    @staticmethod
+    def from_day_number(day: int) -> date:
+        """Convert a day number back to a date."""
+        return DateManager.EPOCH + timedelta(days=int(day))
+
+    @staticmethod
+    def get_date_ranges(start_date: DateLike, end_date: DateLike) -> dict:
         """
         Calculate current and previous week date ranges.
-        
+
         Returns:
-            dict containing current and previous week date ranges
+            dict containing current and previous week date ranges as dates
         """
-        start_dt = DateManager.parse_date(start_date)
-        end_dt = DateManager.parse_date(end_date)
-        
+        start_dt = DateManager.to_date(start_date)
+        end_dt = DateManager.to_date(end_date)
+
         prev_start = start_dt - timedelta(days=7)
         prev_end = end_dt - timedelta(days=7)
-        
+
         return {
-            'current': (start_date, end_date),
-            'previous': (
-                DateManager.format_date(prev_start),
-                DateManager.format_date(prev_end)
-            )
-        }
\ No newline at end of file
+            'current': (start_dt, end_dt),
+            'previous': (prev_start, prev_end)
+        }
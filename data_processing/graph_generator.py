@@ -1,27 +1,33 @@
 from dataclasses import dataclass
-from typing import Dict, Tuple, Optional
+from typing import Any, Dict, Tuple, Optional
 from pathlib import Path
+import os
 import pandas as pd
 from config import Config
+from date_utils import DateManager
+from metrics import metrics
+from cube import CallCube, WEEKDAY_LABELS
+from response_stats import ResponseTimeHistogram
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from datetime import datetime
+from seaborn.utils import relative_luminance
+from datetime import date
 
 @dataclass
 class GraphConfig:
     """Configuration for graph generation"""
     DAYS_OF_WEEK = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
-    DAY_MAP = {
-        'Monday': 'Mon', 
-        'Tuesday': 'Tue', 
-        'Wednesday': 'Wed', 
-        'Thursday': 'Thu', 
-        'Friday': 'Fri', 
-        'Saturday': 'Sat', 
-        'Sunday': 'Sun'
+    # Indexed by pandas dayofweek (Monday=0)
+    DAY_ABBREVIATIONS = np.array(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'])
+    RESPONSE_TIME_MAX = Config.RESPONSE_TIME_MAX
+    HEATMAP_CATEGORIES = {
+        'Turned': 'Turned Calls by Hour and Day',
+        'Cancelled': 'Cancelled Calls by Hour and Day',
+        'Ran': 'Ran Calls by Hour and Day'
     }
-    RESPONSE_TIME_MAX = 1440  # 24 hours in minutes
+    # Per-origin reports show all demand in one heatmap
+    ORIGIN_HEATMAP_TITLE = 'Calls by Hour and Day'
     HEATMAP_FIGSIZE = (16, 8)
     RESPONSE_TIME_FIGSIZE = (12, 6)
 
@@ -32,101 +38,169 @@ class GraphGenerator:
         plt.style.use('default')  # Set consistent style
         sns.set_theme(style="whitegrid")
     
-    def _save_plot(self, filename: str) -> str:
-        """Save plot to file and return path"""
+    def _save_plot(self, filename: str, keep_open: bool = False) -> str:
+        """Save the current plot to file and return path"""
         filepath = Config.OUTPUT_DIR / filename
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        plt.close()
+        # Render to a temp file and rename so readers never see a half-written image
+        tmp_path = filepath.with_suffix('.tmp.png')
+        plt.savefig(tmp_path, dpi=300, bbox_inches='tight')
+        if not keep_open:
+            plt.close()
+        os.replace(tmp_path, filepath)
         return str(filepath)
 
-class HeatmapGenerator(GraphGenerator):
-    """Generates heatmaps for different call categories"""
+class HeatmapFigure:
+    """
+    A day-by-hour heatmap figure that is built once and refilled per matrix.
     
-    def _prepare_data(self, df: pd.DataFrame, start_date: str, end_date: str) -> pd.DataFrame:
-        """Prepare dataframe for heatmap generation"""
-        # Convert dates and filter
-        date_range = pd.date_range(start=start_date, end=end_date)
-        df = df[df['date_of_service'].dt.date.isin(date_range.date)]
-        
-        # Map days to shortened versions
-        df['day_of_week'] = df['date_of_service'].dt.day_name().map(GraphConfig.DAY_MAP)
-        
-        # Add count column for aggregation
-        df['count'] = 1
-        
-        return df
+    Only the cell colors, color limits, annotations and title change between
+    heatmaps, so reusing the figure skips recreating the axes, colorbar, tick
+    layout and 168 text artists while producing the same image.
+    """
     
-    def _create_heatmap(
-        self, 
-        data: pd.DataFrame, 
-        title: str, 
-        division: str,
-        start_date: str,
-        end_date: str
-    ) -> pd.DataFrame:
-        """Create and configure a heatmap"""
-        plt.figure(figsize=GraphConfig.HEATMAP_FIGSIZE)
-        
-        # Create pivot table using count column instead of id
-        pivot = pd.pivot_table(
-            data,
-            values='count',  # Changed from 'id' to 'count'
-            index='day_of_week',
-            columns='hour',
-            aggfunc='sum',  # Changed from 'count' to 'sum'
-            fill_value=0
-        )
-        
-        # Ensure all hours are present and reindex days
-        pivot = pivot.reindex(
-            index=GraphConfig.DAYS_OF_WEEK,
-            columns=range(24),
-            fill_value=0
-        )
-        
-        # Create heatmap
-        sns.heatmap(
+    def __init__(self, pivot: pd.DataFrame):
+        self.figure = plt.figure(figsize=GraphConfig.HEATMAP_FIGSIZE)
+        self.ax = sns.heatmap(
             pivot,
             cmap="YlOrRd",
             annot=True,
             fmt="d",
             cbar_kws={'label': 'Number of Calls'}
         )
+        self.mesh = self.ax.collections[0]
+        self.texts = list(self.ax.texts)
+        self.index = pivot.index
+        self.columns = pivot.columns
         
-        plt.title(f'{title} - {division}\n{start_date} to {end_date}')
         plt.xlabel('Hour of Day')
         plt.ylabel('Day of Week')
         plt.xticks(range(0, 24, 1), range(24))
-        plt.tight_layout()
+    
+    def matches(self, pivot: pd.DataFrame) -> bool:
+        """Whether the pivot has the same cells this figure was built for"""
+        return (
+            plt.fignum_exists(self.figure.number) and
+            pivot.index.equals(self.index) and
+            pivot.columns.equals(self.columns)
+        )
+    
+    def update(self, pivot: pd.DataFrame) -> None:
+        """Swap in a new matrix, recoloring the annotations the way seaborn does"""
+        values = pivot.to_numpy()
+        self.mesh.set_array(np.ma.asarray(values))
+        # seaborn scales the colormap to the data range
+        self.mesh.set_clim(np.nanmin(values.astype(float)), np.nanmax(values.astype(float)))
+        self.mesh.update_scalarmappable()
+        
+        for text, color, value in zip(self.texts, self.mesh.get_facecolors(), values.flat):
+            text.set_text(f'{value:d}')
+            text.set_color('.15' if relative_luminance(color) > .408 else 'w')
+    
+    def activate(self, title: str) -> None:
+        """Make this the current pyplot figure with the given title and layout"""
+        plt.figure(self.figure.number)
+        self.ax.set_title(title)
+        self.figure.tight_layout()
+
+class HeatmapGenerator(GraphGenerator):
+    """Generates heatmaps for different call categories"""
+    
+    # Shared across divisions and weeks when Config.REUSE_HEATMAP_FIGURE is set
+    _figure: Optional[HeatmapFigure] = None
+    
+    def _pivot(self, cube: CallCube, category: str, window: pd.DatetimeIndex) -> pd.DataFrame:
+        """Count one category's calls into a 7x24 day-of-week by hour matrix"""
+        counts = cube.query(['weekday', 'hour'], where={'category': category, 'date': window})
+        return self.layout(counts.unstack(fill_value=0))
+    
+    @staticmethod
+    def layout(counts: pd.DataFrame) -> pd.DataFrame:
+        """Arrange weekday by hour counts as the Sunday-first 7x24 matrix a heatmap shows"""
+        pivot = counts.reindex(index=WEEKDAY_LABELS)
+        
+        # Map days to shortened versions and order them Sunday first
+        pivot.index = pd.Index(GraphConfig.DAY_ABBREVIATIONS, name='day_of_week')
+        return pivot.reindex(
+            index=GraphConfig.DAYS_OF_WEEK,
+            columns=pd.RangeIndex(24, name='hour'),
+            fill_value=0
+        ).astype(int)
+    
+    def pivot_matrices(
+        self,
+        df: pd.DataFrame,
+        start_date: date,
+        end_date: date,
+        cube: Optional[CallCube] = None
+    ) -> Dict[str, pd.DataFrame]:
+        """Return the heatmap matrix for each category"""
+        if cube is None:
+            cube = CallCube.from_frame(df)
+        window = pd.date_range(pd.Timestamp(start_date), pd.Timestamp(end_date), freq='D')
+        return {
+            category: self._pivot(cube, category, window)
+            for category in GraphConfig.HEATMAP_CATEGORIES
+        }
+    
+    def _create_heatmap(
+        self, 
+        pivot: pd.DataFrame, 
+        title: str, 
+        division: str,
+        start_date: date,
+        end_date: date
+    ) -> None:
+        """Create and configure a heatmap as the current figure"""
+        title = (
+            f'{title} - {division}\n'
+            f'{DateManager.format_date(start_date)} to {DateManager.format_date(end_date)}'
+        )
+        
+        if Config.REUSE_HEATMAP_FIGURE:
+            figure = HeatmapGenerator._figure
+            if figure is not None and figure.matches(pivot):
+                metrics.inc('cache_requests_total', cache='heatmap_figure', result='hit')
+                figure.update(pivot)
+            else:
+                metrics.inc('cache_requests_total', cache='heatmap_figure', result='miss')
+                figure = HeatmapGenerator._figure = HeatmapFigure(pivot)
+            figure.activate(title)
+            return
         
-        return pivot
+        HeatmapFigure(pivot).activate(title)
+    
+    def render(
+        self,
+        pivot: pd.DataFrame,
+        title: str,
+        division: str,
+        start_date: date,
+        end_date: date,
+        filename: str
+    ) -> str:
+        """Draw one heatmap and save it under filename; return its path"""
+        self._create_heatmap(pivot, title, division, start_date, end_date)
+        return self._save_plot(filename, keep_open=Config.REUSE_HEATMAP_FIGURE)
     
     def generate_heatmaps(
         self,
         df: pd.DataFrame,
         division: str,
-        start_date: str,
-        end_date: str
+        start_date: date,
+        end_date: date,
+        cube: Optional[CallCube] = None
     ) -> Tuple[str, str, str]:
         """Generate all heatmaps for a division"""
         
-        # Prepare data
-        df = self._prepare_data(df, start_date, end_date)
-        
-        # Generate heatmaps for each category
-        categories = {
-            'Turned': 'Turned Calls by Hour and Day',
-            'Cancelled': 'Cancelled Calls by Hour and Day',
-            'Ran': 'Ran Calls by Hour and Day'
-        }
-        
         paths = []
-        for category, title in categories.items():
-            category_data = df[df['category'] == category]
-            pivot = self._create_heatmap(category_data, title, division, start_date, end_date)
-            
-            filename = f'{category.lower()}_heatmap_{division}_{start_date.replace("/", "-")}_{end_date.replace("/", "-")}.png'
-            paths.append(self._save_plot(filename))
+        for category, pivot in self.pivot_matrices(df, start_date, end_date, cube).items():
+            filename = (
+                f'{category.lower()}_heatmap_{division}_'
+                f'{DateManager.format_file_date(start_date)}_{DateManager.format_file_date(end_date)}.png'
+            )
+            paths.append(self.render(
+                pivot, GraphConfig.HEATMAP_CATEGORIES[category], division, start_date, end_date, filename
+            ))
         
         return tuple(paths)
 
@@ -134,26 +208,37 @@ class ResponseTimeDistributionGenerator(GraphGenerator):
     """Generates response time distribution graphs"""
     
     def _prepare_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Prepare data for response time distribution"""
-        # Convert response_time to numeric and clean data
-        df = df.copy()
-        df['response_time'] = pd.to_numeric(df['response_time'], errors='coerce')
+        """Select the rows the distribution is drawn from; invalid times were masked at load"""
+        return df[ResponseTimeHistogram.valid_mask(df['response_time'], df['priority'])]
+    
+    def histogram_bins(self, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+        """
+        Return 1-minute density bins per priority up to the 99th percentile,
+        the same view the matplotlib histogram draws
+        """
+        histograms = ResponseTimeHistogram.by_group(df, 'priority')
+        if not histograms:
+            return None
         
-        # Remove invalid values and outliers
-        df = df.dropna(subset=['response_time', 'priority'])
-        df = df[
-            (df['response_time'] <= GraphConfig.RESPONSE_TIME_MAX) &
-            (df['response_time'] > 0)
-        ]
+        overall = sum(histograms.values(), ResponseTimeHistogram())
+        xmax = overall.percentile(0.99)
         
-        return df
+        series = []
+        for priority, histogram in sorted(histograms.items()):
+            density = histogram.counts[:xmax + 1] / histogram.total
+            series.append({
+                'priority': priority,
+                'points': [[minute, round(float(value), 6)] for minute, value in enumerate(density)]
+            })
+        
+        return {'xmax': xmax, 'thresholds': Config.RESPONSE_TIME_SLAS, 'series': series}
     
     def generate_distribution(
         self,
         df: pd.DataFrame,
         division: str,
-        start_date: str,
-        end_date: str
+        start_date: date,
+        end_date: date
     ) -> Optional[str]:
         """Generate response time distribution graph"""
         # Prepare data
@@ -180,7 +265,10 @@ class ResponseTimeDistributionGenerator(GraphGenerator):
         plt.axvline(x=60, color='g', linestyle='--', label='60 min threshold')
         
         # Configure plot
-        plt.title(f'Response Time Distribution by Priority - {division}\n{start_date} to {end_date}')
+        plt.title(
+            f'Response Time Distribution by Priority - {division}\n'
+            f'{DateManager.format_date(start_date)} to {DateManager.format_date(end_date)}'
+        )
         plt.xlabel('Response Time (minutes)')
         plt.ylabel('Density')
         plt.legend(title='Priority')
@@ -188,12 +276,17 @@ class ResponseTimeDistributionGenerator(GraphGenerator):
         plt.tight_layout()
         
         # Save plot
-        filename = f'response_time_distribution_{division}_{start_date.replace("/", "-")}_{end_date.replace("/", "-")}.png'
+        filename = (
+            f'response_time_distribution_{division}_'
+            f'{DateManager.format_file_date(start_date)}_{DateManager.format_file_date(end_date)}.png'
+        )
         return self._save_plot(filename)
 
 class ReportGraphManager:
     """Manages the generation of all graphs for the report"""
     
+    BACKENDS = ('matplotlib', 'pgfplots')
+    
     def __init__(self):
         self.output_dir = Config.OUTPUT_DIR
         self.heatmap_generator = HeatmapGenerator()
@@ -203,23 +296,90 @@ class ReportGraphManager:
         self,
         df: pd.DataFrame,
         division: str,
-        start_date: str,
-        end_date: str
-    ) -> Dict[str, str]:
-        """Generate all graphs for a division"""
+        start_date: date,
+        end_date: date,
+        cube: Optional[CallCube] = None
+    ) -> Dict[str, Any]:
+        """Generate all graphs for a division with the configured backend"""
+        if Config.GRAPH_BACKEND == 'pgfplots':
+            return self.generate_division_graph_data(df, division, start_date, end_date, cube)
+        if Config.GRAPH_BACKEND != 'matplotlib':
+            raise Exception(f"Unknown graph backend: {Config.GRAPH_BACKEND}")
+        
         # Generate heatmaps
         turned_path, cancelled_path, ran_path = self.heatmap_generator.generate_heatmaps(
-            df, division, start_date, end_date
+            df, division, start_date, end_date, cube
         )
         
         # Generate response time distribution
         response_time_path = self.response_time_generator.generate_distribution(
             df, division, start_date, end_date
         )
+        metrics.inc('graphs_rendered_total', len(GraphConfig.HEATMAP_CATEGORIES), backend='matplotlib', kind='heatmap')
+        if response_time_path:
+            metrics.inc('graphs_rendered_total', backend='matplotlib', kind='response_time_distribution')
         
         return {
+            'graph_backend': 'matplotlib',
             'turned_heatmap': Path(turned_path).name,
             'cancelled_heatmap': Path(cancelled_path).name,
             'ran_heatmap': Path(ran_path).name,
             'response_time_distribution': Path(response_time_path).name if response_time_path else None
-        }
\ No newline at end of file
+        }
+    
+    def generate_division_graph_data(
+        self,
+        df: pd.DataFrame,
+        division: str,
+        start_date: date,
+        end_date: date,
+        cube: Optional[CallCube] = None
+    ) -> Dict[str, Any]:
+        """Return the data behind each graph so the template can draw it with pgfplots"""
+        graphs: Dict[str, Any] = {'graph_backend': 'pgfplots'}
+        
+        for category, pivot in self.heatmap_generator.pivot_matrices(df, start_date, end_date, cube).items():
+            graphs[f'{category.lower()}_heatmap'] = self.heatmap_data(GraphConfig.HEATMAP_CATEGORIES[category], pivot)
+        
+        graphs['response_time_distribution'] = self.response_time_generator.histogram_bins(df)
+        metrics.inc('graphs_rendered_total', len(GraphConfig.HEATMAP_CATEGORIES), backend='pgfplots', kind='heatmap')
+        if graphs['response_time_distribution'] is not None:
+            metrics.inc('graphs_rendered_total', backend='pgfplots', kind='response_time_distribution')
+        return graphs
+    
+    @staticmethod
+    def heatmap_data(title: str, pivot: pd.DataFrame) -> Dict[str, Any]:
+        """The cells of a heatmap for pgfplots to draw"""
+        return {
+            'title': title,
+            'days': list(pivot.index),
+            'counts': pivot.to_numpy().tolist(),
+            'max': int(pivot.to_numpy().max())
+        }
+    
+    def generate_origin_heatmap(
+        self,
+        pivot: pd.DataFrame,
+        origin: str,
+        slug: str,
+        division: str,
+        start_date: date,
+        end_date: date
+    ) -> Dict[str, Any]:
+        """Produce one origin's demand heatmap with the configured backend"""
+        if Config.GRAPH_BACKEND == 'pgfplots':
+            graph = self.heatmap_data(GraphConfig.ORIGIN_HEATMAP_TITLE, pivot)
+        elif Config.GRAPH_BACKEND == 'matplotlib':
+            filename = (
+                f'origin_heatmap_{division}_{slug}_'
+                f'{DateManager.format_file_date(start_date)}_{DateManager.format_file_date(end_date)}.png'
+            )
+            path = self.heatmap_generator.render(
+                pivot, GraphConfig.ORIGIN_HEATMAP_TITLE, f'{origin} ({division})', start_date, end_date, filename
+            )
+            graph = Path(path).name
+        else:
+            raise Exception(f"Unknown graph backend: {Config.GRAPH_BACKEND}")
+        
+        metrics.inc('graphs_rendered_total', backend=Config.GRAPH_BACKEND, kind='origin_heatmap')
+        return {'graph_backend': Config.GRAPH_BACKEND, 'heatmap': graph}
@@ -0,0 +1,314 @@
+import argparse
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+import pandas as pd
+from config import Config
+from database import DatabaseManager
+from date_utils import DateManager
+from main import Logger
+from precompute import IngestPrecomputer
+from range_index import normalize_origin
+from retention import archived_ids
+
+
+# CAD export header for each field the records table is built from
+CSV_FIELDS = {
+    'id': 'Confirmation #',
+    'division': 'Division',
+    'priority': 'Priority Name',
+    'status': 'CallTakerStatus',
+    'trip_type': 'Trip Type Name',
+    'origin': 'Origin Name',
+    'date_of_service': 'Date of Service',
+    'pickup_time': 'Pickup Time',
+    'assigned_time': 'Assigned',
+    'at_scene_time': 'At Scene',
+}
+
+# Accepted timestamp spellings, tried in order; blank fields are missing values
+TIMESTAMP_FORMATS = ['%m/%d/%Y %I:%M:%S %p', '%Y-%m-%d %H:%M:%S', '%m/%d/%Y', '%m/%d/%y %I:%M:%S %p']
+
+# The same mappings the server applies to uploads (src/types.rs)
+DIVISIONS = ['Memphis', 'Nashville', 'Special Event']
+EMERGENT_PRIORITY = 'P1 - Emergency'
+TURNED_STATUS = '*TURNED CALL'
+CANCELLED_STATUSES = [
+    'CANCELLED - NOT ASSIGNED',
+    'CANCELLED - ON SCENE',
+    'CANCELLED - PRIOR TO ARRIVAL',
+    'CANCELLED - ERROR',
+]
+LEVELS = {'ALS': 'ALS', 'BLS': 'BLS', 'CCU': 'CCU', 'ALS BARI': 'ALS', 'BLS BARI': 'BLS'}
+WEEKDAYS = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+
+INSERT_COLUMNS = [
+    'id', 'date_of_service', 'division', 'priority', 'category',
+    'level', 'weekday', 'hour', 'origin', 'origin_id', 'response_time', 'service_day'
+]
+
+# Ids already stored or archived by retention, set once in each worker by _init_worker
+_existing_ids = np.empty(0, dtype=np.int64)
+
+
+def _init_worker(existing_ids: np.ndarray) -> None:
+    global _existing_ids
+    _existing_ids = existing_ids
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """Parse export timestamps column-wise; blanks become NaT and anything unparseable is an error"""
+    values = values.str.strip()
+    present = values != ''
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for fmt in TIMESTAMP_FORMATS:
+        pending = present & parsed.isna()
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(values[pending], format=fmt, errors='coerce')
+
+    invalid = present & parsed.isna()
+    if invalid.any():
+        raise Exception(f"Invalid datetime: {values[invalid].iloc[0]}")
+    return parsed
+
+
+def map_records(export: pd.DataFrame) -> pd.DataFrame:
+    """Map export rows to the records schema; origins stay as raw names for the writer to resolve"""
+    missing = [header for header in CSV_FIELDS.values() if header not in export.columns]
+    if missing:
+        raise Exception(f"Missing CSV columns: {missing}")
+    fields = {name: export[header] for name, header in CSV_FIELDS.items()}
+
+    ids = pd.to_numeric(fields['id'].str.strip(), errors='coerce')
+    if ids.isna().any():
+        raise Exception(f"Invalid confirmation number: {fields['id'][ids.isna()].iloc[0]}")
+
+    divisions = fields['division'].str.strip()
+    unknown = ~divisions.isin(DIVISIONS)
+    if unknown.any():
+        raise Exception(f"Unknown division: {divisions[unknown].iloc[0]}")
+
+    status = fields['status']
+    category = np.select(
+        [status == TURNED_STATUS, status.isin(CANCELLED_STATUSES)],
+        ['Turned', 'Cancelled'],
+        'Ran'
+    )
+
+    service_date = parse_timestamps(fields['date_of_service'])
+    pickup = parse_timestamps(fields['pickup_time'])
+    # Whole minutes from assignment to arrival, truncated like chrono's num_minutes
+    elapsed = parse_timestamps(fields['at_scene_time']) - parse_timestamps(fields['assigned_time'])
+    minutes = np.trunc(elapsed.dt.total_seconds() / 60)
+    response_time = pd.Series(np.where(category == 'Ran', minutes, 0), index=export.index).astype('Int64')
+
+    days = service_date.dt.normalize()
+    return pd.DataFrame({
+        'id': ids.astype(np.int64),
+        'date_of_service': service_date.dt.strftime('%m/%d/%y'),
+        'division': divisions,
+        'priority': np.where(fields['priority'] == EMERGENT_PRIORITY, 'Emergent', 'Non Emergent'),
+        'category': category,
+        'level': fields['trip_type'].map(LEVELS).fillna('NA'),
+        'weekday': pd.Series(WEEKDAYS[service_date.dt.dayofweek.fillna(0).astype(int)], index=export.index)
+            .where(service_date.notna()),
+        'hour': pickup.dt.hour.astype('Int64'),
+        'origin': fields['origin'],
+        'response_time': response_time,
+        'service_day': ((days - pd.Timestamp(DateManager.EPOCH)) // pd.Timedelta(days=1)).astype('Int64'),
+    })
+
+
+def parse_exports(paths: List[str]) -> Tuple[Optional[pd.DataFrame], int, List[Tuple[str, str]]]:
+    """
+    Worker: parse a group of exports and drop rows already in the database.
+
+    The group is mapped in one pass, since per-call overhead dominates for
+    daily files. Returns the new rows, the number of rows parsed and the
+    (path, error) of every file that could not be used.
+    """
+    exports = []
+    failures = []
+    for path in paths:
+        try:
+            exports.append((path, pd.read_csv(path, dtype=str, keep_default_na=False)))
+        except Exception as e:
+            failures.append((path, str(e)))
+    if not exports:
+        return None, 0, failures
+
+    try:
+        records = map_records(pd.concat([export for _, export in exports], ignore_index=True))
+    except Exception:
+        # Find the bad files so the rest of the group is still ingested
+        parts = []
+        for path, export in exports:
+            try:
+                parts.append(map_records(export))
+            except Exception as e:
+                failures.append((path, str(e)))
+        if not parts:
+            return None, 0, failures
+        records = pd.concat(parts, ignore_index=True)
+
+    parsed = len(records)
+    records = records.drop_duplicates('id')
+    records = records[~np.isin(records['id'].to_numpy(), _existing_ids)]
+    return records, parsed, failures
+
+
+class RecordWriter:
+    """
+    The single writer of an ingest: resolves origin ids and inserts batches.
+
+    Workers only see the ids stored before the ingest began, so ids that
+    arrive in more than one file are dropped here as well.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.conn = db_manager.get_connection(read_only=False)
+        self.aliases: Dict[str, int] = dict(self.conn.execute("SELECT alias, origin_id FROM origin_aliases"))
+        self.origins: Dict[str, int] = {name: origin_id for origin_id, name in self.conn.execute("SELECT id, name FROM origins")}
+        self.written_ids: Set[int] = set()
+
+    def origin_id(self, raw_name: str) -> int:
+        """Return the id for a raw origin name, registering the origin and alias the first time it is seen"""
+        if raw_name in self.aliases:
+            return self.aliases[raw_name]
+
+        name = normalize_origin(raw_name)
+        if name not in self.origins:
+            self.origins[name] = self.conn.execute("INSERT INTO origins (name) VALUES (?)", (name,)).lastrowid
+        origin_id = self.origins[name]
+        self.conn.execute("INSERT OR IGNORE INTO origin_aliases (alias, origin_id) VALUES (?, ?)", (raw_name, origin_id))
+        self.aliases[raw_name] = origin_id
+        return origin_id
+
+    def write(self, records: Optional[pd.DataFrame]) -> Tuple[int, Set[date]]:
+        """Insert one batch in a transaction; return the rows inserted and the dates they cover"""
+        if records is None:
+            return 0, set()
+        records = records[~records['id'].isin(self.written_ids)]
+        if records.empty:
+            return 0, set()
+
+        with self.conn:
+            origin_ids = {raw: self.origin_id(raw) for raw in records['origin'].unique()}
+            records = records.assign(origin_id=records['origin'].map(origin_ids))
+            rows = records[INSERT_COLUMNS].astype(object).where(records[INSERT_COLUMNS].notna(), None)
+            cursor = self.conn.executemany(
+                f"INSERT OR IGNORE INTO records ({', '.join(INSERT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in INSERT_COLUMNS)})",
+                rows.itertuples(index=False, name=None)
+            )
+
+        self.written_ids.update(records['id'].tolist())
+        days = {DateManager.from_day_number(day) for day in records['service_day'].dropna().unique()}
+        return cursor.rowcount, days
+
+
+def mark_ingest() -> None:
+    """Record that new rows were ingested, as the upload handler does; reports written before this are stale"""
+    Config.INGEST_STAMP.parent.mkdir(parents=True, exist_ok=True)
+    Config.INGEST_STAMP.write_text(datetime.now().astimezone().isoformat())
+
+
+def ingest_directory(
+    directory: Path,
+    logger: Logger,
+    pattern: str = '*.csv',
+    workers: Optional[int] = None
+) -> Tuple[int, List[date], List[Path]]:
+    """
+    Ingest every export in a directory.
+
+    Returns the number of rows inserted, the dates they cover and the files
+    that could not be ingested.
+    """
+    files = sorted(Path(directory).glob(pattern))
+    if not files:
+        raise Exception(f"No files matching {pattern} in {directory}")
+
+    db_manager = DatabaseManager(use_columnar_store=False)
+    # Rows folded into rollups keep their ids only in the archive
+    existing_ids = np.concatenate([db_manager.fetch_record_ids().to_numpy(dtype=np.int64), archived_ids()])
+    writer = RecordWriter(db_manager)
+
+    logger.log_message(f"Ingesting {len(files)} file(s) against {len(existing_ids)} stored record(s)")
+    parsed_rows = inserted_rows = 0
+    touched_days: Set[date] = set()
+    failed = []
+    started = time.perf_counter()
+
+    size = max(Config.INGEST_FILES_PER_TASK, 1)
+    groups = [[str(path) for path in files[i:i + size]] for i in range(0, len(files), size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(existing_ids,)) as pool:
+        futures = {pool.submit(parse_exports, group): group for group in groups}
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                records, parsed, failures = future.result()
+                inserted, days = writer.write(records)
+            except Exception as e:
+                failures = [(path, str(e)) for path in group]
+                parsed = inserted = 0
+                days = set()
+
+            for path, error in failures:
+                failed.append(Path(path))
+                logger.log_message(f"Ingest failed for {Path(path).name}: {error}", is_error=True)
+
+            parsed_rows += parsed
+            inserted_rows += inserted
+            touched_days |= days
+            logger.log_message(f"Ingested {len(group) - len(failures)} file(s): {parsed} row(s), {inserted} new")
+
+    elapsed = time.perf_counter() - started
+    logger.log_message(
+        f"Ingest finished: {parsed_rows} row(s) parsed, {inserted_rows} inserted, "
+        f"{parsed_rows - inserted_rows} duplicate(s) skipped in {elapsed:.1f}s "
+        f"({parsed_rows / elapsed if elapsed else 0:.0f} rows/s)"
+    )
+    return inserted_rows, sorted(touched_days), failed
+
+
+def main():
+    """Ingest a directory of CAD CSV exports"""
+    try:
+        parser = argparse.ArgumentParser(description="Ingest a directory of CAD CSV exports in parallel")
+        parser.add_argument('directory', help="Directory holding the exports")
+        parser.add_argument('--pattern', default='*.csv', help="File name pattern (defaults to *.csv)")
+        parser.add_argument('--workers', type=int, help="Parser processes (defaults to every CPU)")
+        parser.add_argument(
+            '--skip-precompute',
+            action='store_true',
+            help="Only insert rows; cached reports, the range index and columnar partitions are still marked stale"
+        )
+        args = parser.parse_args()
+
+        Config.setup_output_directory()
+        logger = Logger()
+
+        inserted, days, failed = ingest_directory(Path(args.directory), logger, args.pattern, args.workers)
+        if inserted:
+            mark_ingest()
+            if not args.skip_precompute:
+                IngestPrecomputer(logger).run(days)
+
+        if failed:
+            logger.log_message(f"{len(failed)} file(s) could not be ingested", is_error=True)
+            sys.exit(1)
+
+    except Exception as e:
+        print(f"Critical error: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,28 @@
+import argparse
 import json
 import os
 import sys
 import traceback
 from pathlib import Path
 from datetime import datetime
-from typing import Any, Dict
-from report_manager import WeeklyReportManager
+from typing import Any, Dict, Optional
+import pandas as pd
+from report_manager import WeeklyReportManager, origin_slugs
+from graph_generator import ReportGraphManager
 from transport_processor import TransportDataProcessor
+from report_format import LatexReportFormatter
+from profiling import run_profiler
+from metrics import metrics
 from config import Config
 
+# Report JSON key holding the ingest stamp its data was loaded under; every other key is a division
+INGEST_STAMP_KEY = '_ingest_stamp'
+
 class Logger:
     """Simple logging class for report generation"""
     
     def __init__(self):
-        self.output_dir = Config.OUTPUT_DIR
+        self.output_dir = Config.LOG_DIR
         self.date_str = datetime.now().strftime('%Y-%m-%d')
         
         # Setup log files
@@ -48,36 +57,171 @@ def validate_date_format(date_str: str) -> bool:
     except ValueError:
         return False
 
-def generate_report(start_date: str, end_date: str, logger: Logger) -> None:
-    """Generate weekly report and save to files"""
+def report_path(start_date: str, end_date: str) -> Path:
+    """Return the JSON report path for a date range in MM/DD/YYYY format"""
+    filename = f"report_{start_date.replace('/', '-')}_{end_date.replace('/', '-')}.json"
+    return Config.OUTPUT_DIR / filename
+
+def model_path(start_date: str, end_date: str) -> Path:
+    """Return the path of the numeric report model the LaTeX report is formatted from"""
+    return report_path(start_date, end_date).with_name(
+        f"model_{start_date.replace('/', '-')}_{end_date.replace('/', '-')}.json"
+    )
+
+def division_report_path(start_date: str, end_date: str, division: str) -> Path:
+    """Return the per-division JSON path written in streaming mode"""
+    return report_path(start_date, end_date).with_name(
+        f"report_{start_date.replace('/', '-')}_{end_date.replace('/', '-')}_{division}.json"
+    )
+
+def origin_report_path(start_date: str, end_date: str, division: str, slug: str) -> Path:
+    """Return the JSON path of one origin's report"""
+    return report_path(start_date, end_date).with_name(
+        f"origin_report_{start_date.replace('/', '-')}_{end_date.replace('/', '-')}_{division}_{slug}.json"
+    )
+
+def origin_index_path(start_date: str, end_date: str) -> Path:
+    """Return the path of the index listing every origin report of a date range"""
+    return report_path(start_date, end_date).with_name(
+        f"origin_reports_{start_date.replace('/', '-')}_{end_date.replace('/', '-')}.json"
+    )
+
+def read_ingest_stamp() -> Optional[str]:
+    """Return the stamp of the last ingest, or None if nothing was ingested yet"""
     try:
-        # Log start of report generation
-        logger.log_message(f"Starting report generation for period: {start_date} to {end_date}")
-        
-        # Initialize data processor and load data
-        logger.log_message("Loading data from database...")
-        processor = TransportDataProcessor()
-        processor.load_data(start_date, end_date)
+        return Config.INGEST_STAMP.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return None
+
+def write_json(path: Path, data: Any) -> None:
+    """Write JSON to a temp file first so readers never see a partial report"""
+    # Per process, so concurrent runs writing the same report never share a temp file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def build_report(start_date: str, end_date: str, logger: Logger, stream: bool = False) -> Path:
+    """
+    Build the weekly report for a date range and return the saved JSON path.
+    
+    In streaming mode each division is also written to its own file as soon
+    as it is ready, and a {"division", "report_file"} line is printed to
+    stdout so a consumer can start templating before the run finishes.
+    """
+    # Log start of report generation
+    logger.log_message(f"Starting report generation for period: {start_date} to {end_date}")
+    
+    # Initialize data processor and load data
+    logger.log_message("Loading data from database...")
+    with metrics.timer('report_duration_seconds'):
+        processor = TransportDataProcessor(logger)
+        # Read before loading: rows ingested during the load make the report stale, never fresh
+        ingest_stamp = read_ingest_stamp()
+        with metrics.timer('stage_duration_seconds', stage='load'):
+            processor.load_data(start_date, end_date)
         
-        # Generate report
-        logger.log_message("Generating report...")
-        report_manager = WeeklyReportManager(
+        return write_report(
+            start_date,
+            end_date,
             processor.current_week_data,
-            processor.previous_week_data
+            processor.previous_week_data,
+            logger,
+            stream,
+            ingest_stamp
         )
-        report_data = report_manager.generate_complete_report()
-        
-        # Generate output filename and save JSON report
-        filename = f"report_{start_date.replace('/', '-')}_{end_date.replace('/', '-')}.json"
-        output_path = Config.OUTPUT_DIR / filename
+
+def write_report(
+    start_date: str,
+    end_date: str,
+    current_week_data: pd.DataFrame,
+    previous_week_data: pd.DataFrame,
+    logger: Logger,
+    stream: bool = False,
+    ingest_stamp: Optional[str] = None
+) -> Path:
+    """
+    Generate and save the report for a week whose data is already loaded.
+    
+    The combined report records the ingest stamp read before the data was
+    loaded; the server replays it only while that is still the last ingest.
+    """
+    # Generate report
+    logger.log_message("Generating report...")
+    report_manager = WeeklyReportManager(current_week_data, previous_week_data)
+    formatter = LatexReportFormatter()
+    model_data = {}
+    report_data = {}
+    for division, division_model in report_manager.iter_division_reports():
+        model_data[division] = division_model
+        with metrics.timer('stage_duration_seconds', stage='format'):
+            report_data[division] = formatter.format_division(division_model)
+        if stream:
+            division_path = division_report_path(start_date, end_date, division)
+            with metrics.timer('stage_duration_seconds', stage='save'):
+                write_json(division_path, {division: report_data[division]})
+            print(json.dumps({'division': division, 'report_file': str(division_path)}), flush=True)
+            logger.log_message(f"Streamed {division} report to {division_path}")
+    
+    with metrics.timer('stage_duration_seconds', stage='save'):
+        # Keep the numbers for other output targets; the report is the LaTeX rendering of them
+        write_json(model_path(start_date, end_date), model_data)
         
+        # Save the combined JSON report
+        output_path = report_path(start_date, end_date)
         logger.log_message(f"Saving report to {output_path}")
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(report_data, f, indent=2, ensure_ascii=False)
-            
-        logger.log_message("Report generated successfully")
+        write_json(output_path, {**report_data, INGEST_STAMP_KEY: ingest_stamp})
+        
+    logger.log_message("Report generated successfully")
+    return output_path
+
+def build_origin_reports(start_date: str, end_date: str, logger: Logger) -> Path:
+    """
+    Build a one-page report for every origin in a date range and return the path of their index.
+    
+    The index maps each division's origins to their report files.
+    """
+    logger.log_message(f"Starting origin reports for period: {start_date} to {end_date}")
+    
+    processor = TransportDataProcessor(logger)
+    with metrics.timer('stage_duration_seconds', stage='load'):
+        processor.load_data(start_date, end_date)
+    
+    report_manager = WeeklyReportManager(processor.current_week_data, processor.previous_week_data)
+    index = {}
+    for division, reports in report_manager.iter_origin_reports():
+        slugs = origin_slugs(list(reports))
+        index[division] = {}
+        with metrics.timer('stage_duration_seconds', stage='save'):
+            for origin, payload in reports.items():
+                path = origin_report_path(start_date, end_date, division, slugs[origin])
+                write_json(path, payload)
+                index[division][origin] = path.name
+        logger.log_message(f"Saved {len(reports)} origin report(s) for {division}")
+    
+    output_path = origin_index_path(start_date, end_date)
+    write_json(output_path, index)
+    logger.log_message(f"Origin reports indexed in {output_path}")
+    return output_path
+
+def generate_report(
+    start_date: str,
+    end_date: str,
+    logger: Logger,
+    stream: bool = False,
+    origins: bool = False
+) -> None:
+    """Generate weekly report (or the per-origin reports) and save to files"""
+    source = 'origins' if origins else 'request'
+    try:
+        if origins:
+            build_origin_reports(start_date, end_date, logger)
+        else:
+            build_report(start_date, end_date, logger, stream)
+        metrics.inc('reports_generated_total', source=source, outcome='success')
         
     except Exception as e:
+        metrics.inc('reports_generated_total', source=source, outcome='failure')
         error_msg = f"Error generating report: {str(e)}"
         logger.log_message(error_msg, is_error=True, include_trace=True)
         sys.exit(1)
@@ -86,17 +230,55 @@ def main():
     """Main entry point for report generation"""
     try:
         # Check command line arguments
-        if len(sys.argv) != 3:
-            raise ValueError("Incorrect number of arguments. Usage: python main.py <start_date> <end_date>")
-            
-        start_date = sys.argv[1]
-        end_date = sys.argv[2]
+        parser = argparse.ArgumentParser(description="Generate the weekly transport report")
+        parser.add_argument('start_date', help="Start date in MM/DD/YYYY format")
+        parser.add_argument('end_date', help="End date in MM/DD/YYYY format")
+        parser.add_argument(
+            '--output-dir',
+            help="Workspace directory for the report JSON and graphs (defaults to tmp_output)"
+        )
+        parser.add_argument(
+            '--graph-backend',
+            choices=ReportGraphManager.BACKENDS,
+            help=f"How graphs are produced (defaults to {Config.GRAPH_BACKEND})"
+        )
+        parser.add_argument(
+            '--stream',
+            action='store_true',
+            help="Emit each division as an NDJSON line on stdout as soon as it is ready"
+        )
+        parser.add_argument(
+            '--origins',
+            action='store_true',
+            help="Write a one-page report per origin instead of the division report"
+        )
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help=f"Save a cProfile and top allocations in {Config.PROFILE_DIR} (or set {Config.PROFILE_ENV_VAR}=1)"
+        )
+        args = parser.parse_args()
+        
+        start_date = args.start_date
+        end_date = args.end_date
+        
+        # Per-job workspaces keep concurrent reports from overwriting each other's files
+        if args.output_dir:
+            Config.OUTPUT_DIR = Path(args.output_dir)
+        if args.graph_backend:
+            Config.GRAPH_BACKEND = args.graph_backend
+        Config.setup_output_directory()
         
         # Setup logger
         logger = Logger()
         
         # Generate report
-        generate_report(start_date, end_date, logger)
+        profile_name = f"{'origins' if args.origins else 'report'}_{start_date.replace('/', '-')}_{end_date.replace('/', '-')}"
+        try:
+            with run_profiler(profile_name, args.profile, logger):
+                generate_report(start_date, end_date, logger, args.stream, args.origins)
+        finally:
+            metrics.flush(logger)
         
     except Exception as e:
         # If we can't even set up logging, just print to stderr
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent flushes are not serialized
+    fcntl = None
+
+
+SNAPSHOT_NAME = 'metrics.json'
+TEXT_NAME = 'metrics.prom'
+LOCK_NAME = 'metrics.lock'
+
+# Every metric the pipeline records, with its Prometheus type and help text
+METRICS = {
+    'reports_generated_total': ('counter', "Weekly reports built, by source and outcome"),
+    'report_duration_seconds': ('histogram', "Wall time to load, build and save one weekly report"),
+    'stage_duration_seconds': ('histogram', "Wall time of each report stage"),
+    'rows_scanned_total': ('counter', "Record rows loaded for reports, by load strategy"),
+    'cache_requests_total': ('counter', "Cache lookups, by cache and result"),
+    'graphs_rendered_total': ('counter', "Graphs produced, by backend and kind"),
+}
+
+
+def label_key(labels: Dict[str, str]) -> str:
+    """Serialize labels the way they appear between braces in the Prometheus format"""
+    def escape(value: str) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in sorted(labels.items()))
+
+
+def bucket_quantile(bounds: List[float], cumulative: List[int], count: int, q: float) -> Optional[float]:
+    """Estimate a quantile from cumulative bucket counts, interpolating like histogram_quantile()"""
+    if count == 0:
+        return None
+    rank = q * count
+    lower, below = 0.0, 0
+    for bound, seen in zip(bounds, cumulative):
+        if seen >= rank:
+            if seen == below:
+                return bound
+            return lower + (bound - lower) * (rank - below) / (seen - below)
+        lower, below = bound, seen
+    # Observations above the last bound are reported at it, as Prometheus does
+    return bounds[-1]
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms of one process, merged into a shared snapshot on flush.
+
+    Report runs are short-lived processes, so nothing serves the numbers
+    live. Each flush adds the increments recorded since the last one to
+    metrics.json in Config.LOG_DIR under a file lock, then rewrites
+    metrics.prom beside it in the Prometheus text format for a textfile
+    collector or the server's /metrics route. Histogram buckets are
+    cumulative, so histogram_quantile() over them gives p95 latency, and the
+    JSON snapshot carries the same estimate for scrapers that read it.
+    """
+
+    def __init__(self, buckets: List[float] = Config.METRICS_LATENCY_BUCKETS):
+        self.buckets = [float(bound) for bound in buckets]
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self._histograms: Dict[str, Dict[str, dict]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        if not Config.METRICS_ENABLED:
+            return
+        key = label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        if not Config.METRICS_ENABLED:
+            return
+        key = label_key(labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {}).setdefault(
+                key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            )
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe the block's wall time; blocks that raise are not observed"""
+        started = time.perf_counter()
+        yield
+        self.observe(name, time.perf_counter() - started, **labels)
+
+    def clear(self) -> None:
+        """Drop the pending increments, e.g. the ones a forked worker inherited from its parent"""
+        with self._lock:
+            self._counters, self._histograms = {}, {}
+
+    def _merge(self, snapshot: dict, counters: dict, histograms: dict) -> dict:
+        if snapshot.get('buckets') != self.buckets:
+            # Counts from other bucket bounds cannot be added; start the histograms over
+            snapshot['histograms'] = {}
+        snapshot['buckets'] = self.buckets
+
+        for name, series in counters.items():
+            merged = snapshot.setdefault('counters', {}).setdefault(name, {})
+            for key, value in series.items():
+                merged[key] = merged.get(key, 0) + value
+
+        for name, series in histograms.items():
+            merged = snapshot.setdefault('histograms', {}).setdefault(name, {})
+            for key, histogram in series.items():
+                total = merged.setdefault(key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+                total['sum'] += histogram['sum']
+                total['count'] += histogram['count']
+                total['quantiles'] = {
+                    f"p{round(q * 100)}": bucket_quantile(self.buckets, total['buckets'], total['count'], q)
+                    for q in Config.METRICS_QUANTILES
+                }
+
+        snapshot['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return snapshot
+
+    def flush(self, logger=None, directory: Optional[Path] = None) -> None:
+        """
+        Add the pending increments to the shared snapshot and rewrite both exports.
+
+        Metrics never fail a report: errors are logged and the pending
+        increments dropped.
+        """
+        with self._lock:
+            counters, histograms = self._counters, self._histograms
+            self._counters, self._histograms = {}, {}
+        if not counters and not histograms:
+            return
+
+        directory = Path(directory or Config.LOG_DIR)
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            with open(directory / LOCK_NAME, 'a') as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                snapshot = self._merge(load_snapshot(directory), counters, histograms)
+                write_atomic(directory / SNAPSHOT_NAME, json.dumps(snapshot, indent=2, sort_keys=True))
+                write_atomic(directory / TEXT_NAME, render_prometheus(snapshot))
+        except Exception as e:
+            if logger is not None:
+                logger.log_message(f"Metrics flush failed: {str(e)}", is_error=True)
+
+
+def load_snapshot(directory: Path = None) -> dict:
+    path = Path(directory or Config.LOG_DIR) / SNAPSHOT_NAME
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_atomic(path: Path, text: str) -> None:
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def render_prometheus(snapshot: dict) -> str:
+    """Render a snapshot in the Prometheus text exposition format"""
+    def braces(*keys: str) -> str:
+        labels = ','.join(key for key in keys if key)
+        return f'{{{labels}}}' if labels else ''
+
+    lines = []
+    bounds = snapshot.get('buckets', [])
+    for name, (kind, help_text) in METRICS.items():
+        group = 'counters' if kind == 'counter' else 'histograms'
+        series = snapshot.get(group, {}).get(name)
+        if not series:
+            continue
+
+        metric = f"{Config.METRICS_PREFIX}{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for key, value in sorted(series.items()):
+            if kind == 'counter':
+                lines.append(f"{metric}{braces(key)} {value:g}")
+                continue
+            for bound, seen in zip(bounds, value['buckets']):
+                le = f'le="{bound:g}"'
+                lines.append(f"{metric}_bucket{braces(key, le)} {seen}")
+            le = 'le="+Inf"'
+            lines.append(f"{metric}_bucket{braces(key, le)} {value['count']}")
+            lines.append(f"{metric}_sum{braces(key)} {value['sum']:.6f}")
+            lines.append(f"{metric}_count{braces(key)} {value['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+# Shared by every module of a process; flushed by the entry points
+metrics = MetricsRegistry()
+
+
+def main():
+    """Print the metrics snapshot"""
+    parser = argparse.ArgumentParser(description="Show the report pipeline's metrics snapshot")
+    parser.add_argument('--json', action='store_true', help="Print the JSON snapshot instead of the Prometheus text")
+    parser.add_argument('--reset', action='store_true', help="Delete the snapshot and start counting again")
+    args = parser.parse_args()
+
+    try:
+        if args.reset:
+            for name in (SNAPSHOT_NAME, TEXT_NAME):
+                path = Config.LOG_DIR / name
+                if path.exists():
+                    path.unlink()
+            return
+
+        snapshot = load_snapshot()
+        if not snapshot:
+            raise Exception(f"No metrics recorded yet in {Config.LOG_DIR}")
+        if args.json:
+            print(json.dumps(snapshot, indent=2, sort_keys=True))
+        else:
+            print(render_prometheus(snapshot), end='')
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
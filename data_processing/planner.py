@@ -0,0 +1,107 @@
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Tuple
+import pandas as pd
+from config import Config
+from date_utils import DateManager
+from metrics import metrics
+from range_index import RangeCounter
+
+
+@dataclass
+class LoadPlan:
+    """How one date window will be loaded and what it is expected to cost"""
+    name: str
+    start: date
+    end: date
+    strategy: str
+    estimated_rows: int
+    # 'range index' or 'count', whichever answered the row estimate
+    estimate_source: str
+    estimated_bytes: int
+
+    def describe(self) -> str:
+        return (
+            f"{self.name} {DateManager.format_date(self.start)} to {DateManager.format_date(self.end)}: "
+            f"{self.strategy}, estimated {self.estimated_rows} rows ({self.estimate_source}), "
+            f"{self.estimated_bytes / 2 ** 20:.1f} MiB"
+        )
+
+
+class LoadPlanner:
+    """
+    Chooses how each window of a report is loaded.
+
+    Row counts come from the prefix-sum index when it is fresh and from a
+    COUNT over the service_day index otherwise; both take milliseconds
+    whatever the window size. Windows covered by the columnar snapshot are
+    read from its memory-mapped partitions. The rest are read in one query
+    each while their combined estimated peak fits Config.PLAN_MEMORY_BUDGET,
+    and in chunks once it does not.
+    """
+
+    def __init__(self, db_manager, logger=None):
+        self.db_manager = db_manager
+        self.counter = RangeCounter(db_manager)
+        self.logger = logger
+
+    def _log(self, message: str) -> None:
+        if self.logger is not None:
+            self.logger.log_message(message)
+
+    def estimate_rows(self, start: date, end: date) -> Tuple[int, str]:
+        """Return the number of records in the window and where the number came from"""
+        index = self.counter.fresh_index()
+        metrics.inc('cache_requests_total', cache='range_index', result='miss' if index is None else 'hit')
+        if index is not None:
+            return index.count(start, end), 'range index'
+        return self.counter.scan_count(start, end), 'count'
+
+    def _columnar_covers(self, start: date, end: date) -> bool:
+        store = self.db_manager.columnar_store
+        if store is None:
+            return False
+        covered = store.covers(start, end)
+        metrics.inc('cache_requests_total', cache='columnar_store', result='hit' if covered else 'miss')
+        return covered
+
+    def plan(self, windows: Dict[str, Tuple[date, date]]) -> Dict[str, LoadPlan]:
+        """Plan every window of a report; all of them are held in memory together"""
+        estimates = {name: self.estimate_rows(start, end) for name, (start, end) in windows.items()}
+        columnar = {name for name, (start, end) in windows.items() if self._columnar_covers(start, end)}
+
+        sqlite_rows = sum(rows for name, (rows, _) in estimates.items() if name not in columnar)
+        chunked = sqlite_rows * Config.PLAN_BYTES_PER_ROW > Config.PLAN_MEMORY_BUDGET
+
+        plans = {}
+        for name, (start, end) in windows.items():
+            rows, source = estimates[name]
+            if name in columnar:
+                strategy, bytes_per_row = 'columnar', Config.PLAN_BYTES_PER_ROW
+            elif chunked:
+                strategy, bytes_per_row = 'chunked', Config.PLAN_CHUNK_BYTES_PER_ROW
+            else:
+                strategy, bytes_per_row = 'sqlite', Config.PLAN_BYTES_PER_ROW
+            plans[name] = LoadPlan(name, start, end, strategy, rows, source, rows * bytes_per_row)
+        return plans
+
+    def execute(self, plan: LoadPlan) -> pd.DataFrame:
+        """Load a planned window and log its estimated against its actual cost"""
+        started = time.perf_counter()
+        if plan.strategy == 'columnar':
+            df = self.db_manager.columnar_store.read(plan.start, plan.end)
+        elif plan.strategy == 'chunked':
+            df = self.db_manager.fetch_data_from_sqlite(plan.start, plan.end, chunk_rows=Config.PLAN_CHUNK_ROWS)
+        elif plan.strategy == 'sqlite':
+            df = self.db_manager.fetch_data_from_sqlite(plan.start, plan.end)
+        else:
+            raise Exception(f"Unknown load strategy: {plan.strategy}")
+        elapsed = time.perf_counter() - started
+        metrics.inc('rows_scanned_total', len(df), strategy=plan.strategy)
+
+        self._log(
+            f"Load plan {plan.describe()}; actual {len(df)} rows, "
+            f"{df.memory_usage(deep=True).sum() / 2 ** 20:.1f} MiB frame in {elapsed:.2f}s"
+        )
+        return df
@@ -0,0 +1,162 @@
+import argparse
+import sys
+import traceback
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Iterable, Iterator, List, Tuple
+from config import Config
+from date_utils import DateManager
+from main import Logger, build_report, model_path, report_path
+from metrics import metrics
+from profiling import run_profiler
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent precomputes are not serialized
+    fcntl = None
+
+
+LOCK_NAME = 'precompute.lock'
+
+
+class IngestPrecomputer:
+    """
+    Rebuilds cached weekly reports for the weeks touched by an ingest.
+
+    Every upload starts its own precompute, so runs take a file lock in
+    Config.OUTPUT_DIR and go one at a time: a later run waits, then rebuilds
+    against the rows of both uploads instead of racing the earlier one over
+    the same reports, range index and columnar partitions.
+    """
+
+    def __init__(self, logger: Logger):
+        self.logger = logger
+
+    @staticmethod
+    def week_start(day: date) -> date:
+        """Return the Sunday starting the report week containing day"""
+        return day - timedelta(days=(day.weekday() + 1) % 7)
+
+    @staticmethod
+    def affected_weeks(days: Iterable[date]) -> List[Tuple[date, date]]:
+        """
+        Return the (Sunday, Saturday) weeks whose reports depend on the given dates.
+
+        A report also compares against the previous week, so the week after
+        each touched week is included as well.
+        """
+        starts = set()
+        for day in days:
+            start = IngestPrecomputer.week_start(day)
+            starts.add(start)
+            starts.add(start + timedelta(days=7))
+
+        return [(start, start + timedelta(days=6)) for start in sorted(starts)]
+
+    def invalidate(self, weeks: List[Tuple[date, date]]) -> None:
+        """Remove cached reports for the weeks so stale results are never served"""
+        for start, end in weeks:
+            start_str, end_str = DateManager.format_date(start), DateManager.format_date(end)
+            for path in (report_path(start_str, end_str), model_path(start_str, end_str)):
+                if path.exists():
+                    path.unlink()
+                    self.logger.log_message(f"Invalidated cached report {path.name}")
+
+    def refresh_columnar_store(self, days: List[date]) -> None:
+        """Rewrite the columnar partitions holding the ingested dates"""
+        from columnar_store import ColumnarStore, compact
+        from database import DatabaseManager
+
+        compact(DatabaseManager(use_columnar_store=False), ColumnarStore(), min(days), max(days))
+
+    def refresh_range_index(self) -> None:
+        """Rebuild the prefix-sum index so range counts include the ingested rows"""
+        from range_index import rebuild_index
+
+        try:
+            rebuild_index()
+            self.logger.log_message("Rebuilt range count index")
+        except Exception as e:
+            # Counts fall back to scanning records while the index is stale
+            self.logger.log_message(f"Range index rebuild failed: {str(e)}", is_error=True, include_trace=True)
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """Hold the precompute lock for the block"""
+        Config.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        with open(Config.OUTPUT_DIR / LOCK_NAME, 'a') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    self.logger.log_message("Waiting for another precompute to finish")
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def run(self, days: Iterable[date]) -> List[Tuple[date, date]]:
+        """Invalidate and rebuild every weekly report affected by the ingested dates"""
+        days = sorted(set(days))
+        if not days:
+            return []
+
+        with self.exclusive():
+            return self._rebuild(days)
+
+    def _rebuild(self, days: List[date]) -> List[Tuple[date, date]]:
+        weeks = self.affected_weeks(days)
+        self.invalidate(weeks)
+
+        if Config.USE_COLUMNAR_STORE:
+            self.refresh_columnar_store(days)
+        self.refresh_range_index()
+
+        rebuilt = []
+        for start, end in weeks:
+            # Weeks that have not happened yet have nothing to report
+            if start > date.today():
+                continue
+            try:
+                build_report(DateManager.format_date(start), DateManager.format_date(end), self.logger)
+                metrics.inc('reports_generated_total', source='precompute', outcome='success')
+                rebuilt.append((start, end))
+            except Exception as e:
+                metrics.inc('reports_generated_total', source='precompute', outcome='failure')
+                self.logger.log_message(
+                    f"Precompute failed for {start} to {end}: {str(e)}",
+                    is_error=True,
+                    include_trace=True
+                )
+
+        metrics.flush(self.logger)
+        return rebuilt
+
+
+def main():
+    """Precompute reports for the dates touched by an upload"""
+    try:
+        parser = argparse.ArgumentParser(description="Rebuild the cached weekly reports touched by an upload")
+        parser.add_argument('dates', nargs='+', help="Ingested dates in MM/DD/YYYY format")
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help=f"Save a cProfile and top allocations in {Config.PROFILE_DIR} (or set {Config.PROFILE_ENV_VAR}=1)"
+        )
+        args = parser.parse_args()
+
+        days = [DateManager.to_date(arg) for arg in args.dates]
+
+        Config.setup_output_directory()
+        logger = Logger()
+        logger.log_message(f"Precomputing reports for {len(days)} ingested date(s)")
+
+        with run_profiler('precompute', args.profile, logger):
+            rebuilt = IngestPrecomputer(logger).run(days)
+        logger.log_message(f"Precompute finished: {len(rebuilt)} weekly report(s) rebuilt")
+
+    except Exception as e:
+        print(f"Critical error: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import List, Tuple
+from config import Config
+
+
+# Allocations made while importing modules say nothing about the report
+IMPORT_FILTERS = (
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+)
+
+
+def profiling_requested(flag: bool = False) -> bool:
+    """Whether this run should be profiled, by flag or by the environment variable"""
+    return flag or os.environ.get(Config.PROFILE_ENV_VAR, '') not in ('', '0')
+
+
+def profile_paths(name: str) -> Tuple[Path, Path]:
+    """Return the cProfile and allocation summary paths of a run in Config.PROFILE_DIR"""
+    # Stamped and per process, so repeated and concurrent runs keep their own profiles
+    stem = f"profile_{name}_{datetime.now():%Y%m%d-%H%M%S}_{os.getpid()}"
+    Config.PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    return Config.PROFILE_DIR / f"{stem}.prof", Config.PROFILE_DIR / f"{stem}_memory.json"
+
+
+def run_profiler(name: str, flag: bool = False, logger=None):
+    """Return a RunProfiler for the named run if profiling was requested, otherwise a no-op context"""
+    if not profiling_requested(flag):
+        return nullcontext()
+    return RunProfiler(*profile_paths(name), logger)
+
+
+def stop_inherited_profiling() -> None:
+    """Stop the profiling a forked worker inherits; the parent saves its own run and workers profile their tasks"""
+    sys.setprofile(None)
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+class RunProfiler:
+    """
+    Captures a cProfile and the top tracemalloc allocations of one run.
+
+    Both are saved when the run ends, whether or not it succeeded. Tracing
+    allocations slows the run down, so timings in the profile are inflated
+    evenly; compare functions with each other rather than with unprofiled
+    runs.
+    """
+
+    def __init__(self, profile_path: Path, memory_path: Path, logger=None):
+        self.profile_path = Path(profile_path)
+        self.memory_path = Path(memory_path)
+        self.logger = logger
+        self.profiler = cProfile.Profile()
+        self.started = 0.0
+
+    def __enter__(self) -> 'RunProfiler':
+        tracemalloc.start()
+        self.started = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb) -> None:
+        self.profiler.disable()
+        elapsed = time.perf_counter() - self.started
+        snapshot = tracemalloc.take_snapshot().filter_traces(IMPORT_FILTERS)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.profiler.dump_stats(self.profile_path)
+        top = snapshot.statistics('lineno')[:Config.PROFILE_TOP_ALLOCATIONS]
+        memory = {
+            'elapsed_seconds': round(elapsed, 3),
+            'peak_bytes': peak,
+            'top_allocations': [
+                {
+                    'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    'bytes': stat.size,
+                    'blocks': stat.count
+                }
+                for stat in top
+            ]
+        }
+        tmp_path = self.memory_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(memory, f, indent=2)
+        os.replace(tmp_path, self.memory_path)
+
+        if self.logger is not None:
+            self.logger.log_message(
+                f"Saved profile {self.profile_path.name} ({elapsed:.2f}s, peak {peak / 2 ** 20:.1f} MiB traced)"
+            )
+
+
+def profile_files(paths: List[Path]) -> List[Path]:
+    """Expand directories to the profiles saved in them"""
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(path.glob('profile_*.prof')))
+        else:
+            files.append(path)
+    return files
+
+
+def summarize(paths: List[Path], top: int, sort: str) -> None:
+    """Print the hottest functions over every profile, then each run's time and peak memory"""
+    files = profile_files(paths)
+    if not files:
+        raise Exception("No profiles found")
+
+    stats = pstats.Stats(*[str(path) for path in files])
+    print(f"Hottest functions over {len(files)} profile(s), by {sort} time:")
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+
+    for path in files:
+        memory_path = path.with_name(f"{path.stem}_memory.json")
+        if not memory_path.exists():
+            continue
+        with open(memory_path, 'r', encoding='utf-8') as f:
+            memory = json.load(f)
+        largest = memory['top_allocations'][0]['location'] if memory['top_allocations'] else '-'
+        print(
+            f"{path.stem}: {memory['elapsed_seconds']:.2f}s, "
+            f"peak {memory['peak_bytes'] / 2 ** 20:.1f} MiB, largest allocation at {largest}"
+        )
+
+
+def main():
+    """Summarize saved run profiles"""
+    parser = argparse.ArgumentParser(description="Summarize the profiles saved by --profile runs")
+    parser.add_argument(
+        'paths',
+        nargs='*',
+        type=Path,
+        default=[Config.PROFILE_DIR],
+        help=f"Profile files or directories holding them (defaults to {Config.PROFILE_DIR})"
+    )
+    parser.add_argument('--top', type=int, default=25, help="Number of functions to list")
+    parser.add_argument('--sort', choices=['cumulative', 'tottime', 'ncalls'], default='cumulative')
+    args = parser.parse_args()
+
+    try:
+        summarize(args.paths, args.top, args.sort)
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
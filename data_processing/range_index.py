@@ -0,0 +1,316 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+from config import Config
+from date_utils import DateLike, DateManager
+
+
+# Dimensions of the dense index; origin_id is kept in a separate sparse index
+BASE_DIMENSIONS = ['division', 'category', 'level']
+
+
+def normalize_origin(name: str) -> str:
+    """Canonical origin spelling, matching the normalization applied at ingest"""
+    return ' '.join(name.split()).upper()
+
+
+class RangeCountIndex:
+    """
+    Per-day prefix sums of record counts.
+
+    Any date-range count is the difference of two cumulative lookups. The
+    (division, category, level) groups are few, so their cumulative counts are
+    stored densely for O(1) lookups. Adding origin multiplies the groups, so
+    the per-origin index only stores the days a group has records and finds
+    range ends with a binary search.
+    """
+
+    def __init__(
+        self,
+        first_day: int,
+        groups: pd.DataFrame,
+        cumulative: np.ndarray,
+        origin_groups: Optional[pd.DataFrame] = None,
+        origin_offsets: Optional[np.ndarray] = None,
+        origin_days: Optional[np.ndarray] = None,
+        origin_cumulative: Optional[np.ndarray] = None,
+        built_at: float = 0.0
+    ):
+        self.first_day = first_day
+        self.groups = groups
+        self.cumulative = cumulative
+        self.origin_groups = origin_groups
+        self.origin_offsets = origin_offsets
+        self.origin_days = origin_days
+        self.origin_cumulative = origin_cumulative
+        self.built_at = built_at
+
+    @property
+    def last_day(self) -> int:
+        return self.first_day + self.cumulative.shape[1] - 2
+
+    @classmethod
+    def build(cls, db_manager, include_origins: bool = Config.RANGE_INDEX_ORIGINS) -> 'RangeCountIndex':
+        """Build the index from one grouped scan of the stored records"""
+        built_at = datetime.now().timestamp()
+        try:
+            # Rollup counts stand in for the raw rows of compacted days
+            counts = db_manager.count_records(
+                *DateManager.ALL_DAYS,
+                group_columns=['service_day', 'division', 'category', 'level', 'origin_id']
+            )
+        except Exception as e:
+            raise Exception(f"Range index build error: {str(e)}")
+
+        if counts.empty:
+            raise Exception("No records in database")
+
+        counts[BASE_DIMENSIONS] = counts[BASE_DIMENSIONS].fillna('')
+        first_day = int(counts['service_day'].min())
+        n_days = int(counts['service_day'].max()) - first_day + 1
+        day_index = (counts['service_day'] - first_day).to_numpy()
+
+        # Dense (group, day) counts with a leading zero column, so cumulative[:, d + 1] covers days <= d
+        group_codes, groups = pd.MultiIndex.from_frame(counts[BASE_DIMENSIONS]).factorize()
+        daily = np.zeros((len(groups), n_days + 1), dtype=np.int64)
+        np.add.at(daily, (group_codes, day_index + 1), counts['records'].to_numpy())
+        index = cls(
+            first_day,
+            groups.to_frame(index=False, name=BASE_DIMENSIONS),
+            np.cumsum(daily, axis=1),
+            built_at=built_at
+        )
+
+        if include_origins:
+            index._build_origin_index(counts, first_day)
+        return index
+
+    def _build_origin_index(self, counts: pd.DataFrame, first_day: int) -> None:
+        """Store per-(group, origin) cumulative counts only for days that have records"""
+        counts = counts.dropna(subset=['origin_id'])
+        keys = BASE_DIMENSIONS + ['origin_id']
+        counts = counts.sort_values(keys + ['service_day'])
+
+        group_codes, groups = pd.MultiIndex.from_frame(counts[keys]).factorize(sort=True)
+        records = counts['records'].to_numpy()
+
+        # Cumulative sum restarted at every group boundary
+        running = np.cumsum(records)
+        offsets = np.searchsorted(group_codes, np.arange(len(groups) + 1))
+        group_base = np.concatenate(([0], running[offsets[1:-1] - 1]))
+
+        self.origin_groups = groups.to_frame(index=False, name=keys)
+        self.origin_offsets = offsets
+        self.origin_days = (counts['service_day'].to_numpy() - first_day).astype(np.int32)
+        self.origin_cumulative = running - np.repeat(group_base, np.diff(offsets))
+
+    @staticmethod
+    def _matching(groups: pd.DataFrame, filters: dict) -> np.ndarray:
+        mask = np.ones(len(groups), dtype=bool)
+        for column, value in filters.items():
+            if value is not None:
+                mask &= (groups[column] == value).to_numpy()
+        return np.flatnonzero(mask)
+
+    def _clip(self, start_day: int, end_day: int) -> Optional[Tuple[int, int]]:
+        start = max(start_day, self.first_day) - self.first_day
+        end = min(end_day, self.last_day) - self.first_day
+        return (start, end) if start <= end else None
+
+    def count(
+        self,
+        start_date: DateLike,
+        end_date: DateLike,
+        division: Optional[str] = None,
+        category: Optional[str] = None,
+        level: Optional[str] = None,
+        origin_id: Optional[int] = None
+    ) -> int:
+        """Count records in an inclusive date range; None matches every value of a dimension"""
+        bounds = self._clip(DateManager.to_day_number(start_date), DateManager.to_day_number(end_date))
+        if bounds is None:
+            return 0
+        start, end = bounds
+        filters = {'division': division, 'category': category, 'level': level}
+
+        if origin_id is None:
+            rows = self._matching(self.groups, filters)
+            return int((self.cumulative[rows, end + 1] - self.cumulative[rows, start]).sum())
+
+        if self.origin_groups is None:
+            raise Exception("Range index was built without origins")
+
+        total = 0
+        for group in self._matching(self.origin_groups, {**filters, 'origin_id': origin_id}):
+            lo, hi = self.origin_offsets[group], self.origin_offsets[group + 1]
+            days = self.origin_days[lo:hi]
+            cumulative = self.origin_cumulative[lo:hi]
+            before = np.searchsorted(days, start, side='left')
+            through = np.searchsorted(days, end, side='right')
+            total += int((cumulative[through - 1] if through else 0) - (cumulative[before - 1] if before else 0))
+        return total
+
+    def save(self, path: Path = Config.RANGE_INDEX_PATH) -> None:
+        """Write the index as one .npz file, replacing any previous index atomically"""
+        arrays = {
+            'first_day': np.array(self.first_day),
+            'built_at': np.array(self.built_at),
+            'cumulative': self.cumulative,
+        }
+        for column in BASE_DIMENSIONS:
+            arrays[f'group_{column}'] = self.groups[column].to_numpy(dtype=str)
+        if self.origin_groups is not None:
+            for column in BASE_DIMENSIONS:
+                arrays[f'origin_group_{column}'] = self.origin_groups[column].to_numpy(dtype=str)
+            arrays['origin_group_origin_id'] = self.origin_groups['origin_id'].to_numpy(dtype=np.int64)
+            arrays['origin_offsets'] = self.origin_offsets
+            arrays['origin_days'] = self.origin_days
+            arrays['origin_cumulative'] = self.origin_cumulative
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp.npz')
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path = Config.RANGE_INDEX_PATH) -> 'RangeCountIndex':
+        with np.load(path) as data:
+            groups = pd.DataFrame({column: data[f'group_{column}'] for column in BASE_DIMENSIONS})
+            index = cls(int(data['first_day']), groups, data['cumulative'], built_at=float(data['built_at']))
+            if 'origin_offsets' in data:
+                index.origin_groups = pd.DataFrame({
+                    **{column: data[f'origin_group_{column}'] for column in BASE_DIMENSIONS},
+                    'origin_id': data['origin_group_origin_id']
+                })
+                index.origin_offsets = data['origin_offsets']
+                index.origin_days = data['origin_days']
+                index.origin_cumulative = data['origin_cumulative']
+        return index
+
+    def is_stale(self) -> bool:
+        """Whether rows were ingested after the index was built"""
+        try:
+            return Config.INGEST_STAMP.stat().st_mtime > self.built_at
+        except FileNotFoundError:
+            return False
+
+
+class RangeCounter:
+    """Answers range counts from the prefix-sum index, scanning records when it is missing or stale"""
+
+    def __init__(self, db_manager=None, index_path: Path = Config.RANGE_INDEX_PATH):
+        if db_manager is None:
+            from database import DatabaseManager
+            db_manager = DatabaseManager()
+        self.db_manager = db_manager
+        self.index_path = Path(index_path)
+        self._index: Optional[RangeCountIndex] = None
+
+    def fresh_index(self) -> Optional[RangeCountIndex]:
+        """The saved index, or None when it is missing or older than the last ingest"""
+        if self._index is None and self.index_path.exists():
+            self._index = RangeCountIndex.load(self.index_path)
+        if self._index is None or self._index.is_stale():
+            return None
+        return self._index
+
+    def _origin_id(self, origin: str) -> Optional[int]:
+        origins = self.db_manager.fetch_origins()
+        matches = origins.index[origins == normalize_origin(origin)]
+        return int(matches[0]) if len(matches) else None
+
+    def count(
+        self,
+        start_date: DateLike,
+        end_date: DateLike,
+        division: Optional[str] = None,
+        category: Optional[str] = None,
+        level: Optional[str] = None,
+        origin: Optional[str] = None
+    ) -> int:
+        """
+        Count records in an inclusive date range matching the given dimensions.
+
+        For example count('01/01/2024', '06/30/2024', division='Memphis',
+        category='Ran', level='ALS') gives the ALS runs in Memphis.
+        """
+        origin_id = None
+        if origin is not None:
+            origin_id = self._origin_id(origin)
+            if origin_id is None:
+                return 0
+
+        index = self.fresh_index()
+        if index is not None and (origin_id is None or index.origin_groups is not None):
+            return index.count(start_date, end_date, division, category, level, origin_id)
+
+        return self.scan_count(start_date, end_date, division, category, level, origin_id)
+
+    def scan_count(
+        self,
+        start_date: DateLike,
+        end_date: DateLike,
+        division: Optional[str] = None,
+        category: Optional[str] = None,
+        level: Optional[str] = None,
+        origin_id: Optional[int] = None
+    ) -> int:
+        """Count matching records directly from the database"""
+        filters = {'division': division, 'category': category, 'level': level, 'origin_id': origin_id}
+        counts = self.db_manager.count_records(
+            DateManager.to_day_number(start_date),
+            DateManager.to_day_number(end_date),
+            filters=filters
+        )
+        return int(counts['records'].sum())
+
+
+def rebuild_index(db_manager=None, path: Path = Config.RANGE_INDEX_PATH) -> RangeCountIndex:
+    """Rebuild and save the range index; run after every ingest"""
+    if db_manager is None:
+        from database import DatabaseManager
+        db_manager = DatabaseManager(use_columnar_store=False)
+    index = RangeCountIndex.build(db_manager)
+    index.save(path)
+    return index
+
+
+def main():
+    """Build the range index or answer a count from the command line"""
+    parser = argparse.ArgumentParser(description="Prefix-sum index for date-range record counts")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('build', help="Rebuild the index from the records table")
+    count_parser = subparsers.add_parser('count', help="Count records in a date range")
+    count_parser.add_argument('start_date', help="Start date in MM/DD/YYYY format")
+    count_parser.add_argument('end_date', help="End date in MM/DD/YYYY format")
+    for dimension in BASE_DIMENSIONS + ['origin']:
+        count_parser.add_argument(f'--{dimension}')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            index = rebuild_index()
+            print(f"Indexed {DateManager.from_day_number(index.first_day)} to {DateManager.from_day_number(index.last_day)}")
+        else:
+            counter = RangeCounter()
+            print(counter.count(
+                args.start_date,
+                args.end_date,
+                division=args.division,
+                category=args.category,
+                level=args.level,
+                origin=args.origin
+            ))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+from typing import Any, Dict, List
+import numpy as np
+import pandas as pd
+from report_generator import convert_to_serializable
+
+
+# Characters with a special meaning in LaTeX and their literal spelling
+LATEX_ESCAPES = str.maketrans({
+    '\\': r'\textbackslash{}',
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '^': r'\textasciicircum{}',
+})
+
+# Row the template turns into \hline
+SEPARATOR = '\\hline'
+
+ORIGIN_TABLE_COLUMNS = ['origin', 'ALS', 'BLS', 'CCU', 'Total', 'PrevTotal', 'Delta']
+TOP_5_LISTS = ['top_5_als', 'top_5_bls', 'top_5_ccu', 'top_5_total']
+
+
+class LatexReportFormatter:
+    """
+    Turns the numeric report model into the strings report_template.tex expects.
+
+    Generators only produce numbers, so the same model can be cached and
+    rendered for other targets. Each table is formatted a column at a time:
+    origin names are escaped, deltas colored and the separator inserted
+    before the TOTAL row.
+    """
+
+    @staticmethod
+    def escape(values: pd.Series) -> pd.Series:
+        return values.astype(str).str.translate(LATEX_ESCAPES)
+
+    @staticmethod
+    def format_deltas(deltas: pd.Series) -> pd.Series:
+        """Bold green gains and red losses; no change is a plain 0"""
+        deltas = deltas.astype(np.int64)
+        colors = pd.Series(np.where(deltas > 0, 'green', 'red'), index=deltas.index)
+        signs = pd.Series(np.where(deltas > 0, '+', ''), index=deltas.index)
+        formatted = '\\textcolor{' + colors + '}{\\textbf{' + signs + deltas.astype(str) + '}}'
+        return formatted.where(deltas != 0, '0')
+
+    def format_origin_table(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Format origin rows ending in a TOTAL row, with a separator before the total"""
+        if not rows:
+            return []
+
+        table = pd.DataFrame(rows, columns=ORIGIN_TABLE_COLUMNS)
+        table['origin'] = self.escape(table['origin'])
+        table['Delta'] = self.format_deltas(table['Delta'])
+
+        formatted = table.to_dict('records')
+        separator = {column: '' for column in ORIGIN_TABLE_COLUMNS}
+        separator['origin'] = SEPARATOR
+        return convert_to_serializable(formatted[:-1] + [separator] + formatted[-1:])
+
+    def format_top_list(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        table = pd.DataFrame(rows)
+        table['origin'] = self.escape(table['origin'])
+        return convert_to_serializable(table.to_dict('records'))
+
+    def format_division(self, report: Dict[str, Any]) -> Dict[str, Any]:
+        """Return a formatted copy of one division's report; the model is left untouched"""
+        formatted = dict(report)
+
+        origin_report = dict(report['origin_report'])
+        origin_report['full_report'] = self.format_origin_table(origin_report['full_report'])
+        for key in TOP_5_LISTS:
+            origin_report[key] = self.format_top_list(origin_report[key])
+        formatted['origin_report'] = origin_report
+
+        if 'memphis_specialized_report' in report:
+            formatted['memphis_specialized_report'] = {
+                key: self.format_origin_table(rows)
+                for key, rows in report['memphis_specialized_report'].items()
+            }
+        return formatted
+
+    def format_report(self, report: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        return {division: self.format_division(data) for division, data in report.items()}
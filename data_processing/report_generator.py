@@ -1,8 +1,10 @@
 # data_processors/report_generators.py
 from dataclasses import dataclass
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import pandas as pd
 from config import Config
+from cube import CallCube
+from response_stats import ResponseTimeHistogram
 import numpy as np
 
 @dataclass
@@ -28,12 +30,11 @@ def convert_to_serializable(obj: Any) -> Any:
 class SummaryTableGenerator:
     """Generates the summary table with daily breakdowns"""
     
-    def __init__(self, df: pd.DataFrame):
-        self.df = df.copy()  # Create a copy to avoid modifying original
-        # Fill any NA values in level with 'Unknown'
-        self.df['level'] = self.df['level'].fillna('Unknown')
+    def __init__(self, df: pd.DataFrame, cube: Optional[CallCube] = None):
+        self.cube = cube if cube is not None else CallCube.from_frame(df)
         
-    def _initialize_summary(self) -> Dict[str, Dict[str, int]]:
+    @staticmethod
+    def _initialize_summary() -> Dict[str, Dict[str, int]]:
         """Initialize the summary dictionary with all possible combinations"""
         summary = {}
         
@@ -52,116 +53,120 @@ class SummaryTableGenerator:
         
     def generate(self) -> Dict[str, Dict[str, Any]]:
         """Generate summary table with daily counts by type"""
+        return self.summarize(self.cube.query(['weekday', 'category', 'level']))
+    
+    @classmethod
+    def summarize(cls, counts: pd.Series) -> Dict[str, Dict[str, Any]]:
+        """Build the summary table from call counts indexed by (weekday, category, level)"""
         # Initialize summary with all possible combinations
-        summary = self._initialize_summary()
+        summary = cls._initialize_summary()
         
         # Process each row
-        for _, row in self.df.iterrows():
-            day = row['weekday']
-            category = row['category']
-            level = row['level']
-            
+        for (day, category, level), count in counts[counts > 0].items():
             if category == 'Ran' and level in ReportConfig.LEVELS:
                 # Update level-specific count
-                summary[f'{level} Ran'][day] += 1
-                summary[f'{level} Ran']['Total'] += 1
+                summary[f'{level} Ran'][day] += count
+                summary[f'{level} Ran']['Total'] += count
                 # Update total runs
-                summary['Total Ran'][day] += 1
-                summary['Total Ran']['Total'] += 1
+                summary['Total Ran'][day] += count
+                summary['Total Ran']['Total'] += count
             elif category == 'Turned':
-                summary['Turned'][day] += 1
-                summary['Turned']['Total'] += 1
-                summary['Total Missed'][day] += 1
-                summary['Total Missed']['Total'] += 1
+                summary['Turned'][day] += count
+                summary['Turned']['Total'] += count
+                summary['Total Missed'][day] += count
+                summary['Total Missed']['Total'] += count
             elif category == 'Cancelled':
-                summary['Cancelled'][day] += 1
-                summary['Cancelled']['Total'] += 1
-                summary['Total Missed'][day] += 1
-                summary['Total Missed']['Total'] += 1
+                summary['Cancelled'][day] += count
+                summary['Cancelled']['Total'] += count
+                summary['Total Missed'][day] += count
+                summary['Total Missed']['Total'] += count
             
             # Update total demand
             if category in ReportConfig.CATEGORIES:
-                summary['Total Demand'][day] += 1
-                summary['Total Demand']['Total'] += 1
+                summary['Total Demand'][day] += count
+                summary['Total Demand']['Total'] += count
             
         return convert_to_serializable(summary)
 
 class OriginReportGenerator:
     """Generates the origin report including full report and top 5 lists"""
     
-    def __init__(self, current_df: pd.DataFrame, previous_df: pd.DataFrame):
-        self.current_df = current_df
-        self.previous_df = previous_df
+    def __init__(
+        self,
+        current_df: pd.DataFrame,
+        previous_df: pd.DataFrame,
+        current_cube: Optional[CallCube] = None,
+        previous_cube: Optional[CallCube] = None
+    ):
+        self.current_cube = current_cube if current_cube is not None else CallCube.from_frame(current_df)
+        self.previous_cube = previous_cube if previous_cube is not None else CallCube.from_frame(previous_df)
+        
+    @staticmethod
+    def _ran_by_origin(cube: CallCube, by: List[str]) -> pd.Series:
+        """Ran calls per origin (and any further dimensions), without origins that had none"""
+        counts = cube.query(['origin'] + by, where={'category': 'Ran'})
+        return counts[counts.index.get_level_values('origin').notna()]
+    
+    def _level_counts(self) -> pd.DataFrame:
+        """
+        Ran calls per origin and level plus the origin total, indexed by origin name.
         
-    def _get_delta_format(self, current: int, previous: int) -> str:
-        """Format delta with color coding for latex"""
-        delta = current - previous
-        if delta == 0:
-            return "0"
-        color = "green" if delta > 0 else "red"
-        sign = "+" if delta > 0 else ""
-        return f"\\textcolor{{{color}}}{{\\textbf{{{sign}{delta}}}}}"
+        Levels that never occur are left out and origins are sorted by name,
+        as a groupby over the records would give.
+        """
+        level_counts = self._ran_by_origin(self.current_cube, ['level']).unstack(fill_value=0)
+        level_counts = level_counts.loc[level_counts.sum(axis=1) > 0]
+        # Calls without a level count towards the total but not towards any level
+        level_counts['Total'] = level_counts.sum(axis=1)
+        levels = [level for level in level_counts.columns[:-1] if pd.notna(level) and level_counts[level].any()]
+        level_counts = level_counts[levels + ['Total']]
+        level_counts.index = level_counts.index.astype(str)
+        return level_counts.sort_index()
+    
+    @staticmethod
+    def total_row(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Sum origin rows into a TOTAL row"""
+        total = {'origin': 'TOTAL'}
+        for column in ['ALS', 'BLS', 'CCU', 'Total', 'PrevTotal']:
+            total[column] = sum(row[column] for row in rows)
+        total['Delta'] = total['Total'] - total['PrevTotal']
+        return total
     
     def generate_full_report(self) -> List[Dict[str, Any]]:
-        """Generate full report for all origins"""
-        # Group current week's data
-        current_grouped = self.current_df[self.current_df['category'] == 'Ran'].groupby('origin').agg({
-            'level': lambda x: list(x)
-        }).reset_index()
+        """Generate full report rows for all origins, ending with the TOTAL row"""
+        counts = self._level_counts()
         
-        # Group previous week's data
-        prev_grouped = self.previous_df[self.previous_df['category'] == 'Ran'].groupby('origin').size().reset_index(
-            name='PrevTotal'
-        )
+        # Previous week totals, joined on name so they line up with the current rows
+        prev_totals = self._ran_by_origin(self.previous_cube, [])
+        prev_totals.index = prev_totals.index.astype(str)
         
         report = []
-        for _, row in current_grouped.iterrows():
-            levels = row['level']
-            als_count = levels.count('ALS')
-            bls_count = levels.count('BLS')
-            ccu_count = levels.count('CCU')
-            total = len(levels)
+        for origin, row in counts.iterrows():
+            als_count = row.get('ALS', 0)
+            bls_count = row.get('BLS', 0)
+            ccu_count = row.get('CCU', 0)
+            total = row['Total']
             
-            prev_total = prev_grouped[prev_grouped['origin'] == row['origin']]['PrevTotal'].iloc[0] if len(
-                prev_grouped[prev_grouped['origin'] == row['origin']]) > 0 else 0
+            prev_total = prev_totals.get(origin, 0)
             
             report.append({
-                'origin': row['origin'],
+                'origin': origin,
                 'ALS': als_count,
                 'BLS': bls_count,
                 'CCU': ccu_count,
                 'Total': total,
                 'PrevTotal': prev_total,
-                'Delta': self._get_delta_format(total, prev_total)
+                'Delta': total - prev_total
             })
             
-        # Add total row
-        total_row = {
-            'origin': 'TOTAL',
-            'ALS': sum(r['ALS'] for r in report),
-            'BLS': sum(r['BLS'] for r in report),
-            'CCU': sum(r['CCU'] for r in report),
-            'Total': sum(r['Total'] for r in report),
-            'PrevTotal': sum(r['PrevTotal'] for r in report),
-            'Delta': self._get_delta_format(
-                sum(r['Total'] for r in report),
-                sum(r['PrevTotal'] for r in report)
-            )
-        }
-        
-        # Add separator and total
-        report.append({'origin': '\\hline', 'ALS': 0, 'BLS': 0, 'CCU': 0, 'Total': 0, 'PrevTotal': 0, 'Delta': 0})
-        report.append(total_row)
-        
+        report.append(self.total_row(report))
         return convert_to_serializable(report)
     
     def generate_top_5_lists(self) -> Dict[str, List[Dict[str, int]]]:
         """Generate top 5 lists for each level and total"""
-        current_ran = self.current_df[self.current_df['category'] == 'Ran']
-        
         # Get counts by origin and level
-        level_counts = current_ran.groupby(['origin', 'level']).size().unstack(fill_value=0)
-        total_counts = current_ran.groupby('origin').size()
+        level_counts = self._level_counts()
+        total_counts = level_counts['Total']
         
         # Create top 5 lists
         top_5_als = (level_counts['ALS'] if 'ALS' in level_counts.columns else pd.Series()).nlargest(5)
@@ -179,40 +184,59 @@ class OriginReportGenerator:
 class MemphisSpecializedReportGenerator:
     """Generates Memphis-specific hospital system reports"""
     
-    def __init__(self, current_df: pd.DataFrame, previous_df: pd.DataFrame):
+    def __init__(
+        self,
+        current_df: pd.DataFrame,
+        previous_df: pd.DataFrame,
+        current_cube: Optional[CallCube] = None,
+        previous_cube: Optional[CallCube] = None
+    ):
         self.current_df = current_df
         self.previous_df = previous_df
-        self.origin_report_gen = OriginReportGenerator(current_df, previous_df)
+        self.origin_report_gen = OriginReportGenerator(current_df, previous_df, current_cube, previous_cube)
         
     def generate(self) -> Dict[str, List[Dict[str, Any]]]:
         """Generate specialized reports for Methodist, Baptist, and St Francis"""
-        full_report = self.origin_report_gen.generate_full_report()
+        # Every row but the division TOTAL
+        origin_rows = self.origin_report_gen.generate_full_report()[:-1]
         
         def filter_hospitals(name_pattern: str) -> List[Dict[str, Any]]:
-            hospitals = [row for row in full_report if name_pattern in row['origin']]
+            hospitals = [row for row in origin_rows if name_pattern in row['origin']]
             if not hospitals:
                 return []
-                
-            total_row = {
-                'origin': 'TOTAL',
-                'ALS': sum(h['ALS'] for h in hospitals),
-                'BLS': sum(h['BLS'] for h in hospitals),
-                'CCU': sum(h['CCU'] for h in hospitals),
-                'Total': sum(h['Total'] for h in hospitals),
-                'PrevTotal': sum(h['PrevTotal'] for h in hospitals),
-                'Delta': self.origin_report_gen._get_delta_format(
-                    sum(h['Total'] for h in hospitals),
-                    sum(h['PrevTotal'] for h in hospitals)
-                )
-            }
-            
-            return hospitals + [
-                {'origin': '\\hline', 'ALS': '', 'BLS': '', 'CCU': '', 'Total': '', 'PrevTotal': '', 'Delta': ''},
-                total_row
-            ]
+            return hospitals + [OriginReportGenerator.total_row(hospitals)]
         
         return {
             'methodist_table': filter_hospitals('METHODIST HOSPITAL'),
             'baptist_table': filter_hospitals('BAPTIST MEMORIAL HOSPITAL'),
             'st_francis_table': filter_hospitals('ST FRANCIS HOSPITAL')
-        }
\ No newline at end of file
+        }
+
+
+class ResponseTimeStatsGenerator:
+    """Generates response time percentiles and SLA attainment from 1-minute histograms"""
+    
+    DIMENSIONS = {
+        'by_priority': 'priority',
+        'by_level': 'level',
+        'by_origin': 'origin'
+    }
+    
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        
+    def generate(self) -> Dict[str, Any]:
+        """Generate overall and per-dimension response time statistics"""
+        overall = ResponseTimeHistogram.by_group(self.df)
+        stats = {
+            'overall': overall['All'].summary() if 'All' in overall else None
+        }
+        
+        for key, column in self.DIMENSIONS.items():
+            histograms = ResponseTimeHistogram.by_group(self.df, column)
+            stats[key] = {
+                str(group): histogram.summary()
+                for group, histogram in sorted(histograms.items(), key=lambda item: str(item[0]))
+            }
+            
+        return convert_to_serializable(stats)
@@ -1,15 +1,163 @@
 # data_processors/report_manager.py
-from typing import Dict, Any
+import os
+import re
+import time
+from functools import partial
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from pathlib import Path
 from datetime import datetime
 import pandas as pd
-from graph_generator import ReportGraphManager
+from graph_generator import HeatmapGenerator, ReportGraphManager
 from report_generator import (
     SummaryTableGenerator,
     OriginReportGenerator,
-    MemphisSpecializedReportGenerator
+    MemphisSpecializedReportGenerator,
+    ResponseTimeStatsGenerator,
+    convert_to_serializable
 )
 from config import Config
+from cube import CallCube, WEEKDAY_LABELS
+from data_quality import anomaly_counts
+from date_utils import DateManager
+from metrics import metrics
+from response_stats import GroupedResponseHistograms, ResponseTimeHistogram
+from worker_pool import report_pool
+
+
+def origin_slugs(origins: List[str]) -> Dict[str, str]:
+    """A file-name-safe name for each origin, numbered where two would collide"""
+    slugs = {}
+    taken = set()
+    for origin in origins:
+        base = re.sub(r'[^A-Za-z0-9]+', '-', origin).strip('-') or 'origin'
+        slug, suffix = base, 2
+        while slug in taken:
+            slug, suffix = f'{base}-{suffix}', suffix + 1
+        taken.add(slug)
+        slugs[origin] = slug
+    return slugs
+
+
+class OriginAggregates:
+    """
+    Every origin's share of one division's week, computed for all origins at once.
+    
+    Each table is a single cube query or bincount with origin as a
+    dimension, so aggregating costs the same however many origins there
+    are; tasks() only slices the shared arrays.
+    """
+    
+    def __init__(self, current_div_data: pd.DataFrame, previous_div_data: pd.DataFrame):
+        current_cube = CallCube.from_frame(current_div_data)
+        previous_cube = CallCube.from_frame(previous_div_data)
+        labels = current_cube.labels['origin']
+        
+        records = current_cube.query(['origin'])
+        demand = current_cube.query(['origin'], where={'category': Config.CATEGORIES})
+        self.origins = [str(origin) for origin in labels[(demand.to_numpy() > 0) & labels.notna()]]
+        self.positions = dict(zip(self.origins, labels.get_indexer(self.origins)))
+        self.records = records.to_numpy()
+        
+        # Rows are origins; the rest of each query is flattened behind them
+        summary = current_cube.query(['origin', 'weekday', 'category', 'level'])
+        self.summary = summary.to_numpy().reshape(len(labels), -1)
+        self.summary_index = summary.index[:self.summary.shape[1]].droplevel('origin')
+        
+        heatmap = current_cube.query(['origin', 'weekday', 'hour'], where={'category': Config.CATEGORIES})
+        self.hours = current_cube.labels['hour']
+        self.heatmap = heatmap.to_numpy().reshape(len(labels), len(WEEKDAY_LABELS), len(self.hours))
+        
+        # Ran calls by level, and in total, as in the division's origin report
+        ran = current_cube.query(['origin', 'level'], where={'category': 'Ran'}).unstack(fill_value=0)
+        ran.index = ran.index.astype(str)
+        self.ran_levels = ran.reindex(columns=Config.LEVELS, fill_value=0)
+        self.ran_totals = ran.sum(axis=1)
+        previous = previous_cube.query(['origin'], where={'category': 'Ran'})
+        previous.index = previous.index.astype(str)
+        self.previous_totals = previous
+        
+        self.by_priority = GroupedResponseHistograms.build(current_div_data, 'origin', 'priority')
+        self.by_level = GroupedResponseHistograms.build(current_div_data, 'origin', 'level')
+    
+    def _ran_row(self, origin: str) -> Dict[str, Any]:
+        levels = self.ran_levels.loc[origin] if origin in self.ran_levels.index else {}
+        row = {level: levels.get(level, 0) for level in Config.LEVELS}
+        row['Total'] = self.ran_totals.get(origin, 0)
+        row['PrevTotal'] = self.previous_totals.get(origin, 0)
+        row['Delta'] = row['Total'] - row['PrevTotal']
+        return row
+    
+    def tasks(self) -> List[Dict[str, Any]]:
+        """Each origin's slices of the shared aggregates, in origin order"""
+        slugs = origin_slugs(self.origins)
+        tasks = []
+        for origin in self.origins:
+            position = self.positions[origin]
+            tasks.append({
+                'origin': origin,
+                'slug': slugs[origin],
+                'total_records': self.records[position],
+                'summary_counts': pd.Series(self.summary[position], index=self.summary_index),
+                'heatmap_counts': pd.DataFrame(
+                    self.heatmap[position], index=WEEKDAY_LABELS, columns=self.hours
+                ),
+                'ran_calls': self._ran_row(origin),
+                'priorities': list(self.by_priority.subgroups),
+                'priority_counts': self.by_priority.group_counts(origin),
+                'levels': list(self.by_level.subgroups),
+                'level_counts': self.by_level.group_counts(origin)
+            })
+        return tasks
+
+
+def origin_payload(
+    task: Dict[str, Any],
+    division: str,
+    start_date,
+    end_date,
+    graph_manager: ReportGraphManager
+) -> Dict[str, Any]:
+    """Assemble one origin's report from its slices and draw its heatmap"""
+    overall = ResponseTimeHistogram(task['priority_counts'].sum(axis=0))
+    payload = {
+        'origin': task['origin'],
+        'division': division,
+        'start_date': DateManager.format_date(start_date),
+        'end_date': DateManager.format_date(end_date),
+        'total_records': task['total_records'],
+        'summary_table': SummaryTableGenerator.summarize(task['summary_counts']),
+        'ran_calls': task['ran_calls'],
+        'response_time_stats': {
+            'overall': overall.summary() if overall.total else None,
+            'by_priority': GroupedResponseHistograms.summaries(task['priorities'], task['priority_counts']),
+            'by_level': GroupedResponseHistograms.summaries(task['levels'], task['level_counts'])
+        }
+    }
+    payload.update(graph_manager.generate_origin_heatmap(
+        HeatmapGenerator.layout(task['heatmap_counts']),
+        task['origin'],
+        task['slug'],
+        division,
+        start_date,
+        end_date
+    ))
+    return convert_to_serializable(payload)
+
+
+def _emit_origin_reports(
+    tasks: List[Dict[str, Any]],
+    division: str,
+    start_date,
+    end_date
+) -> Dict[str, Dict[str, Any]]:
+    """Worker: build the reports of a chunk of origins"""
+    graph_manager = ReportGraphManager()
+    reports = {
+        task['origin']: origin_payload(task, division, start_date, end_date, graph_manager)
+        for task in tasks
+    }
+    metrics.flush()
+    return reports
 
 class WeeklyReportManager:
     """Manages the generation of the complete weekly report"""
@@ -21,51 +169,116 @@ class WeeklyReportManager:
         
     def generate_division_report(self, division: str) -> Dict[str, Any]:
         """Generate complete report for a division"""
+        started = time.perf_counter()
+        
         # Filter data for division
         current_div_data = self.current_week_data[self.current_week_data['division'] == division]
         previous_div_data = self.previous_week_data[self.previous_week_data['division'] == division]
         
-        # Get date range
-        start_date = current_div_data['date_of_service'].min().strftime('%m/%d/%Y')
-        end_date = current_div_data['date_of_service'].max().strftime('%m/%d/%Y')
+        # Get date range (kept as timestamps; formatted only for output)
+        start_date = current_div_data['date_of_service'].min()
+        end_date = current_div_data['date_of_service'].max()
+        
+        # One cube per week serves the summary, origin and heatmap tables
+        current_cube = CallCube.from_frame(current_div_data)
+        previous_cube = CallCube.from_frame(previous_div_data)
         
         # Initialize report generators
-        summary_gen = SummaryTableGenerator(current_div_data)
-        origin_gen = OriginReportGenerator(current_div_data, previous_div_data)
+        summary_gen = SummaryTableGenerator(current_div_data, current_cube)
+        origin_gen = OriginReportGenerator(current_div_data, previous_div_data, current_cube, previous_cube)
+        response_stats_gen = ResponseTimeStatsGenerator(current_div_data)
         graph_gen = ReportGraphManager()
         
         # Build basic report structure
         report = {
             'division': division,
-            'start_date': start_date,
-            'end_date': end_date,
+            'start_date': DateManager.format_date(start_date),
+            'end_date': DateManager.format_date(end_date),
             'total_records': len(current_div_data),
             'summary_table': summary_gen.generate(),
             'origin_report': {
                 'full_report': origin_gen.generate_full_report(),
                 **origin_gen.generate_top_5_lists()
             },
+            'response_time_stats': response_stats_gen.generate(),
+            'data_quality': anomaly_counts(current_div_data['quality_flags']),
         }
 
+        graphs_started = time.perf_counter()
         graph_paths = graph_gen.generate_division_graphs(
             current_div_data,
             division,
             start_date,
-            end_date
+            end_date,
+            current_cube
         )
+        graphs_seconds = time.perf_counter() - graphs_started
+        metrics.observe('stage_duration_seconds', graphs_seconds, stage='graphs')
 
         report.update(graph_paths)
         
         # Add Memphis-specific report if applicable
         if division == 'Memphis':
-            memphis_gen = MemphisSpecializedReportGenerator(current_div_data, previous_div_data)
+            memphis_gen = MemphisSpecializedReportGenerator(
+                current_div_data, previous_div_data, current_cube, previous_cube
+            )
             report['memphis_specialized_report'] = memphis_gen.generate()
         
+        # Everything but the graphs is aggregation
+        metrics.observe('stage_duration_seconds', time.perf_counter() - started - graphs_seconds, stage='aggregate')
         return report
     
+    def generate_origin_reports(
+        self,
+        division: str,
+        workers: Optional[int] = Config.ORIGIN_FANOUT_WORKERS
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Generate the one-page report of every origin in a division, by origin name.
+        
+        The division is aggregated once with origin as a dimension. Only
+        assembling each payload and drawing its heatmap happens per origin,
+        in chunks spread over a process pool.
+        """
+        current_div_data = self.current_week_data[self.current_week_data['division'] == division]
+        previous_div_data = self.previous_week_data[self.previous_week_data['division'] == division]
+        if current_div_data.empty:
+            return {}
+        
+        with metrics.timer('stage_duration_seconds', stage='origin_aggregate'):
+            tasks = OriginAggregates(current_div_data, previous_div_data).tasks()
+        
+        size = max(Config.ORIGIN_FANOUT_PER_TASK, 1)
+        chunks = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+        emit = partial(
+            _emit_origin_reports,
+            division=division,
+            start_date=current_div_data['date_of_service'].min(),
+            end_date=current_div_data['date_of_service'].max()
+        )
+        
+        reports = {}
+        workers = min(workers or os.cpu_count(), len(chunks))
+        with metrics.timer('stage_duration_seconds', stage='origin_output'):
+            if workers <= 1:
+                for chunk in chunks:
+                    reports.update(emit(chunk))
+            else:
+                with report_pool(workers) as pool:
+                    for chunk_reports in pool.map(emit, chunks):
+                        reports.update(chunk_reports)
+        return reports
+    
+    def iter_origin_reports(self) -> Iterator[Tuple[str, Dict[str, Dict[str, Any]]]]:
+        """Yield each division's origin reports as soon as they are complete"""
+        for division in Config.DIVISIONS:
+            yield division, self.generate_origin_reports(division)
+    
+    def iter_division_reports(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield each division's report as soon as it is complete"""
+        for division in Config.DIVISIONS:
+            yield division, self.generate_division_report(division)
+    
     def generate_complete_report(self) -> Dict[str, Dict[str, Any]]:
         """Generate complete report for all divisions"""
-        return {
-            division: self.generate_division_report(division)
-            for division in ['Memphis', 'Nashville']
-        }
\ No newline at end of file
+        return dict(self.iter_division_reports())
\ No newline at end of file
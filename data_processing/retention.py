@@ -0,0 +1,259 @@
+import argparse
+import gzip
+import sqlite3
+import sys
+import traceback
+from contextlib import closing
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from config import Config
+from date_utils import DateManager
+from shards import Segment
+
+
+# Rollup groups match raw rows by these text columns; IS, so NULLs match too
+GROUP_COLUMNS = ['division', 'priority', 'category', 'level']
+GROUP_MATCH = ' AND '.join(f'g.{column} IS r.{column}' for column in GROUP_COLUMNS)
+
+ROLLUP_SCHEMA = [
+    # Every combination of text columns seen on a folded day, so rollup rows carry one small id
+    """
+    CREATE TABLE IF NOT EXISTS rollup_groups (
+        id integer primary key,
+        division text,
+        priority text,
+        category text,
+        level text)""",
+    # Daily counts at the grain reports group on; the server creates this table too (src/database.rs)
+    """
+    CREATE TABLE IF NOT EXISTS record_rollups (
+        id integer primary key,
+        service_day integer,
+        group_id integer,
+        hour integer,
+        origin_id integer,
+        records integer not null)""",
+    "CREATE INDEX IF NOT EXISTS idx_record_rollups_service_day ON record_rollups (service_day)",
+    # Response time histogram of each rollup row, read only when response times are loaded
+    """
+    CREATE TABLE IF NOT EXISTS response_rollups (
+        rollup_id integer not null,
+        response_time integer,
+        records integer not null)""",
+    "CREATE INDEX IF NOT EXISTS idx_response_rollups_rollup_id ON response_rollups (rollup_id)",
+    # Rollup rows with the record columns they stand for; weekday follows from the day
+    """
+    CREATE VIEW IF NOT EXISTS rollup_rows AS
+    SELECT
+        u.id AS rollup_id, u.service_day, g.division, g.priority, g.category, g.level,
+        CASE CAST(strftime('%w', u.service_day * 86400, 'unixepoch') AS integer)
+            WHEN 0 THEN 'Sunday' WHEN 1 THEN 'Monday' WHEN 2 THEN 'Tuesday' WHEN 3 THEN 'Wednesday'
+            WHEN 4 THEN 'Thursday' WHEN 5 THEN 'Friday' ELSE 'Saturday' END AS weekday,
+        u.hour, u.origin_id, u.records
+    FROM record_rollups u JOIN rollup_groups g ON g.id = u.group_id""",
+    # Last day folded into rollups; its presence marks a compacted store
+    "CREATE TABLE IF NOT EXISTS retention (horizon_day integer not null)",
+]
+
+# Ids of archived rows, written beside each archive
+IDS_SUFFIX = '.ids.npy'
+
+
+def archived_ids(archive_dir: Path = Config.RETENTION_ARCHIVE_DIR) -> np.ndarray:
+    """Return the id of every row folded into rollups, so an ingest never stores one again"""
+    parts = [np.load(path) for path in sorted(Path(archive_dir).glob(f'*{IDS_SUFFIX}'))]
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+class RetentionCompactor:
+    """
+    Folds raw rows older than a horizon into daily rollups.
+
+    Each store's old rows are first written to a gzipped CSV archive with
+    their ids beside it, then counted into record_rollups with a response
+    time histogram per rollup row in response_rollups, and deleted, all in
+    one transaction, and the file is vacuumed. DatabaseManager expands
+    rollups back into rows for compacted days, so reports and range counts
+    do not change; only row ids and the original date text leave the
+    database. Ingest skips archived ids, and the server skips uploaded rows
+    dated on or before the live database's horizon.
+    """
+
+    def __init__(self, db_manager, logger, archive_dir: Path = Config.RETENTION_ARCHIVE_DIR):
+        self.db_manager = db_manager
+        self.logger = logger
+        self.archive_dir = Path(archive_dir)
+
+    def stores(self, horizon_day: int) -> Dict[str, List[Segment]]:
+        """Group the segments up to the horizon by database file"""
+        stores: Dict[str, List[Segment]] = {}
+        for segment in self.db_manager.segments(DateManager.ALL_DAYS[0], horizon_day):
+            stores.setdefault(segment.path, []).append(segment)
+        return stores
+
+    def _archive(self, conn: sqlite3.Connection, path: str, first_day: int, last_day: int) -> int:
+        """Write a store's raw rows in a day range to a gzipped CSV; return how many were written"""
+        first, last = DateManager.from_day_number(first_day), DateManager.from_day_number(last_day)
+        archive_path = self.archive_dir / (
+            f"{Path(path).stem}_{first:%Y-%m-%d}_{last:%Y-%m-%d}_{datetime.now():%Y%m%d%H%M%S}.csv.gz"
+        )
+        tmp_path = archive_path.with_suffix('.tmp')
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+
+        rows = 0
+        ids = []
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as f:
+            chunks = pd.read_sql_query(
+                "SELECT * FROM records WHERE service_day BETWEEN ? AND ?",
+                conn,
+                params=(first_day, last_day),
+                chunksize=Config.PLAN_CHUNK_ROWS
+            )
+            for chunk in chunks:
+                chunk.to_csv(f, header=rows == 0, index=False)
+                ids.append(chunk['id'].to_numpy(dtype=np.int64))
+                rows += len(chunk)
+        tmp_path.replace(archive_path)
+
+        ids_path = archive_path.with_name(archive_path.name.replace('.csv.gz', IDS_SUFFIX))
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.concatenate(ids) if ids else np.empty(0, dtype=np.int64))
+        tmp_path.replace(ids_path)
+
+        self.logger.log_message(f"Archived {rows} row(s) to {archive_path.name}")
+        return rows
+
+    @staticmethod
+    def _set_horizon(conn: sqlite3.Connection, last_day: int) -> None:
+        horizon = conn.execute("SELECT MAX(horizon_day) FROM retention").fetchone()[0]
+        conn.execute("DELETE FROM retention")
+        conn.execute("INSERT INTO retention (horizon_day) VALUES (?)", (max(last_day, horizon or last_day),))
+
+    def _fold(self, conn: sqlite3.Connection, first_day: int, last_day: int) -> int:
+        """Replace a day range's raw rows with rollups in one transaction; return the rollup rows added"""
+        bounds = (first_day, last_day)
+        columns = ', '.join(GROUP_COLUMNS)
+        with conn:
+            conn.execute(
+                f"INSERT INTO rollup_groups ({columns}) "
+                f"SELECT DISTINCT {columns} FROM records r WHERE service_day BETWEEN ? AND ? "
+                f"AND NOT EXISTS (SELECT 1 FROM rollup_groups g WHERE {GROUP_MATCH})",
+                bounds
+            )
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM record_rollups").fetchone()[0]
+            rollups = conn.execute(
+                f"INSERT INTO record_rollups (service_day, group_id, hour, origin_id, records) "
+                f"SELECT r.service_day, g.id, r.hour, r.origin_id, COUNT(*) "
+                f"FROM records r JOIN rollup_groups g ON {GROUP_MATCH} "
+                f"WHERE r.service_day BETWEEN ? AND ? GROUP BY 1, 2, 3, 4",
+                bounds
+            ).rowcount
+            # Rows of a day folded before keep their rollups; only the new ones get histograms here
+            conn.execute(
+                f"INSERT INTO response_rollups (rollup_id, response_time, records) "
+                f"SELECT u.id, r.response_time, COUNT(*) "
+                f"FROM records r JOIN rollup_groups g ON {GROUP_MATCH} "
+                f"JOIN record_rollups u ON u.id > ? AND u.service_day = r.service_day AND u.group_id = g.id "
+                f"AND u.hour IS r.hour AND u.origin_id IS r.origin_id "
+                f"WHERE r.service_day BETWEEN ? AND ? GROUP BY 1, 2",
+                (last_id,) + bounds
+            )
+            conn.execute("DELETE FROM records WHERE service_day BETWEEN ? AND ?", bounds)
+            self._set_horizon(conn, last_day)
+        return rollups
+
+    def compact_store(self, path: str, segments: List[Segment]) -> int:
+        """Compact every segment of one database file, then vacuum it; return the rows folded"""
+        sealed = any(segment.immutable for segment in segments)
+        if sealed:
+            # Readers must stop treating the shard as immutable while it is rewritten
+            self.db_manager.shards.set_immutable(Path(path).name, False)
+
+        size = Path(path).stat().st_size
+        folded = 0
+        with closing(sqlite3.connect(path, timeout=Config.SQLITE_BUSY_TIMEOUT)) as conn:
+            for statement in ROLLUP_SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+
+            for segment in segments:
+                first_day, last_day = conn.execute(
+                    "SELECT MIN(service_day), MAX(service_day) FROM records WHERE service_day BETWEEN ? AND ?",
+                    (segment.start_day, segment.end_day)
+                ).fetchone()
+                if first_day is None:
+                    continue
+                # Rows are only deleted once they are safely in the archive
+                rows = self._archive(conn, path, first_day, last_day)
+                rollups = self._fold(conn, first_day, last_day)
+                folded += rows
+                self.logger.log_message(f"Folded {rows} row(s) of {Path(path).name} into {rollups} rollup row(s)")
+
+            if folded:
+                conn.execute("VACUUM")
+            if sealed:
+                conn.execute("PRAGMA journal_mode=DELETE")
+
+        if sealed:
+            self.db_manager.shards.set_immutable(Path(path).name, True)
+        if folded:
+            self.logger.log_message(
+                f"Compacted {Path(path).name}: {size / 2 ** 20:.1f} MiB to {Path(path).stat().st_size / 2 ** 20:.1f} MiB"
+            )
+        return folded
+
+    def run(self, horizon: date) -> int:
+        """Compact every store's rows dated on or before the horizon; return the rows folded"""
+        horizon_day = DateManager.to_day_number(horizon)
+        folded = sum(
+            self.compact_store(path, segments)
+            for path, segments in self.stores(horizon_day).items()
+        )
+
+        # The server checks uploads against the live database's horizon, whichever stores held the rows
+        with closing(sqlite3.connect(self.db_manager.db_path, timeout=Config.SQLITE_BUSY_TIMEOUT)) as conn:
+            for statement in ROLLUP_SCHEMA:
+                conn.execute(statement)
+            with conn:
+                self._set_horizon(conn, horizon_day)
+        return folded
+
+
+def main():
+    """Fold old raw records into rollups"""
+    from database import DatabaseManager
+    from main import Logger
+
+    try:
+        parser = argparse.ArgumentParser(description="Archive old raw records and keep daily rollups in their place")
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=Config.RETENTION_DAYS,
+            help=f"Keep raw rows for this many days (defaults to {Config.RETENTION_DAYS})"
+        )
+        parser.add_argument('--through', help="Compact rows dated up to and including MM/DD/YYYY instead")
+        args = parser.parse_args()
+
+        Config.setup_output_directory()
+        logger = Logger()
+
+        if args.through:
+            horizon = DateManager.to_date(args.through)
+        else:
+            horizon = DateManager.from_day_number(DateManager.to_day_number(date.today()) - args.days)
+
+        logger.log_message(f"Compacting raw records through {DateManager.format_date(horizon)}")
+        folded = RetentionCompactor(DatabaseManager(use_columnar_store=False), logger).run(horizon)
+        logger.log_message(f"Retention finished: {folded} row(s) folded into rollups")
+
+    except Exception as e:
+        print(f"Critical error: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
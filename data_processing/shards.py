@@ -0,0 +1,377 @@
+import argparse
+import json
+import sqlite3
+import sys
+import traceback
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+import pandas as pd
+from config import Config
+from date_utils import DateManager
+
+
+PERIOD_FREQUENCIES = {'year': 'Y', 'quarter': 'Q'}
+
+
+@dataclass(frozen=True)
+class Segment:
+    """One store's share of a date range: the database file and the day numbers read from it"""
+    path: str
+    start_day: int
+    end_day: int
+    immutable: bool = False
+
+
+class ShardCatalog:
+    """
+    Catalog of the per-period record shards.
+
+    Each entry names a shard file and the day numbers its period covers.
+    Days covered by a shard are read from that shard and the live database
+    answers the rest. Rows uploaded late for a sharded period stay pending
+    in the live database until the next sync moves them; readers add them
+    to the shard's rows, minus any id the shard already has.
+    Sealed shards never change again and are opened with SQLite's
+    immutable flag, which skips locking and change detection.
+    """
+
+    CATALOG_NAME = 'catalog.json'
+
+    def __init__(self, root: Path = Config.SHARD_DIR, period: str = Config.SHARD_PERIOD):
+        if period not in PERIOD_FREQUENCIES:
+            raise Exception(f"Unsupported shard period: {period}")
+        self.root = Path(root)
+        self.period = period
+        self.catalog_path = self.root / self.CATALOG_NAME
+        self._version = None
+        self._shards: Dict[str, dict] = {}
+
+    def load(self) -> Dict[str, dict]:
+        """Return the shard entries by period key, rereading the catalog only after it was replaced"""
+        try:
+            stat = self.catalog_path.stat()
+        except FileNotFoundError:
+            return {}
+
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version != self._version:
+            with open(self.catalog_path, 'r', encoding='utf-8') as f:
+                catalog = json.load(f)
+            # Periods are fixed once the first shard is written, so keys never overlap
+            self.period = catalog.get('period', self.period)
+            self._shards = catalog.get('shards', {})
+            self._version = version
+        return self._shards
+
+    def save(self, shards: Dict[str, dict]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.catalog_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'period': self.period, 'shards': shards}, f, indent=2, sort_keys=True)
+        tmp_path.replace(self.catalog_path)
+
+    def set_immutable(self, file_name: str, immutable: bool) -> None:
+        """Seal or reopen the shard stored in file_name"""
+        shards = {
+            key: dict(entry, immutable=immutable) if entry['file'] == file_name else entry
+            for key, entry in self.load().items()
+        }
+        self.save(shards)
+
+    def shard_path(self, key: str) -> Path:
+        return self.root / f"records_{key}.db"
+
+    def period_key(self, day: int) -> str:
+        """Return the key (e.g. 2024 or 2024Q3) of the period holding a day number"""
+        return str(pd.Period(DateManager.from_day_number(day), freq=PERIOD_FREQUENCIES[self.period]))
+
+    def period_days(self, key: str) -> Tuple[int, int]:
+        """Return the first and last day number of a period"""
+        period = pd.Period(key, freq=PERIOD_FREQUENCIES[self.period])
+        return (
+            DateManager.to_day_number(period.start_time.date()),
+            DateManager.to_day_number(period.end_time.date())
+        )
+
+    def segments(self, live_path: str, start_day: int, end_day: int) -> List[Segment]:
+        """Split an inclusive day range between the shards covering it and the live database"""
+        segments = []
+        day = start_day
+        for entry in sorted(self.load().values(), key=lambda entry: entry['first_day']):
+            if entry['last_day'] < day or entry['first_day'] > end_day:
+                continue
+            if entry['first_day'] > day:
+                segments.append(Segment(live_path, day, entry['first_day'] - 1))
+            last = min(entry['last_day'], end_day)
+            segments.append(Segment(str(self.root / entry['file']), max(entry['first_day'], day), last, entry['immutable']))
+            day = last + 1
+
+        if day <= end_day:
+            segments.append(Segment(live_path, day, end_day))
+        return segments
+
+
+class ShardMigrator:
+    """Moves closed periods out of the live database into shards and seals old shards"""
+
+    def __init__(self, db_manager, catalog: ShardCatalog, logger):
+        self.db_manager = db_manager
+        self.catalog = catalog
+        self.logger = logger
+
+    def closed_periods(self, today: date) -> List[str]:
+        """Periods with rows or rollups in the live database that ended more than Config.SHARD_LIVE_DAYS ago"""
+        live = self.db_manager.get_connection(read_only=False)
+        first, last = live.execute("SELECT MIN(service_day), MAX(service_day) FROM records").fetchone()
+        if self._has_rollups(live, 'main'):
+            # Days folded by retention have no raw rows left but still belong to a period
+            first_rollup, last_rollup = live.execute(
+                "SELECT MIN(service_day), MAX(service_day) FROM main.record_rollups"
+            ).fetchone()
+            if first_rollup is not None:
+                first = min(first, first_rollup) if first is not None else first_rollup
+                last = max(last, last_rollup) if last is not None else last_rollup
+        if first is None:
+            return []
+
+        cutoff = DateManager.to_day_number(today) - Config.SHARD_LIVE_DAYS
+        keys = []
+        day = first
+        while day <= last:
+            key = self.catalog.period_key(day)
+            first_day, last_day = self.catalog.period_days(key)
+            if last_day >= cutoff:
+                break
+            keys.append(key)
+            day = last_day + 1
+        return keys
+
+    @staticmethod
+    def _has_rollups(conn: sqlite3.Connection, schema: str) -> bool:
+        return conn.execute(
+            f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = 'record_rollups'"
+        ).fetchone() is not None
+
+    @staticmethod
+    def _create_rollups(path: Path) -> None:
+        """Give a shard the rollup tables retention writes (see retention.py)"""
+        from retention import ROLLUP_SCHEMA
+
+        with closing(sqlite3.connect(path)) as conn:
+            for statement in ROLLUP_SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+
+    @staticmethod
+    def _copy_rollups(live: sqlite3.Connection, bounds: Tuple[int, int]) -> int:
+        """
+        Copy the live rollups of a day range, their histograms and the horizon into the attached shard.
+
+        Rollups keep their live ids, so a move interrupted before the live
+        copies were deleted does not count them twice when rerun. The shard
+        cannot already use those ids: retention only writes rollups into a
+        shard once the catalog routes its days there, after this copy.
+        Return how many rollup rows were new to the shard.
+        """
+        from retention import GROUP_COLUMNS, GROUP_MATCH
+
+        columns = ', '.join(GROUP_COLUMNS)
+        live.execute(
+            f"INSERT INTO shard.rollup_groups ({columns}) "
+            f"SELECT DISTINCT {', '.join(f'r.{column}' for column in GROUP_COLUMNS)} "
+            f"FROM main.record_rollups u JOIN main.rollup_groups r ON r.id = u.group_id "
+            f"WHERE u.service_day BETWEEN ? AND ? "
+            f"AND NOT EXISTS (SELECT 1 FROM shard.rollup_groups g WHERE {GROUP_MATCH})",
+            bounds
+        )
+        live.execute(
+            "INSERT INTO shard.response_rollups (rollup_id, response_time, records) "
+            "SELECT s.rollup_id, s.response_time, s.records "
+            "FROM main.response_rollups s JOIN main.record_rollups u ON u.id = s.rollup_id "
+            "WHERE u.service_day BETWEEN ? AND ? "
+            "AND NOT EXISTS (SELECT 1 FROM shard.record_rollups x WHERE x.id = u.id)",
+            bounds
+        )
+        added = live.execute(
+            f"INSERT OR IGNORE INTO shard.record_rollups (id, service_day, group_id, hour, origin_id, records) "
+            f"SELECT u.id, u.service_day, g.id, u.hour, u.origin_id, u.records "
+            f"FROM main.record_rollups u JOIN main.rollup_groups r ON r.id = u.group_id "
+            f"JOIN shard.rollup_groups g ON {GROUP_MATCH} "
+            f"WHERE u.service_day BETWEEN ? AND ?",
+            bounds
+        ).rowcount
+
+        # Readers only look at a store's rollups up to its own horizon
+        horizon = min(
+            live.execute("SELECT MAX(horizon_day) FROM main.retention").fetchone()[0] or bounds[0] - 1,
+            bounds[1]
+        )
+        shard_horizon = live.execute("SELECT MAX(horizon_day) FROM shard.retention").fetchone()[0]
+        if horizon >= bounds[0] and (shard_horizon is None or shard_horizon < horizon):
+            live.execute("DELETE FROM shard.retention")
+            live.execute("INSERT INTO shard.retention (horizon_day) VALUES (?)", (horizon,))
+        return added
+
+    @staticmethod
+    def _create_shard(live: sqlite3.Connection, path: Path) -> None:
+        """Create an empty shard with the live records table and its indexes"""
+        schema = [
+            sql for (sql,) in live.execute(
+                "SELECT sql FROM main.sqlite_master WHERE tbl_name = 'records' AND sql IS NOT NULL"
+            )
+        ]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(path)) as conn:
+            for statement in schema:
+                conn.execute(statement)
+            conn.commit()
+
+    def move(self, key: str) -> int:
+        """
+        Move one period's live rows into its shard; return how many were new to it.
+
+        Rows are copied and the catalog saved before they are deleted from
+        the live database, so readers always find them in one of the two.
+        Rows pending for an existing shard were already read with it, so
+        no report changes. Days retention already folded move as their
+        rollups, with the live horizon, since readers take a shard's
+        rollups from the shard alone.
+        """
+        first_day, last_day = self.catalog.period_days(key)
+        bounds = (first_day, last_day)
+        shards = dict(self.catalog.load())
+        entry = shards.get(key)
+        path = self.catalog.shard_path(key)
+
+        live = self.db_manager.get_connection(read_only=False)
+        if entry is None and not path.exists():
+            self._create_shard(live, path)
+        rollups = self._has_rollups(live, 'main')
+        if rollups:
+            self._create_rollups(path)
+        if entry is not None and entry['immutable']:
+            # Readers must stop treating the file as immutable before it is written
+            shards[key] = dict(entry, immutable=False)
+            self.catalog.save(shards)
+            self.logger.log_message(f"Shard {key} reopened for late rows; seal it again afterwards", is_error=True)
+
+        columns = ', '.join(row[1] for row in live.execute("PRAGMA main.table_info(records)"))
+        live.execute("ATTACH DATABASE ? AS shard", (str(path),))
+        try:
+            with live:
+                added = live.execute(
+                    f"INSERT OR IGNORE INTO shard.records ({columns}) "
+                    f"SELECT {columns} FROM main.records WHERE service_day BETWEEN ? AND ?",
+                    bounds
+                ).rowcount
+                folded = self._copy_rollups(live, bounds) if rollups else 0
+            rows = live.execute("SELECT COUNT(*) FROM shard.records").fetchone()[0]
+
+            shards[key] = {
+                'file': path.name,
+                'first_day': first_day,
+                'last_day': last_day,
+                'rows': rows,
+                'immutable': False,
+                'written_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            self.catalog.save(shards)
+
+            with live:
+                removed = live.execute("DELETE FROM main.records WHERE service_day BETWEEN ? AND ?", bounds).rowcount
+                if rollups:
+                    live.execute(
+                        "DELETE FROM main.response_rollups WHERE rollup_id IN "
+                        "(SELECT id FROM main.record_rollups WHERE service_day BETWEEN ? AND ?)",
+                        bounds
+                    )
+                    live.execute("DELETE FROM main.record_rollups WHERE service_day BETWEEN ? AND ?", bounds)
+        finally:
+            live.execute("DETACH DATABASE shard")
+
+        self.logger.log_message(
+            f"Shard {key}: moved {removed} live row(s), {added} new, {rows} in shard"
+            f"{f', {folded} rollup row(s)' if folded else ''}"
+        )
+        return added
+
+    def sync(self, today: date) -> int:
+        """Move every closed period; return the rows new to their shards"""
+        return sum(self.move(key) for key in self.closed_periods(today))
+
+    def seal(self, today: date) -> List[str]:
+        """Compact and seal shards whose period ended more than Config.SHARD_SEAL_DAYS ago"""
+        cutoff = DateManager.to_day_number(today) - Config.SHARD_SEAL_DAYS
+        shards = dict(self.catalog.load())
+        sealed = []
+        for key, entry in sorted(shards.items()):
+            if entry['immutable'] or entry['last_day'] >= cutoff:
+                continue
+
+            # An immutable database must be a single file with no WAL beside it
+            with closing(sqlite3.connect(self.catalog.root / entry['file'])) as conn:
+                conn.execute("PRAGMA journal_mode=DELETE")
+                conn.execute("VACUUM")
+
+            shards[key] = dict(entry, immutable=True, written_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            sealed.append(key)
+            self.logger.log_message(f"Sealed shard {key}")
+
+        if sealed:
+            self.catalog.save(shards)
+        return sealed
+
+
+def main():
+    """Move closed periods into shards, seal old shards or list the catalog"""
+    from database import DatabaseManager, connection_manager
+    from main import Logger
+
+    try:
+        parser = argparse.ArgumentParser(description="Per-period shards of the records table")
+        subparsers = parser.add_subparsers(dest='command', required=True)
+        sync_parser = subparsers.add_parser('sync', help="Move closed periods out of the live database")
+        sync_parser.add_argument('--vacuum', action='store_true', help="Reclaim the moved rows' space in the live database")
+        subparsers.add_parser('seal', help="Mark old shards immutable")
+        subparsers.add_parser('status', help="List the shards in the catalog")
+        args = parser.parse_args()
+
+        catalog = ShardCatalog()
+        if args.command == 'status':
+            for key, entry in sorted(catalog.load().items()):
+                print(
+                    f"{key}: {entry['file']}, {entry['rows']} rows, "
+                    f"{DateManager.from_day_number(entry['first_day'])} to {DateManager.from_day_number(entry['last_day'])}"
+                    f"{', sealed' if entry['immutable'] else ''}"
+                )
+            return
+
+        if not Config.USE_SHARDS:
+            raise Exception("Enable Config.USE_SHARDS before sharding; readers would not see the moved rows")
+
+        Config.setup_output_directory()
+        logger = Logger()
+        db_manager = DatabaseManager(use_columnar_store=False)
+        migrator = ShardMigrator(db_manager, catalog, logger)
+
+        if args.command == 'seal':
+            sealed = migrator.seal(date.today())
+            logger.log_message(f"Sealed {len(sealed)} shard(s)")
+            return
+
+        moved = migrator.sync(date.today())
+        if args.vacuum:
+            db_manager.get_connection(read_only=False).execute("VACUUM")
+        connection_manager.close_all()
+        logger.log_message(f"Shard sync finished: {moved} row(s) new to their shards")
+
+    except Exception as e:
+        print(f"Critical error: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+# Segments this process has attached to, by name. A segment stays mapped
+# until detach(), so every frame attached from one handle shares one mapping.
+_attached_segments: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _open_segment(name: str) -> shared_memory.SharedMemory:
+    segment = _attached_segments.get(name)
+    if segment is None:
+        segment = _attached_segments[name] = shared_memory.SharedMemory(name=name)
+    return segment
+
+
+@dataclass(frozen=True)
+class SharedColumn:
+    """Where one column lives in shared memory and how to rebuild it"""
+    name: str
+    segment: str
+    dtype: str
+    # Dictionary for string columns, which are stored as integer codes
+    categories: Optional[Tuple[str, ...]] = None
+
+
+@dataclass(frozen=True)
+class SharedFrameHandle:
+    """
+    Picklable descriptor of a SharedFrame.
+
+    Only segment names, dtypes and category dictionaries are pickled, so
+    sending a handle to a worker costs the same whatever the row count.
+    """
+    columns: Tuple[SharedColumn, ...]
+    length: int
+
+    def attach(self, categorical: bool = True) -> pd.DataFrame:
+        """
+        Return a DataFrame whose numeric columns and category codes are
+        read-only views onto the shared segments.
+
+        With categorical=False string columns are decoded back to plain
+        strings, a per-worker copy for code that does not handle categoricals.
+
+        Workers must be started by the process that created the frame (a
+        multiprocessing pool), which shares its resource tracker.
+        """
+        data = {}
+        for column in self.columns:
+            values = np.ndarray(
+                self.length,
+                dtype=np.dtype(column.dtype),
+                buffer=_open_segment(column.segment).buf
+            )
+            values.flags.writeable = False
+            if column.categories is not None:
+                categories = pd.Index(column.categories)
+                values = pd.Categorical.from_codes(values, categories=categories)
+                if not categorical:
+                    values = pd.Series(values).astype(categories.dtype).to_numpy()
+            data[column.name] = values
+        return pd.DataFrame(data, copy=False)
+
+    def detach(self) -> None:
+        """
+        Unmap this process's attachment to the frame's segments.
+
+        Pool workers outlive any one frame, so a worker that never detaches
+        keeps every frame it has seen mapped. Every DataFrame returned by
+        attach() must be gone first; a live view makes this raise BufferError.
+        """
+        for column in self.columns:
+            segment = _attached_segments.pop(column.segment, None)
+            if segment is not None:
+                segment.close()
+
+
+class SharedFrame:
+    """
+    A DataFrame copied once into multiprocessing.shared_memory.
+
+    String columns are dictionary-encoded as the smallest integer codes that
+    fit; other columns are stored as their raw NumPy values. The creator owns
+    the segments and removes them on close().
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._segments: List[shared_memory.SharedMemory] = []
+        columns = []
+        try:
+            for name in df.columns:
+                values, categories = self._encode(df[name])
+                segment = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                self._segments.append(segment)
+                np.ndarray(len(values), dtype=values.dtype, buffer=segment.buf)[:] = values
+                columns.append(SharedColumn(str(name), segment.name, values.dtype.str, categories))
+        except Exception:
+            self.close()
+            raise
+        self.handle = SharedFrameHandle(tuple(columns), len(df))
+
+    @staticmethod
+    def _encode(series: pd.Series) -> Tuple[np.ndarray, Optional[Tuple[str, ...]]]:
+        """Return the array to share and, for string columns, its dictionary"""
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            return series.to_numpy(), None
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes, categories = series.cat.codes.to_numpy(), series.cat.categories
+        else:
+            codes, categories = pd.factorize(series)
+        # Missing values keep pandas' -1 code, so the codes must stay signed
+        code_dtype = np.int8 if len(categories) < 2 ** 7 else np.int16 if len(categories) < 2 ** 15 else np.int32
+        return codes.astype(code_dtype), tuple(str(category) for category in categories)
+
+    def __enter__(self) -> 'SharedFrame':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release and remove every segment; attached workers must be finished"""
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
@@ -0,0 +1,113 @@
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import date, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+
+# The data_processing modules import each other by bare name, as when run as scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config  # noqa: E402
+from date_utils import DateManager  # noqa: E402
+
+
+RECORDS_SCHEMA = [
+    """
+    CREATE TABLE records (
+        id integer primary key, date_of_service text, division text, priority text, category text,
+        level text, weekday text, hour integer, origin text, response_time integer,
+        service_day integer, origin_id integer)""",
+    "CREATE INDEX idx_records_service_day ON records (service_day)",
+    "CREATE TABLE origins (id integer primary key, name text not null unique)",
+    "CREATE TABLE origin_aliases (alias text primary key, origin_id integer not null references origins (id))",
+]
+
+ORIGINS = ['METHODIST HOSPITAL - NORTH', 'BAPTIST MEMORIAL HOSPITAL - MEMPHIS', 'VANDERBILT ER', 'NURSING HOME']
+FIRST_DAY = date(2023, 11, 1)
+DAYS = 120
+
+
+def write_records(path: Path, seed: int = 7, rows_per_day: int = 20) -> None:
+    """Write a small records database spanning a year boundary, with NULLs and out-of-range values"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for offset in range(DAYS):
+        day = FIRST_DAY + timedelta(days=offset)
+        for _ in range(int(rng.integers(rows_per_day // 2, rows_per_day * 2))):
+            origin_id = int(rng.integers(1, len(ORIGINS) + 1))
+            category = str(rng.choice(['Ran', 'Ran', 'Turned', 'Cancelled']))
+            rows.append((
+                day.strftime('%m/%d/%y'),
+                str(rng.choice(['Memphis', 'Nashville', 'Special Event'])),
+                None if rng.random() < 0.05 else str(rng.choice(['Emergent', 'Non Emergent'])),
+                category,
+                None if rng.random() < 0.05 else str(rng.choice(['ALS', 'BLS', 'CCU'])),
+                day.strftime('%A'),
+                None if rng.random() < 0.02 else int(rng.integers(0, 24)),
+                ORIGINS[origin_id - 1],
+                int(rng.integers(-5, 200)) if category == 'Ran' else 0,
+                DateManager.to_day_number(day),
+                origin_id
+            ))
+
+    with closing(sqlite3.connect(path)) as conn:
+        for statement in RECORDS_SCHEMA:
+            conn.execute(statement)
+        conn.executemany("INSERT INTO origins (id, name) VALUES (?, ?)", enumerate(ORIGINS, start=1))
+        conn.executemany(
+            "INSERT INTO records (date_of_service, division, priority, category, level, weekday, hour, "
+            "origin, response_time, service_day, origin_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Point every file the pipeline writes at tmp_path"""
+    monkeypatch.setattr(Config, 'DATABASE_PATH', str(tmp_path / 'data.db'))
+    monkeypatch.setattr(Config, 'OUTPUT_DIR', tmp_path / 'output')
+    monkeypatch.setattr(Config, 'LOG_DIR', tmp_path / 'output')
+    monkeypatch.setattr(Config, 'INGEST_STAMP', tmp_path / 'output' / 'last_ingest')
+    monkeypatch.setattr(Config, 'SHARD_DIR', tmp_path / 'shards')
+    monkeypatch.setattr(Config, 'RETENTION_ARCHIVE_DIR', tmp_path / 'archive')
+    monkeypatch.setattr(Config, 'RANGE_INDEX_PATH', tmp_path / 'range_index.npz')
+    monkeypatch.setattr(Config, 'PROFILE_DIR', tmp_path / 'profiles')
+    monkeypatch.setattr(Config, 'COLUMNAR_STORE_DIR', tmp_path / 'columnar_store')
+    Config.setup_output_directory()
+    return tmp_path
+
+
+@pytest.fixture
+def records_db(workdir) -> str:
+    """Path of a fresh records database; each test gets its own, so cached connections never cross tests"""
+    from database import connection_manager
+
+    write_records(workdir / 'data.db')
+    yield Config.DATABASE_PATH
+    connection_manager.close_all()
+
+
+@pytest.fixture
+def db_manager(records_db):
+    """An unsharded manager reading the fixture database straight from SQLite"""
+    from database import DatabaseManager
+
+    return DatabaseManager(records_db, use_columnar_store=False, use_shards=False)
+
+
+@pytest.fixture
+def logger(workdir):
+    from main import Logger
+
+    return Logger()
+
+
+def sorted_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Rows as plain values in a fixed order, so frames read from different stores compare equal"""
+    df = df.astype({column: object for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+    df = df.astype({column: 'Float64' for column in ['hour', 'origin_id', 'response_time'] if column in df.columns})
+    return df.sort_values(list(df.columns), na_position='first').reset_index(drop=True)
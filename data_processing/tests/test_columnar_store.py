@@ -0,0 +1,42 @@
+import os
+import time
+import pandas as pd
+import pytest
+from conftest import sorted_rows
+from config import Config
+
+pytest.importorskip('pyarrow')
+
+from columnar_store import ColumnarStore, compact  # noqa: E402
+
+
+@pytest.mark.parametrize('file_format', ['feather', 'parquet'])
+def test_partitions_read_like_sqlite(db_manager, workdir, file_format):
+    store = ColumnarStore(workdir / 'columnar_store', file_format)
+    assert not store.covers(pd.Timestamp('2023-11-01').date(), pd.Timestamp('2024-02-28').date())
+    written = compact(db_manager, store, '11/01/2023', '02/28/2024')
+    assert len(written) == 4
+
+    for start, end, columns in [
+        ('2023-11-01', '2024-02-28', None),
+        ('2023-12-25', '2024-01-05', None),
+        ('2024-02-10', '2024-02-10', ['date_of_service', 'division', 'response_time']),
+    ]:
+        start, end = pd.Timestamp(start).date(), pd.Timestamp(end).date()
+        assert store.covers(start, end, columns)
+        pd.testing.assert_frame_equal(
+            sorted_rows(store.read(start, end, columns)),
+            sorted_rows(db_manager.fetch_data_from_sqlite(start, end, columns))
+        )
+
+
+def test_ingest_makes_partitions_stale(db_manager, workdir):
+    store = ColumnarStore(workdir / 'columnar_store')
+    compact(db_manager, store, '01/01/2024', '01/31/2024')
+    january = (pd.Timestamp('2024-01-01').date(), pd.Timestamp('2024-01-31').date())
+    assert store.covers(*january)
+
+    Config.INGEST_STAMP.write_text('ingested')
+    later = time.time() + 5
+    os.utime(Config.INGEST_STAMP, (later, later))
+    assert not store.covers(*january)
@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+from cube import CallCube
+
+
+QUERIES = [
+    ([], {}),
+    (['division'], {}),
+    (['division', 'category'], {}),
+    (['category', 'level', 'hour'], {}),
+    (['date'], {'division': 'Memphis'}),
+    (['hour'], {'division': 'Memphis', 'level': ['ALS', 'BLS']}),
+    (['weekday'], {'category': 'Ran'}),
+    (['category'], {'weekday': ['Saturday', 'Sunday']}),
+    (['weekday', 'division'], {'priority': 'Emergent', 'date': pd.Timestamp('2024-01-01')}),
+    (['origin'], {}),
+    (['division', 'origin'], {'category': 'Ran'}),
+    (['priority'], {'origin': ['VANDERBILT ER', 'NURSING HOME']}),
+    ([], {'level': 'Unknown'}),
+]
+
+
+@pytest.fixture
+def records(db_manager):
+    return db_manager.fetch_data_from_sqlite('11/01/2023', '02/28/2024')
+
+
+def _naive_frame(records: pd.DataFrame) -> pd.DataFrame:
+    """The cube's dimensions as plain columns, for grouping row by row"""
+    dates = records['date_of_service'].dt.normalize()
+    return pd.DataFrame({
+        'date': dates,
+        'weekday': dates.dt.day_name(),
+        'division': records['division'],
+        'priority': records['priority'],
+        'category': records['category'],
+        'level': records['level'],
+        'hour': records['hour'],
+        'origin': records['origin'].astype(object),
+    })
+
+
+def _label(value):
+    return None if pd.isna(value) else value
+
+
+def _nonzero_counts(counts: pd.Series) -> dict:
+    """Counts keyed by label tuples, with missing labels as None and empty groups left out"""
+    counts = counts[counts > 0]
+    if counts.index.nlevels == 1:
+        return {(_label(key),): int(count) for key, count in counts.items()}
+    return {tuple(_label(value) for value in key): int(count) for key, count in counts.items()}
+
+
+@pytest.mark.parametrize('by, where', QUERIES)
+def test_query_matches_groupby(records, by, where):
+    cube = CallCube.from_frame(records)
+    naive = _naive_frame(records)
+    for dimension, selection in where.items():
+        values = selection if isinstance(selection, list) else [selection]
+        naive = naive[naive[dimension].isin(values)]
+
+    result = cube.query(by, where)
+    if not by:
+        assert result == len(naive)
+        return
+
+    assert list(result.index.names) == by
+    # Every combination of labels is listed, zeros included
+    assert len(result) == len(result.index.unique())
+    assert _nonzero_counts(result) == _nonzero_counts(naive.groupby(by, dropna=False).size())
+
+
+def test_hour_labels(records):
+    cube = CallCube.from_frame(records)
+    # The fixture has rows without an hour, which get a trailing missing label
+    assert list(cube.labels['hour'][:24]) == list(range(24))
+    assert len(cube.labels['hour']) == 25
+
+    valid = records[records['hour'].notna()]
+    assert list(CallCube.from_frame(valid).labels['hour']) == list(range(24))
+
+
+def test_grouping_by_date_and_weekday_at_once_is_refused(records):
+    with pytest.raises(Exception, match="share the date axis"):
+        CallCube.from_frame(records).query(['date', 'weekday'])
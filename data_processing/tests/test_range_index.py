@@ -0,0 +1,70 @@
+from datetime import date
+import pytest
+from range_index import RangeCountIndex, RangeCounter
+
+
+RANGES = [
+    (date(2023, 11, 1), date(2024, 2, 28)),
+    (date(2023, 11, 15), date(2023, 11, 15)),
+    (date(2023, 12, 20), date(2024, 1, 10)),
+    # Ranges reaching past either end of the data are clipped
+    (date(2023, 1, 1), date(2023, 11, 3)),
+    (date(2024, 2, 25), date(2024, 12, 31)),
+    (date(2022, 1, 1), date(2022, 12, 31)),
+]
+FILTERS = [
+    {},
+    {'division': 'Memphis'},
+    {'category': 'Ran', 'level': 'ALS'},
+    {'division': 'Nashville', 'category': 'Turned', 'level': 'BLS'},
+    # NULL levels are indexed as ''
+    {'level': ''},
+    {'origin_id': 2},
+    {'division': 'Special Event', 'category': 'Ran', 'origin_id': 3},
+    {'division': 'Nowhere'},
+]
+
+
+@pytest.fixture
+def counter(db_manager, workdir):
+    return RangeCounter(db_manager, workdir / 'range_index.npz')
+
+
+@pytest.mark.parametrize('start, end', RANGES)
+def test_count_matches_scan(db_manager, counter, start, end):
+    index = RangeCountIndex.build(db_manager)
+    for filters in FILTERS:
+        scan_filters = dict(filters)
+        if scan_filters.get('level') == '':
+            # The scan cannot match NULL with =, so count NULL levels by subtraction
+            del scan_filters['level']
+            expected = counter.scan_count(start, end, **scan_filters) - sum(
+                counter.scan_count(start, end, level=level, **scan_filters) for level in ['ALS', 'BLS', 'CCU']
+            )
+        else:
+            expected = counter.scan_count(start, end, **scan_filters)
+        assert index.count(start, end, **filters) == expected, filters
+
+
+def test_saved_index_answers_the_same(db_manager, counter, workdir):
+    index = RangeCountIndex.build(db_manager)
+    index.save(workdir / 'range_index.npz')
+    loaded = RangeCountIndex.load(workdir / 'range_index.npz')
+
+    assert loaded.first_day == index.first_day and loaded.last_day == index.last_day
+    for start, end in RANGES:
+        for filters in FILTERS:
+            assert loaded.count(start, end, **filters) == index.count(start, end, **filters)
+
+    # The counter uses the saved index and resolves origin names to ids
+    assert counter.fresh_index() is not None
+    assert counter.count('11/01/2023', '02/28/2024', origin=' vanderbilt  er') == counter.scan_count(
+        '11/01/2023', '02/28/2024', origin_id=3
+    )
+    assert counter.count('11/01/2023', '02/28/2024', origin='UNKNOWN') == 0
+
+
+def test_index_without_origins_refuses_origin_counts(db_manager):
+    index = RangeCountIndex.build(db_manager, include_origins=False)
+    with pytest.raises(Exception, match="without origins"):
+        index.count('11/01/2023', '02/28/2024', origin_id=1)
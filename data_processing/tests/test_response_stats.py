@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+from config import Config
+from response_stats import GroupedResponseHistograms, ResponseTimeHistogram
+
+
+@pytest.fixture
+def records() -> pd.DataFrame:
+    rng = np.random.default_rng(3)
+    size = 5000
+    response_time = rng.integers(-10, 120, size).astype(float)
+    response_time[rng.random(size) < 0.01] = Config.RESPONSE_TIME_MAX + 500
+    response_time[rng.random(size) < 0.01] = np.nan
+    return pd.DataFrame({
+        'response_time': response_time,
+        'priority': rng.choice(['Emergent', 'Non Emergent', None], size, p=[0.5, 0.45, 0.05]),
+        'origin': rng.choice(['A', 'B', 'C', None], size, p=[0.5, 0.3, 0.15, 0.05]),
+    })
+
+
+def _valid(df: pd.DataFrame) -> pd.DataFrame:
+    return df[df['priority'].notna() & (df['response_time'] > 0) & (df['response_time'] <= Config.RESPONSE_TIME_MAX)]
+
+
+def _naive_percentile(values: np.ndarray, q: float) -> int:
+    """Smallest value at or below which a q share of the values fall"""
+    ordered = np.sort(values)
+    return int(ordered[int(np.ceil(q * len(ordered))) - 1]) if q > 0 else int(ordered[0])
+
+
+def _assert_matches(histogram: ResponseTimeHistogram, values: np.ndarray) -> None:
+    assert histogram.total == len(values)
+    for q in Config.RESPONSE_TIME_PERCENTILES:
+        assert histogram.percentile(q) == _naive_percentile(values, q), q
+    for minutes in Config.RESPONSE_TIME_SLAS:
+        assert histogram.share_within(minutes) == pytest.approx(np.mean(values <= minutes)), minutes
+
+
+def test_percentiles_and_slas_match_sorted_values(records):
+    values = _valid(records)['response_time'].to_numpy(dtype=np.int64)
+    _assert_matches(ResponseTimeHistogram.from_values(values), values)
+
+
+def test_histograms_add_like_concatenated_values(records):
+    values = _valid(records)['response_time'].to_numpy(dtype=np.int64)
+    half = len(values) // 2
+    merged = ResponseTimeHistogram.from_values(values[:half]) + ResponseTimeHistogram.from_values(values[half:])
+    _assert_matches(merged, values)
+
+
+def test_empty_histogram_has_no_statistics():
+    summary = ResponseTimeHistogram().summary()
+    assert summary['count'] == 0
+    assert all(value is None for key, value in summary.items() if key != 'count')
+
+
+def test_by_group_matches_groupby(records):
+    valid = _valid(records)
+    histograms = ResponseTimeHistogram.by_group(records, 'origin')
+
+    expected = valid.dropna(subset=['origin']).groupby('origin')['response_time']
+    assert set(histograms) == set(expected.groups)
+    for origin, values in expected:
+        _assert_matches(histograms[origin], values.to_numpy(dtype=np.int64))
+
+    everything = ResponseTimeHistogram.by_group(records)
+    assert list(everything) == ['All']
+    _assert_matches(everything['All'], valid['response_time'].to_numpy(dtype=np.int64))
+    assert ResponseTimeHistogram.by_group(records.iloc[:0]) == {}
+
+
+def test_grouped_histograms_match_groupby(records):
+    grouped = GroupedResponseHistograms.build(records, 'origin', 'priority')
+    expected = _valid(records).dropna(subset=['origin']).groupby(['origin', 'priority'])['response_time']
+
+    for (origin, priority), values in expected:
+        counts = grouped.group_counts(origin)[grouped.subgroups.get_loc(priority)]
+        _assert_matches(ResponseTimeHistogram(counts), values.to_numpy(dtype=np.int64))
+    assert grouped.counts.sum() == sum(len(values) for _, values in expected)
+    assert not grouped.group_counts('Z').any()
+
+    summaries = GroupedResponseHistograms.summaries(list(grouped.subgroups), grouped.group_counts('A'))
+    assert list(summaries) == sorted(summaries)
+    assert summaries['Emergent'] == ResponseTimeHistogram(grouped.group_counts('A')[0]).summary()
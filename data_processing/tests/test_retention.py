@@ -0,0 +1,55 @@
+from datetime import date
+import pandas as pd
+from conftest import sorted_rows
+from date_utils import DateManager
+from range_index import RangeCountIndex
+from retention import RetentionCompactor, archived_ids
+
+
+GROUPS = ['service_day', 'division', 'priority', 'category', 'level', 'weekday', 'hour', 'origin_id']
+
+
+def _snapshot(db_manager) -> tuple:
+    rows = sorted_rows(db_manager.fetch_data_from_sqlite('11/01/2023', '02/28/2024'))
+    counts = db_manager.count_records(*DateManager.ALL_DAYS, group_columns=GROUPS)
+    return rows, counts.sort_values(GROUPS, na_position='first').reset_index(drop=True)
+
+
+def test_rollups_expand_to_the_same_rows(db_manager, logger, workdir):
+    rows, counts = _snapshot(db_manager)
+    index = RangeCountIndex.build(db_manager)
+    old_rows = db_manager.count_records(DateManager.ALL_DAYS[0], DateManager.to_day_number(date(2023, 12, 15)))
+
+    compactor = RetentionCompactor(db_manager, logger, workdir / 'archive')
+    folded = compactor.run(date(2023, 12, 15))
+    assert folded == old_rows['records'][0]
+    assert len(archived_ids(workdir / 'archive')) == folded
+
+    with db_manager.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM records WHERE service_day <= ?", (
+            DateManager.to_day_number(date(2023, 12, 15)),
+        )).fetchone()[0] == 0
+
+    compacted_rows, compacted_counts = _snapshot(db_manager)
+    pd.testing.assert_frame_equal(compacted_rows, rows)
+    pd.testing.assert_frame_equal(compacted_counts, counts, check_dtype=False)
+
+    # Counts read through rollups give the same index
+    compacted_index = RangeCountIndex.build(db_manager)
+    for start, end in [('11/01/2023', '02/28/2024'), ('12/10/2023', '12/20/2023'), ('11/05/2023', '11/05/2023')]:
+        for filters in [{}, {'division': 'Memphis', 'category': 'Ran'}, {'origin_id': 4}]:
+            assert compacted_index.count(start, end, **filters) == index.count(start, end, **filters)
+
+
+def test_compacting_again_folds_only_new_days(db_manager, logger, workdir):
+    rows, counts = _snapshot(db_manager)
+    compactor = RetentionCompactor(db_manager, logger, workdir / 'archive')
+    compactor.run(date(2023, 11, 30))
+    assert compactor.run(date(2023, 11, 30)) == 0
+    compactor.run(date(2024, 1, 10))
+
+    compacted_rows, compacted_counts = _snapshot(db_manager)
+    pd.testing.assert_frame_equal(compacted_rows, rows)
+    pd.testing.assert_frame_equal(compacted_counts, counts, check_dtype=False)
+    with db_manager.get_connection() as conn:
+        assert db_manager.rollup_horizon(conn) == DateManager.to_day_number(date(2024, 1, 10))
@@ -0,0 +1,112 @@
+import sqlite3
+from contextlib import closing
+from datetime import date
+import pandas as pd
+import pytest
+from conftest import sorted_rows, write_records
+from database import DatabaseManager
+from date_utils import DateManager
+from retention import RetentionCompactor
+from shards import ShardCatalog, ShardMigrator
+
+
+GROUPS = ['service_day', 'division', 'category', 'level', 'origin_id']
+# 2023 ended more than Config.SHARD_LIVE_DAYS before this, 2024 has not
+SYNC_DAY = date(2024, 3, 1)
+LATE_ROW = (
+    "INSERT INTO records (id, date_of_service, division, priority, category, level, weekday, hour, "
+    "origin, response_time, service_day, origin_id) VALUES (?, '12/24/23', 'Memphis', 'Emergent', 'Ran', "
+    "'ALS', 'Sunday', 3, 'VANDERBILT ER', 12, ?, 3)"
+)
+
+
+@pytest.fixture
+def reference(workdir) -> DatabaseManager:
+    """The same records, never sharded"""
+    write_records(workdir / 'reference.db')
+    return DatabaseManager(str(workdir / 'reference.db'), use_columnar_store=False, use_shards=False)
+
+
+@pytest.fixture
+def sharded(records_db, workdir) -> DatabaseManager:
+    db_manager = DatabaseManager(records_db, use_columnar_store=False, use_shards=False)
+    db_manager.shards = ShardCatalog(root=workdir / 'shards', period='year')
+    return db_manager
+
+
+def _assert_same_records(db_manager: DatabaseManager, reference: DatabaseManager, same_ids: bool = True) -> None:
+    for start, end in [('11/01/2023', '02/28/2024'), ('12/20/2023', '01/10/2024'), ('11/01/2023', '12/31/2023')]:
+        pd.testing.assert_frame_equal(
+            sorted_rows(db_manager.fetch_data_from_sqlite(start, end)),
+            sorted_rows(reference.fetch_data_from_sqlite(start, end))
+        )
+        pd.testing.assert_frame_equal(
+            db_manager.count_records(
+                DateManager.to_day_number(start), DateManager.to_day_number(end), group_columns=GROUPS
+            ).sort_values(GROUPS, na_position='first').reset_index(drop=True),
+            reference.count_records(
+                DateManager.to_day_number(start), DateManager.to_day_number(end), group_columns=GROUPS
+            ).sort_values(GROUPS, na_position='first').reset_index(drop=True)
+        )
+    if same_ids:
+        # Ids pending for a shard are listed twice when the shard already has them
+        assert set(db_manager.fetch_record_ids()) == set(reference.fetch_record_ids())
+
+
+def _insert(path: str, rows: list) -> None:
+    with closing(sqlite3.connect(path)) as conn:
+        conn.executemany(LATE_ROW, rows)
+        conn.commit()
+
+
+def test_sync_moves_closed_periods(sharded, reference, logger):
+    migrator = ShardMigrator(sharded, sharded.shards, logger)
+    assert migrator.closed_periods(SYNC_DAY) == ['2023']
+    moved = migrator.sync(SYNC_DAY)
+
+    with sharded.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM records WHERE service_day <= ?", (
+            DateManager.to_day_number(date(2023, 12, 31)),
+        )).fetchone()[0] == 0
+    assert sharded.shards.load()['2023']['rows'] == moved
+    _assert_same_records(sharded, reference)
+    assert migrator.sync(SYNC_DAY) == 0
+    _assert_same_records(sharded, reference)
+
+
+def test_sealed_shards_read_the_same(sharded, reference, logger):
+    migrator = ShardMigrator(sharded, sharded.shards, logger)
+    migrator.sync(SYNC_DAY)
+    # Sealing leaves WAL mode, so it runs before anything reads the shard, as the seal command does
+    assert migrator.seal(date(2024, 6, 1)) == []
+    assert migrator.seal(date(2025, 6, 1)) == ['2023']
+    _assert_same_records(sharded, reference)
+    # The second read is answered from the sealed shard's cached results
+    _assert_same_records(sharded, reference)
+
+
+def test_pending_rows_are_read_once(sharded, reference, logger, workdir):
+    migrator = ShardMigrator(sharded, sharded.shards, logger)
+    migrator.sync(SYNC_DAY)
+    day = DateManager.to_day_number(date(2023, 12, 24))
+    with closing(sqlite3.connect(workdir / 'shards' / 'records_2023.db')) as conn:
+        stored = [row_id for (row_id,) in conn.execute("SELECT id FROM records WHERE service_day = ? LIMIT 3", (day,))]
+
+    # A late upload repeats rows the shard holds and adds new ones for the same closed period
+    _insert(sharded.db_path, [(row_id, day) for row_id in stored] + [(100000, day), (100001, day)])
+    _insert(reference.db_path, [(100000, day), (100001, day)])
+    _assert_same_records(sharded, reference)
+
+    # The next sync moves only the new rows
+    assert migrator.sync(SYNC_DAY) == 2
+    _assert_same_records(sharded, reference)
+
+
+def test_rollups_move_with_their_period(sharded, reference, logger, workdir):
+    RetentionCompactor(sharded, logger, workdir / 'archive').run(date(2023, 12, 15))
+    ShardMigrator(sharded, sharded.shards, logger).sync(SYNC_DAY)
+
+    with sharded.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM record_rollups").fetchone()[0] == 0
+    # Folded rows keep only their counts, not their ids
+    _assert_same_records(sharded, reference, same_ids=False)
@@ -0,0 +1,50 @@
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+import shared_frame
+from shared_frame import SharedFrame, SharedFrameHandle
+from worker_pool import report_pool
+
+
+def _resident_bytes() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _touch_batch(handle: SharedFrameHandle) -> int:
+    """Worker: read every shared page of the batch as a week task would, then report RSS"""
+    df = handle.attach()
+    total = int(df['values'].sum())
+    del df
+    handle.detach()
+    assert total >= 0 and not shared_frame._attached_segments
+    return _resident_bytes()
+
+
+def test_round_trip():
+    df = pd.DataFrame({
+        'day': np.arange(5, dtype=np.int32),
+        'date_of_service': pd.date_range('2024-01-01', periods=5),
+        'division': ['Memphis', 'Nashville', None, 'Memphis', 'Memphis'],
+        'origin': pd.Categorical(['A', 'B', 'A', 'C', 'B'])
+    })
+    with SharedFrame(df) as shared:
+        attached = shared.handle.attach(categorical=False)
+        pd.testing.assert_frame_equal(attached, df.astype({'origin': object}), check_dtype=False)
+        assert attached['division'].isna().tolist() == [False, False, True, False, False]
+        del attached
+        shared.handle.detach()
+
+
+@pytest.mark.skipif(not Path('/proc/self/statm').exists(), reason="needs /proc to read resident memory")
+def test_worker_memory_is_flat_across_batches():
+    batch_bytes = 64 * 1024 * 1024
+    resident = []
+    with report_pool(1) as pool:
+        for _ in range(5):
+            with SharedFrame(pd.DataFrame({'values': np.ones(batch_bytes // 8, dtype=np.int64)})) as shared:
+                resident.append(pool.submit(_touch_batch, shared.handle).result())
+    # A worker still mapping earlier batches would grow by a whole batch each time
+    assert max(resident) - resident[0] < batch_bytes // 2
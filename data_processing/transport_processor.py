@@ -1,23 +1,30 @@
+import pandas as pd
 from database import DatabaseManager
-from date_utils import DateManager
+from date_utils import DateLike, DateManager
 from config import Config
+from planner import LoadPlanner
+from data_quality import screen_records
 
 class TransportDataProcessor:
-    def __init__(self):
+    def __init__(self, logger=None):
         self.db_manager = DatabaseManager()
+        self.planner = LoadPlanner(self.db_manager, logger)
         self.current_week_data = None
         self.previous_week_data = None
         
     def load_data(self, start_date: str, end_date: str):
-        """Load data for current and previous weeks."""
+        """Load data for current and previous weeks, each the cheapest way for its size."""
         date_ranges = DateManager.get_date_ranges(start_date, end_date)
+        plans = self.planner.plan(date_ranges)
         
-        self.current_week_data = self.db_manager.fetch_data_for_period(
-            *date_ranges['current']
-        )
-        self.previous_week_data = self.db_manager.fetch_data_for_period(
-            *date_ranges['previous']
-        )
+        # Screen once here so no generator has to clean the data again
+        self.current_week_data = screen_records(self.planner.execute(plans['current']))
+        self.previous_week_data = screen_records(self.planner.execute(plans['previous']))
+    
+    def load_period(self, start_date: DateLike, end_date: DateLike) -> pd.DataFrame:
+        """Load and screen one arbitrary date range, e.g. several weeks at once."""
+        plan = self.planner.plan({'period': (DateManager.to_date(start_date), DateManager.to_date(end_date))})
+        return screen_records(self.planner.execute(plan['period']))
     
     def get_basic_summary(self) -> dict:
         """Generate basic summary of loaded data."""
@@ -0,0 +1,26 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+from config import Config
+from metrics import metrics
+from profiling import stop_inherited_profiling
+
+
+def _init_worker(settings: Dict[str, Any]) -> None:
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    metrics.clear()
+    stop_inherited_profiling()
+
+
+def report_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Return a process pool whose workers start from the parent's Config, with no pending metrics or profiler.
+
+    Workers started with spawn or forkserver import config afresh and would
+    lose settings the parent changed at runtime (--output-dir, a graph
+    backend, a test database). Forked workers keep them, but also inherit
+    the parent's pending metrics and would flush them a second time, and
+    the parent's profiler, whose results they would never save.
+    """
+    settings = {name: value for name, value in vars(Config).items() if name.isupper()}
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(settings,))
@@ -1,13 +1,15 @@
+use std::collections::{BTreeSet, HashMap};
 use std::path::Path;
+use chrono::NaiveDate;
 use sqlx::SqlitePool;
-use crate::database::insert_row;
+use crate::database::{insert_row, resolve_origin_id, retention_horizon};
 use crate::errors::{AppError};
 use crate::models::{CSVRecord, DatabaseRow};
 use csv::Reader;
 use tokio::fs::File;
 use tokio::io::AsyncReadExt;
 
-pub async fn process_csv(file_path: &Path, db_pool: &SqlitePool) -> Result<(usize, usize), AppError> {
+pub async fn process_csv(file_path: &Path, db_pool: &SqlitePool) -> Result<(usize, usize, usize, BTreeSet<NaiveDate>), AppError> {
     // Read the file
     let mut file = File::open(file_path).await?;
     let mut contents = Vec::new();
@@ -17,15 +19,44 @@ pub async fn process_csv(file_path: &Path, db_pool: &SqlitePool) -> Result<(usiz
     let mut rdr = Reader::from_reader(contents.as_slice());
     let mut inserted_count = 0;
     let mut skipped_count = 0;
+    // Rows folded into rollups left no id behind to collide with, so their days take no uploads;
+    // data_processing/ingest.py checks such rows against the archived ids instead
+    let horizon = retention_horizon(db_pool).await;
+    let mut archived_count = 0;
+    let mut touched_dates = BTreeSet::new();
+    // An upload repeats a few dozen origins, so resolve each spelling once
+    let mut origin_ids: HashMap<String, i64> = HashMap::new();
 
     for (index, result) in rdr.deserialize::<CSVRecord>().enumerate() {
         match result {
             Ok(record) => {
+                let date_of_service = record.date_of_service.map(|dt| dt.date());
                 let db_row: DatabaseRow = record.into();
 
+                if let (Some(horizon), Some(service_day)) = (horizon, db_row.service_day) {
+                    if service_day <= horizon {
+                        archived_count += 1;
+                        continue;
+                    }
+                }
+
+                let origin_id = match origin_ids.get(&db_row.origin) {
+                    Some(&origin_id) => origin_id,
+                    None => {
+                        let origin_id = resolve_origin_id(db_pool, &db_row.origin).await?;
+                        origin_ids.insert(db_row.origin.clone(), origin_id);
+                        origin_id
+                    },
+                };
+
                 // Insert into database
-                match insert_row(db_pool, db_row).await {
-                    Ok(_) => inserted_count += 1,
+                match insert_row(db_pool, db_row, origin_id).await {
+                    Ok(_) => {
+                        inserted_count += 1;
+                        if let Some(date_of_service) = date_of_service {
+                            touched_dates.insert(date_of_service);
+                        }
+                    },
                     Err(AppError::DatabaseError(e)) => {
                         if let Some(sqlx_error) = e.downcast_ref::<sqlx::Error>() {
                             if let sqlx::Error::Database(db_err) = sqlx_error {
@@ -65,5 +96,5 @@ pub async fn process_csv(file_path: &Path, db_pool: &SqlitePool) -> Result<(usiz
         }
     }
 
-    Ok((inserted_count, skipped_count))
+    Ok((inserted_count, skipped_count, archived_count, touched_dates))
 }
\ No newline at end of file
@@ -15,20 +15,131 @@ pub(crate) async fn migrate(pool: &Pool<Sqlite>) -> Result<(),  Box<dyn std::err
             weekday text,
             hour integer,
             origin text,
-            response_time integer)").execute(pool).await?;
+            response_time integer,
+            service_day integer,
+            origin_id integer)").execute(pool).await?;
+
+    // Databases created before service_day existed; the error for an existing column is expected
+    let _ = sqlx::query("ALTER TABLE records ADD COLUMN service_day integer").execute(pool).await;
+
+    // Parse the MM/DD/YY text dates once and store them as day numbers (days since 1970-01-01)
+    let _ = sqlx::query(
+        "
+        UPDATE records
+        SET service_day = CAST(julianday(
+            '20' || substr(date_of_service, 7, 2) || '-' ||
+            substr(date_of_service, 1, 2) || '-' ||
+            substr(date_of_service, 4, 2)) - 2440587.5 AS INTEGER)
+        WHERE service_day IS NULL").execute(pool).await?;
+
+    let _ = sqlx::query(
+        "CREATE INDEX IF NOT EXISTS idx_records_service_day ON records (service_day)"
+    ).execute(pool).await?;
+
+    // Origins are stored once with a normalized name; every raw spelling seen is kept as an alias
+    let _ = sqlx::query(
+        "
+        CREATE TABLE IF NOT EXISTS origins (
+            id integer primary key,
+            name text not null unique)").execute(pool).await?;
+
+    let _ = sqlx::query(
+        "
+        CREATE TABLE IF NOT EXISTS origin_aliases (
+            alias text primary key,
+            origin_id integer not null references origins (id))").execute(pool).await?;
+
+    let _ = sqlx::query("ALTER TABLE records ADD COLUMN origin_id integer").execute(pool).await;
+
+    // Old rows are folded into daily counts by data_processing/retention.py, which owns the rest of its schema
+    let _ = sqlx::query(
+        "
+        CREATE TABLE IF NOT EXISTS record_rollups (
+            id integer primary key,
+            service_day integer,
+            group_id integer,
+            hour integer,
+            origin_id integer,
+            records integer not null)").execute(pool).await?;
+
+    // Give rows written before origin ids existed their id; the origin text stays for scripts/ that read it
+    let raw_origins: Vec<(String,)> = sqlx::query_as(
+        "SELECT DISTINCT origin FROM records WHERE origin_id IS NULL AND origin IS NOT NULL"
+    ).fetch_all(pool).await?;
+
+    for (raw_origin,) in raw_origins {
+        let origin_id = resolve_origin_id(pool, &raw_origin).await?;
+        let _ = sqlx::query(
+            "UPDATE records SET origin_id = $1 WHERE origin = $2 AND origin_id IS NULL"
+        )
+            .bind(origin_id)
+            .bind(&raw_origin)
+            .execute(pool)
+            .await?;
+    }
 
     Ok(())
 }
 
-pub(crate) async fn insert_row(pool: &Pool<Sqlite>, row: DatabaseRow) -> Result<(), AppError> {
+/// Canonical spelling of an origin: trimmed, single-spaced and upper case.
+pub(crate) fn normalize_origin(name: &str) -> String {
+    name.split_whitespace().collect::<Vec<_>>().join(" ").to_uppercase()
+}
+
+/// Return the id for a raw origin name, registering the origin and alias the first time it is seen.
+pub(crate) async fn resolve_origin_id(pool: &Pool<Sqlite>, raw_name: &str) -> Result<i64, AppError> {
+    let known: Option<(i64,)> = sqlx::query_as("SELECT origin_id FROM origin_aliases WHERE alias = $1")
+        .bind(raw_name)
+        .fetch_optional(pool)
+        .await
+        .map_err(|e| AppError::DatabaseError(Box::new(e)))?;
+
+    if let Some((origin_id,)) = known {
+        return Ok(origin_id);
+    }
+
+    let name = normalize_origin(raw_name);
+    let _ = sqlx::query("INSERT OR IGNORE INTO origins (name) VALUES ($1)")
+        .bind(&name)
+        .execute(pool)
+        .await
+        .map_err(|e| AppError::DatabaseError(Box::new(e)))?;
+
+    let (origin_id,): (i64,) = sqlx::query_as("SELECT id FROM origins WHERE name = $1")
+        .bind(&name)
+        .fetch_one(pool)
+        .await
+        .map_err(|e| AppError::DatabaseError(Box::new(e)))?;
+
+    let _ = sqlx::query("INSERT OR IGNORE INTO origin_aliases (alias, origin_id) VALUES ($1, $2)")
+        .bind(raw_name)
+        .bind(origin_id)
+        .execute(pool)
+        .await
+        .map_err(|e| AppError::DatabaseError(Box::new(e)))?;
+
+    Ok(origin_id)
+}
+
+// Last day folded into rollups by retention.py; None until the database is compacted
+pub(crate) async fn retention_horizon(pool: &Pool<Sqlite>) -> Option<i64> {
+    sqlx::query_scalar::<_, Option<i64>>("SELECT MAX(horizon_day) FROM retention")
+        .fetch_one(pool)
+        .await
+        .ok()
+        .flatten()
+}
+
+pub(crate) async fn insert_row(pool: &Pool<Sqlite>, row: DatabaseRow, origin_id: i64) -> Result<(), AppError> {
+    // Reports group on origin_id; the raw origin text is still written for readers of records.origin
     let _ = sqlx::query(
         r#"
         INSERT INTO records (
             id, date_of_service, division, priority, category, 
-            level, weekday, hour, origin,
-            response_time
+            level, weekday, hour, origin, origin_id,
+            response_time, service_day
         )
-        VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
+        VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11,$12)
         "#)
         .bind(row.id)
         .bind(row.date_of_service)
@@ -39,7 +150,9 @@ pub(crate) async fn insert_row(pool: &Pool<Sqlite>, row: DatabaseRow) -> Result<
         .bind(row.weekday)
         .bind(row.hour)
         .bind(row.origin)
+        .bind(origin_id)
         .bind(row.response_time)
+        .bind(row.service_day)
     
     .execute(pool)
     .await;
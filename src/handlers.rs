@@ -8,9 +8,9 @@ use tokio::fs::File;
 use tokio::io::AsyncWriteExt;
 use std::path::Path;
 use minijinja::context;
-use crate::{csv_processor::process_csv, errors::AppError, latex_generator::{generate_latex_files, render_pdfs}, AppState, StateType};
+use crate::{csv_processor::process_csv, errors::AppError, job_queue::{JobId, JobStatus}, AppState, StateType};
 use sqlx::Row;
-use crate::python_runner::run_python_script;
+use crate::python_runner::{mark_ingest, metrics_text, spawn_precompute};
 use tokio_util::io::ReaderStream;
 
 
@@ -38,10 +38,24 @@ pub(crate) async fn upload_handler(
                                 match file.write_all(&data).await {
                                     Ok(_) => {
                                         match process_csv(&file_path, &state.db_pool).await {
-                                            Ok((inserted, skipped)) => return Html(format!(
-                                                "File '{}' uploaded and processed successfully. {} records inserted, {} duplicate records skipped.",
-                                                file_name, inserted, skipped
-                                            )),
+                                            Ok((inserted, skipped, archived, touched_dates)) => {
+                                                // Cached reports are stale now; rebuild the touched weeks in the background
+                                                if let Err(e) = mark_ingest().and_then(|_| spawn_precompute(&touched_dates)) {
+                                                    println!("Could not start report precompute: {}", e);
+                                                }
+                                                let archived_note = if archived > 0 {
+                                                    format!(
+                                                        " {} records dated on or before the retention horizon skipped; load them with data_processing/ingest.py.",
+                                                        archived
+                                                    )
+                                                } else {
+                                                    String::new()
+                                                };
+                                                return Html(format!(
+                                                "File '{}' uploaded and processed successfully. {} records inserted, {} duplicate records skipped.{}",
+                                                file_name, inserted, skipped, archived_note
+                                                ))
+                                            },
                                             Err(e) => return Html(format!("Error processing CSV file: {}", e)),
                                         }
                                     },
@@ -65,7 +79,10 @@ pub(crate) async fn upload_handler(
 
 
 pub(crate) async fn get_row_count(State(state): StateType) -> Json<u64> {
-    let count = sqlx::query("SELECT COUNT(*) FROM records")
+    // Rows folded into rollups still count as records
+    let count = sqlx::query(
+        "SELECT (SELECT COUNT(*) FROM records) + (SELECT COALESCE(SUM(records), 0) FROM record_rollups)"
+    )
         .fetch_one(&state.db_pool)
         .await
         .map(|row| row.get(0))
@@ -89,6 +106,15 @@ pub async fn download_handler(axPath(filename): axPath<String>) -> Result<Respon
     Ok(response)
 }
 
+pub async fn metrics_handler() -> Result<Response<Body>, AppError> {
+    let response = Response::builder()
+        .header("content-type", "text/plain; version=0.0.4")
+        .body(Body::from(metrics_text()))
+        .map_err(|e| AppError::InternalServerError(Box::new(e)))?;
+
+    Ok(response)
+}
+
 #[derive(Deserialize, Debug)]
 pub struct ReportParams {
     start_date: String,
@@ -101,7 +127,7 @@ pub struct ReportResponse {
 }
 
 pub async fn generate_report_handler(
-    State(_state): State<Arc<AppState>>,
+    State(state): State<Arc<AppState>>,
     Form(params): Form<ReportParams>,
 ) -> Result<impl IntoResponse, AppError> {
     let start_date = NaiveDate::parse_from_str(&params.start_date, "%Y-%m-%d")
@@ -110,22 +136,51 @@ pub async fn generate_report_handler(
     let end_date = NaiveDate::parse_from_str(&params.end_date, "%Y-%m-%d")
         .map_err(|e| AppError::InputError(Box::new(e)))?;
 
-    let json_file = run_python_script(&start_date, &end_date)?;
-
-    let latex_files = generate_latex_files(&json_file, "templates/report_template.tex", "output")?;
+    let job_id = state.jobs.submit(start_date, end_date);
 
-    let pdf_files = render_pdfs(&latex_files, &start_date, &end_date)?;
+    Ok(Html(job_status_html(&state, job_id)))
+}
 
-    let download_links = pdf_files.iter().map(|file| {
-        let filename = std::path::Path::new(file)
-            .file_name()
-            .and_then(|s| s.to_str())
-            .unwrap_or("unknown.pdf");
-        format!(r#"<li><a href="/download/{}">{}</a></li>"#, filename, filename)
-    }).collect::<String>();
+pub async fn job_status_handler(
+    State(state): State<Arc<AppState>>,
+    axPath(job_id): axPath<JobId>,
+) -> Html<String> {
+    Html(job_status_html(&state, job_id))
+}
 
-    let html_response = format!(
+fn job_status_html(state: &AppState, job_id: JobId) -> String {
+    let poll = |message: String| format!(
         r#"
+        <div class="report-job" hx-get="/jobs/{}" hx-trigger="load delay:2s" hx-swap="outerHTML">
+            <p>{}</p>
+        </div>
+        "#,
+        job_id, message
+    );
+
+    match state.jobs.status(job_id) {
+        None => format!(r#"<div id="result"><p>Unknown report job {}.</p></div>"#, job_id),
+        Some((JobStatus::Queued, position)) => poll(format!(
+            "Report job {} is queued (position {}).",
+            job_id,
+            position.map_or("?".to_string(), |p| p.to_string())
+        )),
+        Some((JobStatus::Running, _)) => poll(format!("Report job {} is running...", job_id)),
+        Some((JobStatus::Failed(error), _)) => format!(
+            r#"<div id="result"><p>Report job {} failed: {}</p></div>"#,
+            job_id, error
+        ),
+        Some((JobStatus::Completed(pdf_files), _)) => {
+            let download_links = pdf_files.iter().map(|file| {
+                let filename = std::path::Path::new(file)
+                    .file_name()
+                    .and_then(|s| s.to_str())
+                    .unwrap_or("unknown.pdf");
+                format!(r#"<li><a href="/download/{}">{}</a></li>"#, filename, filename)
+            }).collect::<String>();
+
+            format!(
+                r#"
         <div id="result">
             <p>Report generated successfully!</p>
             <p>PDF files generated for {} divisions.</p>
@@ -134,9 +189,9 @@ pub async fn generate_report_handler(
             </ul>
         </div>
         "#,
-        pdf_files.len(),
-        download_links
-    );
-
-    Ok(Html(html_response))
-}
\ No newline at end of file
+                pdf_files.len(),
+                download_links
+            )
+        },
+    }
+}
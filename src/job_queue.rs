@@ -0,0 +1,157 @@
+use std::collections::{HashMap, VecDeque};
+use std::sync::{Arc, Mutex};
+use std::time::{Duration, Instant};
+use chrono::NaiveDate;
+use tokio::sync::Semaphore;
+use crate::latex_generator::{compile_pdf, load_template, publish_division_pdf, render_division_latex};
+use crate::python_runner::{publish_report, stream_python_script};
+use crate::workspace::{cleanup_stale_workspaces, create_workspace};
+
+pub type JobId = u64;
+type JobKey = (NaiveDate, NaiveDate);
+
+const REPORT_TEMPLATE: &str = "templates/report_template.tex";
+
+// Finished jobs stay pollable for this long before they are pruned
+const FINISHED_JOB_RETENTION: Duration = Duration::from_secs(60 * 60);
+
+#[derive(Debug, Clone)]
+pub enum JobStatus {
+    Queued,
+    Running,
+    Completed(Vec<String>),
+    Failed(String),
+}
+
+struct JobEntry {
+    key: JobKey,
+    status: JobStatus,
+    finished_at: Option<Instant>,
+}
+
+#[derive(Default)]
+struct QueueState {
+    next_id: JobId,
+    jobs: HashMap<JobId, JobEntry>,
+    in_flight: HashMap<JobKey, JobId>,
+    waiting: VecDeque<JobId>,
+}
+
+pub struct JobQueue {
+    state: Mutex<QueueState>,
+    workers: Arc<Semaphore>,
+}
+
+/// Run the full report pipeline for one date range and return the published PDF paths.
+///
+/// Every intermediate file (JSON, graphs, .tex, PDFs) is written to a private
+/// workspace that is removed when the job ends, so jobs can run in parallel.
+/// Divisions are streamed from Python, and each one starts compiling as soon
+/// as it is rendered instead of waiting for the whole report.
+fn run_report_pipeline(start_date: &NaiveDate, end_date: &NaiveDate) -> Result<Vec<String>, String> {
+    cleanup_stale_workspaces();
+    let workspace = create_workspace().map_err(|e| e.to_string())?;
+    let template = load_template(REPORT_TEMPLATE).map_err(|e| e.to_string())?;
+
+    std::thread::scope(|scope| {
+        let mut compiling = Vec::new();
+
+        stream_python_script(start_date, end_date, workspace.path(), |division, division_data, graphics_dir| {
+            let latex_file = render_division_latex(&template, division, division_data, graphics_dir, workspace.path())?;
+            compiling.push((division.to_string(), scope.spawn(move || compile_pdf(&latex_file))));
+            Ok(())
+        }).map_err(|e| e.to_string())?;
+
+        let mut pdf_files = Vec::new();
+        for (division, handle) in compiling {
+            let pdf_file = handle.join()
+                .unwrap_or_else(|_| Err("PDF compilation panicked".to_string()))?;
+            pdf_files.push(publish_division_pdf(&division, &pdf_file, start_date, end_date).map_err(|e| e.to_string())?);
+        }
+
+        // Later requests for the range replay this run instead of recomputing it
+        if let Err(e) = publish_report(workspace.path(), start_date, end_date) {
+            println!("Could not cache the report for {} to {}: {}", start_date, end_date, e);
+        }
+        Ok(pdf_files)
+    })
+}
+
+impl JobQueue {
+    pub fn new(max_workers: usize) -> Arc<Self> {
+        Arc::new(JobQueue {
+            state: Mutex::new(QueueState::default()),
+            workers: Arc::new(Semaphore::new(max_workers.max(1))),
+        })
+    }
+
+    /// Queue a report for the range, or join the identical job already in flight.
+    pub fn submit(self: &Arc<Self>, start_date: NaiveDate, end_date: NaiveDate) -> JobId {
+        let key = (start_date, end_date);
+        let mut state = self.state.lock().unwrap();
+
+        if let Some(&job_id) = state.in_flight.get(&key) {
+            println!("Coalescing report request {} to {} into job {}", start_date, end_date, job_id);
+            return job_id;
+        }
+
+        let now = Instant::now();
+        state.jobs.retain(|_, job| {
+            job.finished_at.map_or(true, |finished| now.duration_since(finished) < FINISHED_JOB_RETENTION)
+        });
+
+        state.next_id += 1;
+        let job_id = state.next_id;
+        state.jobs.insert(job_id, JobEntry { key, status: JobStatus::Queued, finished_at: None });
+        state.in_flight.insert(key, job_id);
+        state.waiting.push_back(job_id);
+        drop(state);
+
+        let queue = Arc::clone(self);
+        tokio::spawn(async move {
+            let _permit = queue.workers.clone().acquire_owned().await.unwrap();
+            queue.set_status(job_id, JobStatus::Running);
+
+            let result = tokio::task::spawn_blocking(move || run_report_pipeline(&start_date, &end_date))
+                .await
+                .unwrap_or_else(|e| Err(format!("Report job panicked: {}", e)));
+
+            queue.set_status(job_id, match result {
+                Ok(pdf_files) => JobStatus::Completed(pdf_files),
+                Err(e) => JobStatus::Failed(e),
+            });
+        });
+
+        job_id
+    }
+
+    fn set_status(&self, job_id: JobId, status: JobStatus) {
+        let mut state = self.state.lock().unwrap();
+        state.waiting.retain(|&id| id != job_id);
+
+        let finished = matches!(status, JobStatus::Completed(_) | JobStatus::Failed(_));
+        let key = match state.jobs.get_mut(&job_id) {
+            Some(job) => {
+                job.status = status;
+                if finished {
+                    job.finished_at = Some(Instant::now());
+                }
+                job.key
+            },
+            None => return,
+        };
+
+        // Later requests for the same range start a fresh computation
+        if finished && state.in_flight.get(&key) == Some(&job_id) {
+            state.in_flight.remove(&key);
+        }
+    }
+
+    /// Return the job status and, while it is waiting, its 1-based queue position.
+    pub fn status(&self, job_id: JobId) -> Option<(JobStatus, Option<usize>)> {
+        let state = self.state.lock().unwrap();
+        let job = state.jobs.get(&job_id)?;
+        let position = state.waiting.iter().position(|&id| id == job_id).map(|p| p + 1);
+        Some((job.status.clone(), position))
+    }
+}
@@ -1,122 +1,173 @@
 use chrono::NaiveDate;
 use minijinja::Environment;
 use serde_json::Value;
-use std::{fs, path::Path};
+use sha2::{Digest, Sha256};
+use std::{fs, path::{Path, PathBuf}};
 use crate::errors::AppError;
+use crate::workspace::{latex_path, publish};
 use std::process::Command;
 
+// PDFs keyed by the hash of their .tex and images, shared by every job
+const PDF_CACHE_DIR: &str = "pdf_cache";
+// Tectonic's downloaded support bundle, shared so each run does not refetch it
+const TECTONIC_CACHE_DIR: &str = "tectonic_cache";
 
-pub fn generate_latex_files(json_file_name: &str, template_path: &str, output_dir: &str) -> Result<Vec<String>, AppError> {
-    println!("Starting LaTeX generation process");
-    let json_file_path = Path::new("tmp_output").join(json_file_name);
 
-    println!("JSON file path: {:?}", json_file_path);
+/// Read the report template once so every division of a job can be rendered from it.
+pub fn load_template(template_path: &str) -> Result<String, AppError> {
     println!("Template path: {}", template_path);
-    println!("Output directory: {}", output_dir);
-
-    // Read the JSON file
-    let json_content = fs::read_to_string(json_file_path)
-        .map_err(|e| {
-            println!("Error reading JSON file: {:?}", e);
-            AppError::IoError(Box::new(e))
-        })?;
-    println!("JSON file read successfully");
-
-    let data: Value = serde_json::from_str(&json_content)
-        .map_err(|e| {
-            println!("Error parsing JSON: {:?}", e);
-            AppError::JsonError(Box::new(e))
-        })?;
-    println!("JSON parsed successfully");
-
-    // Read the LaTeX template
-    let template_content = fs::read_to_string(template_path)
+    fs::read_to_string(template_path)
         .map_err(|e| {
             println!("Error reading template file: {:?}", e);
             AppError::IoError(Box::new(e))
-        })?;
-    println!("LaTeX template read successfully");
+        })
+}
+
+/// Render one division's report into `{division}_output.tex` in the output directory.
+///
+/// Called as soon as the division arrives from the Python stream, so its PDF
+/// can start compiling while later divisions are still being aggregated.
+pub fn render_division_latex(
+    template_content: &str,
+    division: &str,
+    division_data: &Value,
+    graphics_dir: &Path,
+    output_dir: &Path,
+) -> Result<PathBuf, AppError> {
+    println!("Generating LaTeX for division: {}", division);
+
+    // Graphs live in the job workspace, or in tmp_output for cached reports
+    let graphics_dir = latex_path(graphics_dir)?;
 
-    // Create a new MiniJinja environment and add the template
     let mut env = Environment::new();
-    env.add_template("template", &template_content)
+    env.add_template("template", template_content)
         .map_err(|e| {
             println!("Error adding template to MiniJinja environment: {:?}", e);
             AppError::TemplateError(Box::new(e))
         })?;
-    println!("Template added to MiniJinja environment");
 
-    // Get the template
     let template = env.get_template("template")
         .map_err(|e| {
             println!("Error getting template from MiniJinja environment: {:?}", e);
             AppError::TemplateError(Box::new(e))
         })?;
-    println!("Template retrieved from MiniJinja environment");
-
-    let mut generated_files = Vec::new();
-
-    // Iterate over each division and generate a separate file
-    for (division, division_data) in data.as_object().unwrap() {
-        println!("Generating LaTeX for division: {}", division);
-        let rendered = template.render(minijinja::context! {
-            division => division,
-            division_data => division_data
-        }).map_err(|e| {
-            println!("Error rendering template for division {}: {:?}", division, e);
-            AppError::TemplateError(Box::new(e))
+
+    let rendered = template.render(minijinja::context! {
+        division => division,
+        division_data => division_data,
+        graphics_dir => graphics_dir
+    }).map_err(|e| {
+        println!("Error rendering template for division {}: {:?}", division, e);
+        AppError::TemplateError(Box::new(e))
+    })?;
+
+    // Write the rendered LaTeX to a file named after the division
+    let filename = output_dir.join(format!("{}_output.tex", division));
+    fs::write(&filename, rendered)
+        .map_err(|e| {
+            println!("Error writing LaTeX file for division {}: {:?}", division, e);
+            AppError::IoError(Box::new(e))
         })?;
 
-        // Write the rendered LaTeX to a file named after the division
-        let filename = format!("{}/{}_output.tex", output_dir, division);
-        fs::write(&filename, rendered)
-            .map_err(|e| {
-                println!("Error writing LaTeX file for division {}: {:?}", division, e);
-                AppError::IoError(Box::new(e))
-            })?;
-        
-        generated_files.push(filename.clone());
-        println!("LaTeX file generated for division {}: {}", division, filename);
+    println!("LaTeX file generated for division {}: {}", division, filename.display());
+    Ok(filename)
+}
+
+/// Paths of every file pulled in with \includegraphics, resolved against the .tex directory.
+fn referenced_images(latex: &str, base_dir: &Path) -> Vec<PathBuf> {
+    let mut images = Vec::new();
+    let mut rest = latex;
+
+    while let Some(start) = rest.find("\\includegraphics") {
+        rest = &rest[start + "\\includegraphics".len()..];
+        let (open, close) = match (rest.find('{'), rest.find('}')) {
+            (Some(open), Some(close)) if open < close => (open, close),
+            _ => break,
+        };
+        let path = Path::new(rest[open + 1..close].trim());
+        images.push(if path.is_absolute() { path.to_path_buf() } else { base_dir.join(path) });
+        rest = &rest[close + 1..];
     }
 
-    println!("LaTeX generation process completed successfully");
-    Ok(generated_files)
+    images
 }
 
-pub fn render_pdfs(latex_files: &[String], start_date: &NaiveDate, end_date: &NaiveDate) -> Result<Vec<String>, AppError> {
-    let mut pdf_files = Vec::new();
-
-    for latex_file in latex_files {
-        let division = Path::new(latex_file)
-            .file_stem()
-            .and_then(|s| s.to_str())
-            .and_then(|s| s.strip_suffix("_output"))
-            .ok_or_else(|| AppError::InputError(Box::new(std::io::Error::new(
-                std::io::ErrorKind::InvalidInput,
-                format!("Invalid latex file name: {}", latex_file)
-            ))))?;
-
-        let output = Command::new("./tectonic")
-            .args(&["--outdir", "completed_reports", latex_file])
-            .output()
-            .map_err(|e| AppError::PdfGenerationError(Box::new(e)))?;
-
-        if !output.status.success() {
-            return Err(AppError::PdfGenerationError(Box::new(std::io::Error::new(
-                std::io::ErrorKind::Other,
-                format!("Tectonic failed: {}", String::from_utf8_lossy(&output.stderr))
-            ))));
+/// Hash of the rendered LaTeX plus every image it references; equal hashes give identical PDFs.
+fn content_hash(latex_file: &Path) -> Result<String, std::io::Error> {
+    let latex = fs::read_to_string(latex_file)?;
+    let base_dir = latex_file.parent().unwrap_or(Path::new("."));
+    let images = referenced_images(&latex, base_dir);
+
+    // Image directories differ per job workspace, so leave them out of the hash
+    let mut normalized = latex.clone();
+    for image in &images {
+        if let Some(dir) = image.parent() {
+            normalized = normalized.replace(dir.to_string_lossy().as_ref(), "");
         }
+    }
+
+    let mut hasher = Sha256::new();
+    hasher.update(normalized.as_bytes());
+    // A missing image must not hash like a report without one and pick up its cached PDF
+    for image in &images {
+        let bytes = fs::read(image)
+            .map_err(|e| std::io::Error::new(e.kind(), format!("{}: {}", image.display(), e)))?;
+        hasher.update(&bytes);
+    }
+
+    Ok(format!("{:x}", hasher.finalize()))
+}
+
+/// Produce the PDF for one .tex file next to it, reusing a cached PDF when the inputs are unchanged.
+pub fn compile_pdf(latex_file: &Path) -> Result<PathBuf, String> {
+    let workspace = latex_file.parent().unwrap_or(Path::new("."));
+    let pdf_file = latex_file.with_extension("pdf");
+
+    let hash = content_hash(latex_file).map_err(|e| format!("Could not hash {:?}: {}", latex_file, e))?;
+    let cached_pdf = Path::new(PDF_CACHE_DIR).join(format!("{}.pdf", hash));
+
+    if cached_pdf.exists() {
+        println!("Reusing cached PDF for {:?}", latex_file);
+        fs::copy(&cached_pdf, &pdf_file).map_err(|e| e.to_string())?;
+        return Ok(pdf_file);
+    }
 
-        let old_pdf_name = format!("completed_reports/{}_output.pdf", division);
-        let new_pdf_name = format!("completed_reports/{}_{:?}_{:?}.pdf", 
-            division, start_date, end_date);
+    fs::create_dir_all(TECTONIC_CACHE_DIR).map_err(|e| e.to_string())?;
 
-        fs::rename(&old_pdf_name, &new_pdf_name)
-            .map_err(|e| AppError::IoError(Box::new(e)))?;
+    // Compile inside the job workspace, next to the .tex file; the bundle cache is shared across runs
+    let output = Command::new("./tectonic")
+        .env("TECTONIC_CACHE_DIR", TECTONIC_CACHE_DIR)
+        .arg("--outdir")
+        .arg(workspace)
+        .arg(latex_file)
+        .output()
+        .map_err(|e| format!("Failed to start tectonic: {}", e))?;
 
-        pdf_files.push(new_pdf_name);
+    if !output.status.success() {
+        return Err(format!("Tectonic failed: {}", String::from_utf8_lossy(&output.stderr)));
     }
 
-    Ok(pdf_files)
-}
\ No newline at end of file
+    // A failed cache write only costs a recompile next time. Each job stages under its own
+    // temporary name, so two jobs caching the same content never rename a half-written copy
+    if fs::create_dir_all(PDF_CACHE_DIR).is_ok() {
+        if let Ok(mut staging) = tempfile::Builder::new().suffix(".partial").tempfile_in(PDF_CACHE_DIR) {
+            let copied = fs::File::open(&pdf_file)
+                .and_then(|mut pdf| std::io::copy(&mut pdf, staging.as_file_mut()));
+            if copied.is_ok() {
+                let _ = staging.persist(&cached_pdf);
+            }
+        }
+    }
+
+    Ok(pdf_file)
+}
+
+/// Move a compiled division PDF to its public name in completed_reports and return that path.
+pub fn publish_division_pdf(division: &str, pdf_file: &Path, start_date: &NaiveDate, end_date: &NaiveDate) -> Result<String, AppError> {
+    let new_pdf_name = format!("completed_reports/{}_{:?}_{:?}.pdf", 
+        division, start_date, end_date);
+
+    publish(pdf_file, Path::new(&new_pdf_name))?;
+
+    Ok(new_pdf_name)
+}
@@ -6,23 +6,31 @@ mod types;
 mod errors;
 mod latex_generator;
 mod python_runner;
+mod job_queue;
+mod workspace;
 
 use axum::{
     extract::State,
     routing::{get, post}, Router,
 };
 use minijinja::Environment;
-use sqlx::sqlite::SqlitePool;
+use job_queue::JobQueue;
+use sqlx::sqlite::{SqliteConnectOptions, SqliteJournalMode, SqlitePool};
+use std::str::FromStr;
 use std::sync::Arc;
+use std::time::Duration;
 
 
 
 const DB_URL: &str = "sqlite:data.db";
+// Report pipelines that may run at once; override with REPORT_WORKERS
+const DEFAULT_REPORT_WORKERS: usize = 2;
 
 #[derive(Clone)]
 struct AppState{
     db_pool: SqlitePool,
-    jinja: Environment<'static>
+    jinja: Environment<'static>,
+    jobs: Arc<JobQueue>
 }
 
 type StateType = State<Arc<AppState>>;
@@ -31,14 +39,26 @@ type StateType = State<Arc<AppState>>;
 async fn main() {
 
 
-    let db_pool = SqlitePool::connect(DB_URL).await.unwrap();
+    // WAL lets the Python report readers run while uploads are being written
+    let connect_options = SqliteConnectOptions::from_str(DB_URL).unwrap()
+        .journal_mode(SqliteJournalMode::Wal)
+        .busy_timeout(Duration::from_secs(30));
+    let db_pool = SqlitePool::connect_with(connect_options).await.unwrap();
 
     database::migrate(&db_pool).await.unwrap();
     
     let mut jinja = Environment::new();
     jinja.add_template("index", include_str!("../templates/index.html")).unwrap();
 
-    let state = Arc::new(AppState{db_pool, jinja});
+    workspace::cleanup_stale_workspaces();
+
+    let report_workers = std::env::var("REPORT_WORKERS")
+        .ok()
+        .and_then(|v| v.parse().ok())
+        .unwrap_or(DEFAULT_REPORT_WORKERS);
+    let jobs = JobQueue::new(report_workers);
+
+    let state = Arc::new(AppState{db_pool, jinja, jobs});
 
 
     let app = Router::new()
@@ -46,6 +66,8 @@ async fn main() {
         .route("/upload", post(handlers::upload_handler))
         .route("/generate_report", post(handlers::generate_report_handler))
         .route("/row_count", get(handlers::get_row_count))
+        .route("/metrics", get(handlers::metrics_handler))
+        .route("/jobs/:job_id", get(handlers::job_status_handler))
         .route("/download/:filename", get(handlers::download_handler))
         .with_state(state);
     
@@ -1,5 +1,5 @@
 use serde::{Deserialize, Serialize};
-use chrono::{Datelike, NaiveDateTime, Timelike};
+use chrono::{Datelike, NaiveDate, NaiveDateTime, Timelike};
 
 use crate::types::*;
 
@@ -9,7 +9,7 @@ use crate::types::*;
 pub struct CSVRecord {
     #[serde(rename(deserialize = "Pickup Time"))]
     #[serde(with="parse_time")]
-    pub pickup_time: NaiveDateTime,
+    pub pickup_time: Option<NaiveDateTime>,
     #[serde(rename(deserialize = "Company Name"))]
     pub company_name: String,
     #[serde(rename(deserialize = "Division"))]
@@ -28,22 +28,22 @@ pub struct CSVRecord {
     pub confirmation_number: i32,
     #[serde(rename(deserialize = "Date of Service"))]
     #[serde(with="parse_time")]
-    pub date_of_service: NaiveDateTime,
+    pub date_of_service: Option<NaiveDateTime>,
     #[serde(rename(deserialize = "Enroute"))]
     #[serde(with="parse_time")]
-    pub enroute_time: NaiveDateTime,
+    pub enroute_time: Option<NaiveDateTime>,
     #[serde(rename(deserialize = "At Scene"))]
     #[serde(with="parse_time")]
-    pub at_scene_time: NaiveDateTime,
+    pub at_scene_time: Option<NaiveDateTime>,
     #[serde(rename(deserialize = "At Destination"))]
     #[serde(with="parse_time")]
-    pub at_destination_time: NaiveDateTime,
+    pub at_destination_time: Option<NaiveDateTime>,
     #[serde(rename(deserialize = "Assigned"))]
     #[serde(with="parse_time")]
-    pub assigned_time: NaiveDateTime,
+    pub assigned_time: Option<NaiveDateTime>,
     #[serde(rename(deserialize = "Complete"))]
     #[serde(with="parse_time")]
-    pub complete_time: NaiveDateTime,
+    pub complete_time: Option<NaiveDateTime>,
 }
 
 pub mod parse_time {
@@ -51,16 +51,16 @@ pub mod parse_time {
 	use chrono::naive::NaiveDateTime;
 
     pub fn serialize<S>(
-        dt: &NaiveDateTime,
+        dt: &Option<NaiveDateTime>,
         serializer: S,
     ) -> Result<S::Ok, S::Error>
     where
         S: Serializer,
     {
-        dt.format("%m/%d/%Y %I:%M:%S").to_string().serialize(serializer)
+        dt.map(|dt| dt.format("%m/%d/%Y %I:%M:%S").to_string()).serialize(serializer)
     }
 
-    pub fn deserialize<'de, D>(deserializer: D) -> Result<NaiveDateTime, D::Error>
+    pub fn deserialize<'de, D>(deserializer: D) -> Result<Option<NaiveDateTime>, D::Error>
 where
     D: Deserializer<'de>,
 {
@@ -68,14 +68,14 @@ where
     let trimmed = s.trim();
     
     if trimmed.is_empty() {
-        // Return a default value for empty input
-        return Ok(NaiveDateTime::from_timestamp(0, 0)); // Unix Epoch
+        // A blank field is a missing timestamp, not the Unix epoch
+        return Ok(None);
     }
 
     // Try parsing with different formats
     for format in &["%m/%d/%Y %H:%M:%S %p", "%Y-%m-%d %H:%M:%S", "%m/%d/%Y", "%D %I:%M:%S %p", "%D %r", "%m/%d/%Y %I:%M:%S %p"] {
         if let Ok(dt) = NaiveDateTime::parse_from_str(trimmed, format) {
-            return Ok(dt);
+            return Ok(Some(dt));
         }
     }
 
@@ -83,11 +83,6 @@ where
     Err(serde::de::Error::custom(format!("Invalid datetime: {}", trimmed)))
 }
 
-fn get_default_datetime() -> Result<NaiveDateTime, chrono::ParseError> {
-    // You can adjust this default value as needed
-    NaiveDateTime::parse_from_str("01/01/2030 00:00:00", "%m/%d/%Y %I:%M:%S")
-}
-
 }
 
 
@@ -96,15 +91,17 @@ fn get_default_datetime() -> Result<NaiveDateTime, chrono::ParseError> {
 #[derive(Debug, Deserialize, Serialize)]
 pub struct DatabaseRow {
     pub id: i32,
-    pub date_of_service: String,
+    // Missing timestamps are stored as NULL and flagged by the Python data-quality screen
+    pub date_of_service: Option<String>,
+    pub service_day: Option<i64>,
     pub division: Division,
     pub priority: Priority,
     pub category: CallCategory,
     pub level: CallLevel,
-    pub weekday: Day,
-    pub hour: u32,
+    pub weekday: Option<Day>,
+    pub hour: Option<u32>,
     pub origin: String,
-    pub response_time: i64,
+    pub response_time: Option<i64>,
 }
 
 
@@ -117,21 +114,30 @@ impl From<CSVRecord> for DatabaseRow{
             priority: Priority::from(value.priority_name.clone()),
             category: CallCategory::from(value.call_taker_status.clone()),
             level: CallLevel::from(value.trip_type_name.clone()),
-            weekday: value.date_of_service.weekday().into(),
-            hour: value.pickup_time.hour(),
+            weekday: value.date_of_service.map(|dt| dt.weekday().into()),
+            hour: value.pickup_time.map(|dt| dt.hour()),
             origin: value.origin_name.clone(),
             response_time: {
                 match CallCategory::from(value.call_taker_status.clone()) {
                     CallCategory::Ran => {
-                        (value.at_scene_time - value.assigned_time).num_minutes()
+                        // Only a call with both timestamps has a response time
+                        match (value.at_scene_time, value.assigned_time) {
+                            (Some(at_scene), Some(assigned)) => Some((at_scene - assigned).num_minutes()),
+                            _ => None,
+                        }
                     },
-                    CallCategory::Turned => 0,
-                    CallCategory::Cancelled => 0,
+                    CallCategory::Turned => Some(0),
+                    CallCategory::Cancelled => Some(0),
                 }
                 },
             date_of_service: {
-                value.date_of_service.format("%D").to_string()
-            },            
+                value.date_of_service.map(|dt| dt.format("%D").to_string())
+            },
+            service_day: {
+                // Days since 1970-01-01, so readers can range-scan without parsing text dates
+                let epoch = NaiveDate::from_ymd_opt(1970, 1, 1).unwrap();
+                value.date_of_service.map(|dt| dt.date().signed_duration_since(epoch).num_days())
+            },
         }
     }
 }
@@ -1,14 +1,214 @@
-use std::process::Command;
-use std::path::Path;
+use std::collections::BTreeSet;
+use std::fs;
+use std::io::{BufRead, BufReader, Read};
+use std::process::{Command, Stdio};
+use std::path::{Path, PathBuf};
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::thread;
 use chrono::NaiveDate;
+use serde_json::Value;
 use crate::errors::AppError;
+use crate::workspace::publish;
 
-pub fn run_python_script(start_date: &NaiveDate, end_date: &NaiveDate) -> Result<String, AppError> {
+const OUTPUT_DIR: &str = "tmp_output";
+const INGEST_STAMP: &str = "tmp_output/last_ingest";
+// Key of the report JSON holding the ingest stamp its data was loaded under (data_processing/main.py)
+const INGEST_STAMP_KEY: &str = "_ingest_stamp";
+// Set to 1 to profile every report run; see data_processing/profiling.py
+const PROFILE_ENV: &str = "REPORT_PROFILE";
+// Written by the Python pipeline after every run; see data_processing/metrics.py
+const METRICS_FILE: &str = "tmp_output/metrics.prom";
+
+static REPORT_CACHE_HITS: AtomicU64 = AtomicU64::new(0);
+static REPORT_CACHE_MISSES: AtomicU64 = AtomicU64::new(0);
+
+fn python_command(script_path: &Path, args: &[String]) -> String {
     #[cfg(target_os = "linux")]
-    fn run() {
-        let venv_activate = Path::new("./data_processing/venv/bin/activate");
+    let command = format!(
+        "source {} && python {} {}",
+        Path::new("./data_processing/venv/bin/activate").display(),
+        script_path.display(),
+        args.join(" ")
+    );
 
+    #[cfg(target_os = "windows")]
+    let command = format!(
+        "python3 {} {}",
+        script_path.display(),
+        args.join(" ")
+    );
+
+    command
+}
+
+fn report_file_name(start_date: &NaiveDate, end_date: &NaiveDate) -> String {
+    format!("report_{}_{}.json",
+        start_date.format("%m-%d-%Y"),
+        end_date.format("%m-%d-%Y")
+    )
+}
+
+fn profiling_requested() -> bool {
+    std::env::var(PROFILE_ENV).map_or(false, |v| !v.is_empty() && v != "0")
+}
+
+/// Record that new rows were ingested; reports written before this are stale.
+pub fn mark_ingest() -> Result<(), AppError> {
+    fs::create_dir_all(OUTPUT_DIR)?;
+    fs::write(INGEST_STAMP, chrono::Local::now().to_rfc3339())?;
+    Ok(())
+}
+
+/// Whether a report's data was loaded under the current ingest stamp.
+///
+/// The report records the stamp main.py read before loading, so a run that
+/// started before an upload finished is stale however late it was saved.
+fn loaded_under_current_ingest(report: &Value) -> bool {
+    // Reports written before the stamp was recorded have no key and are rebuilt
+    match report.get(INGEST_STAMP_KEY) {
+        Some(stamp) => stamp.as_str().map(str::to_string) == fs::read_to_string(INGEST_STAMP).ok(),
+        None => false,
     }
+}
+
+/// Return the cached report for the range if its data was loaded under the current ingest stamp.
+fn cached_report(start_date: &NaiveDate, end_date: &NaiveDate) -> Option<PathBuf> {
+    let json_path = Path::new(OUTPUT_DIR).join(report_file_name(start_date, end_date));
+    let report: Value = serde_json::from_str(&fs::read_to_string(&json_path).ok()?).ok()?;
+    if loaded_under_current_ingest(&report) {
+        Some(json_path)
+    } else {
+        None
+    }
+}
+
+/// Graph files the divisions of a report name; only the matplotlib backend writes any.
+fn referenced_graphs(report: &Value) -> Vec<String> {
+    const GRAPH_KEYS: [&str; 4] = ["turned_heatmap", "cancelled_heatmap", "ran_heatmap", "response_time_distribution"];
+    let mut graphs = Vec::new();
+    if let Some(divisions) = report.as_object() {
+        for (division, division_data) in divisions {
+            if division == INGEST_STAMP_KEY {
+                continue;
+            }
+            for key in GRAPH_KEYS {
+                if let Some(name) = division_data.get(key).and_then(Value::as_str) {
+                    graphs.push(name.to_string());
+                }
+            }
+        }
+    }
+    graphs
+}
+
+/// Move an on-demand run's report and graphs from its workspace into tmp_output, the report cache.
+///
+/// Only a report loaded under the current ingest stamp is published, so a run
+/// that raced an upload never replaces a fresher precomputed one. The graphs
+/// move first and the report last, so a reader that finds the report also
+/// finds its graphs. Call it once the job's PDFs are compiled; a workspace
+/// without a report (the job replayed the cache) publishes nothing.
+pub fn publish_report(workspace: &Path, start_date: &NaiveDate, end_date: &NaiveDate) -> Result<(), AppError> {
+    let file_name = report_file_name(start_date, end_date);
+    let json_path = workspace.join(&file_name);
+    let json_content = match fs::read_to_string(&json_path) {
+        Ok(json_content) => json_content,
+        Err(_) => return Ok(()),
+    };
+    let report: Value = serde_json::from_str(&json_content)?;
+    if !loaded_under_current_ingest(&report) {
+        return Ok(());
+    }
+
+    for graph in referenced_graphs(&report) {
+        publish(&workspace.join(&graph), &Path::new(OUTPUT_DIR).join(&graph))?;
+    }
+    publish(&json_path, &Path::new(OUTPUT_DIR).join(&file_name))
+}
+
+/// Prometheus text of the Python pipeline's metrics plus this server's report cache lookups.
+pub fn metrics_text() -> String {
+    let mut text = fs::read_to_string(METRICS_FILE).unwrap_or_default();
+    text.push_str("# HELP lifecare_report_cache_requests_total Cached report lookups by the server, by result\n");
+    text.push_str("# TYPE lifecare_report_cache_requests_total counter\n");
+    text.push_str(&format!(
+        "lifecare_report_cache_requests_total{{result=\"hit\"}} {}\n",
+        REPORT_CACHE_HITS.load(Ordering::Relaxed)
+    ));
+    text.push_str(&format!(
+        "lifecare_report_cache_requests_total{{result=\"miss\"}} {}\n",
+        REPORT_CACHE_MISSES.load(Ordering::Relaxed)
+    ));
+    text
+}
+
+/// Rebuild the weekly reports touched by an upload without blocking the caller.
+pub fn spawn_precompute(dates: &BTreeSet<NaiveDate>) -> Result<(), AppError> {
+    if dates.is_empty() {
+        return Ok(());
+    }
+
+    let script_path = Path::new("./data_processing/precompute.py");
+    let args: Vec<String> = dates.iter().map(|d| d.format("%m/%d/%Y").to_string()).collect();
+    let command = python_command(script_path, &args);
+
+    println!("Starting background precompute for {} dates", dates.len());
+
+    let mut child = tokio::process::Command::new("bash")
+        .arg("-c")
+        .arg(&command)
+        .spawn()
+        .map_err(|e| AppError::PythonError(format!("Failed to start precompute: {}", e).into()))?;
+
+    tokio::spawn(async move {
+        match child.wait().await {
+            Ok(status) if status.success() => println!("Background precompute finished"),
+            Ok(status) => println!("Background precompute failed with {}", status),
+            Err(e) => println!("Background precompute could not be awaited: {}", e),
+        }
+    });
+
+    Ok(())
+}
+
+/// Read a report JSON file and hand each division to the callback in file order.
+fn for_each_division<F>(json_path: &Path, graphics_dir: &Path, on_division: &mut F) -> Result<(), AppError>
+where
+    F: FnMut(&str, &Value, &Path) -> Result<(), AppError>,
+{
+    let json_content = fs::read_to_string(json_path)?;
+    let data: Value = serde_json::from_str(&json_content)?;
+
+    let divisions = data.as_object().ok_or_else(|| AppError::JsonError(
+        format!("Report {} is not an object keyed by division", json_path.display()).into()
+    ))?;
+
+    for (division, division_data) in divisions {
+        if division == INGEST_STAMP_KEY {
+            continue;
+        }
+        on_division(division, division_data, graphics_dir)?;
+    }
+    Ok(())
+}
+
+/// Produce the report for the range, calling `on_division` as each division becomes available.
+///
+/// A fresh cached report, precomputed or published by an earlier job, is
+/// replayed from tmp_output. Otherwise main.py
+/// runs in streaming mode with the job's workspace as its output directory, and
+/// each division is handed over as soon as its NDJSON line appears on stdout,
+/// so callers can render and compile it while the rest is still aggregating.
+pub fn stream_python_script<F>(start_date: &NaiveDate, end_date: &NaiveDate, workspace: &Path, mut on_division: F) -> Result<(), AppError>
+where
+    F: FnMut(&str, &Value, &Path) -> Result<(), AppError>,
+{
+    if let Some(json_path) = cached_report(start_date, end_date) {
+        REPORT_CACHE_HITS.fetch_add(1, Ordering::Relaxed);
+        println!("Using cached report: {}", json_path.display());
+        return for_each_division(&json_path, Path::new(OUTPUT_DIR), &mut on_division);
+    }
+    REPORT_CACHE_MISSES.fetch_add(1, Ordering::Relaxed);
 
     let script_path = Path::new("./data_processing/main.py");
 
@@ -17,48 +217,89 @@ pub fn run_python_script(start_date: &NaiveDate, end_date: &NaiveDate) -> Result
 
     println!("Executing Python script with dates: {} to {}", start_date_str, end_date_str);
 
-    #[cfg(target_os = "linux")]
-    let command = format!(
-        "source {} && python {} {} {}",
-        venv_activate.display(),
-        script_path.display(),
-        start_date_str,
-        end_date_str
-    );
-
-    #[cfg(target_os = "windows")]
-    let command = format!(
-        "python3 {} {} {}",
-        script_path.display(),
+    let mut args = vec![
         start_date_str,
-        end_date_str
-    );
+        end_date_str,
+        "--output-dir".to_string(),
+        workspace.display().to_string(),
+        "--stream".to_string(),
+    ];
+    // main.py saves profiles in Config.PROFILE_DIR, outside the workspace
+    if profiling_requested() {
+        args.push("--profile".to_string());
+    }
+    let command = python_command(script_path, &args);
 
     println!("Executing command: {}", command);
 
-    let output = Command::new("bash")
+    let mut child = Command::new("bash")
         .arg("-c")
         .arg(&command)
-        .output()
+        .stdout(Stdio::piped())
+        .stderr(Stdio::piped())
+        .spawn()
         .map_err(|e| AppError::PythonError(format!("Failed to execute Python script: {}", e).into()))?;
 
-    if !output.status.success() {
-        let stderr = String::from_utf8_lossy(&output.stderr);
-        let stdout = String::from_utf8_lossy(&output.stdout);
+    // Drain stderr on its own thread so a chatty script cannot block on a full pipe
+    let mut stderr = child.stderr.take().expect("stderr is piped");
+    let stderr_reader = thread::spawn(move || {
+        let mut output = String::new();
+        let _ = stderr.read_to_string(&mut output);
+        output
+    });
+
+    let stdout = child.stdout.take().expect("stdout is piped");
+    let mut streamed = Ok(());
+    for line in BufReader::new(stdout).lines() {
+        let line = match line {
+            Ok(line) => line,
+            Err(e) => {
+                streamed = Err(AppError::IoError(Box::new(e)));
+                break;
+            }
+        };
+        if line.trim().is_empty() {
+            continue;
+        }
+
+        let record: Value = match serde_json::from_str(&line) {
+            Ok(record) => record,
+            Err(_) => {
+                println!("Python script stdout: {}", line);
+                continue;
+            }
+        };
+        let report_file = match record.get("report_file").and_then(Value::as_str) {
+            Some(report_file) => PathBuf::from(report_file),
+            None => continue,
+        };
+
+        println!("Received report for division {}", record["division"]);
+        if let Err(e) = for_each_division(&report_file, workspace, &mut on_division) {
+            streamed = Err(e);
+            break;
+        }
+    }
+
+    if streamed.is_err() {
+        // Nothing more will be consumed, so do not wait for the remaining divisions
+        let _ = child.kill();
+    }
+
+    let status = child.wait()
+        .map_err(|e| AppError::PythonError(format!("Failed to wait for Python script: {}", e).into()))?;
+    let stderr = stderr_reader.join().unwrap_or_default();
+
+    streamed?;
+
+    if !status.success() {
         println!("Python script stderr: {}", stderr);
-        println!("Python script stdout: {}", stdout);
         return Err(AppError::PythonError(format!(
-            "Python script failed. Stderr: {}, Stdout: {}",
-            stderr, stdout
+            "Python script failed. Stderr: {}",
+            stderr
         ).into()));
     }
 
-    let json_file_name = format!("report_{}_{}.json",
-        start_date.format("%m-%d-%Y"),
-        end_date.format("%m-%d-%Y")
-    );
-
-    println!("Python script executed successfully. JSON file: {}", json_file_name);
-
-    Ok(json_file_name)
-}
\ No newline at end of file
+    println!("Python script executed successfully");
+    Ok(())
+}
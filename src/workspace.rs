@@ -0,0 +1,71 @@
+use std::fs;
+use std::path::{Path, PathBuf};
+use std::time::{Duration, SystemTime};
+use tempfile::TempDir;
+use crate::errors::AppError;
+
+pub const WORKSPACE_ROOT: &str = "workspaces";
+// Workspaces left behind by a crashed job are removed after this long
+const STALE_WORKSPACE_AGE: Duration = Duration::from_secs(6 * 60 * 60);
+
+/// Create a private directory for one report job; it is deleted when dropped.
+pub fn create_workspace() -> Result<TempDir, AppError> {
+    fs::create_dir_all(WORKSPACE_ROOT)?;
+    let workspace = tempfile::Builder::new()
+        .prefix("job_")
+        .tempdir_in(WORKSPACE_ROOT)?;
+    Ok(workspace)
+}
+
+/// Remove workspaces older than STALE_WORKSPACE_AGE and return how many were removed.
+pub fn cleanup_stale_workspaces() -> usize {
+    let entries = match fs::read_dir(WORKSPACE_ROOT) {
+        Ok(entries) => entries,
+        Err(_) => return 0,
+    };
+
+    let now = SystemTime::now();
+    let mut removed = 0;
+    for entry in entries.flatten() {
+        let is_stale = entry.metadata()
+            .and_then(|m| m.modified())
+            .map(|modified| now.duration_since(modified).unwrap_or_default() > STALE_WORKSPACE_AGE)
+            .unwrap_or(false);
+
+        if is_stale && fs::remove_dir_all(entry.path()).is_ok() {
+            removed += 1;
+        }
+    }
+
+    if removed > 0 {
+        println!("Removed {} stale report workspaces", removed);
+    }
+    removed
+}
+
+/// Move a finished artifact into its public location in one atomic step.
+pub fn publish(source: &Path, destination: &Path) -> Result<(), AppError> {
+    if let Some(parent) = destination.parent() {
+        fs::create_dir_all(parent)?;
+    }
+
+    if fs::rename(source, destination).is_ok() {
+        return Ok(());
+    }
+
+    // Different filesystems: copy next to the destination first, then rename over it
+    let staging = destination.with_extension("partial");
+    fs::copy(source, &staging)?;
+    fs::rename(&staging, destination)?;
+    Ok(())
+}
+
+/// Absolute, forward-slash path for use inside generated LaTeX.
+pub fn latex_path(path: &Path) -> Result<String, AppError> {
+    let absolute: PathBuf = if path.is_absolute() {
+        path.to_path_buf()
+    } else {
+        std::env::current_dir()?.join(path)
+    };
+    Ok(absolute.to_string_lossy().replace('\\', "/"))
+}